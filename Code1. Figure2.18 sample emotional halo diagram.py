@@ -1,8 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import rcParams
-import pandas as pd
 import os
+from stream_reader import iter_books
 
 # 配置字体（不需要中文字体时可忽略中文字体设置）
 rcParams['font.sans-serif'] = ['Arial']  # 使用通用字体
@@ -11,21 +11,18 @@ rcParams['axes.unicode_minus'] = False   # 解决负号显示问题
 # 文件路径
 file_path = r"H:\ZHANGJINGYI-20250330\data\2.句子情感数据\B01-B18句子情感满意原始数据\2.归一化数据\情感极性汇总.xlsx"
 
-# 读取数据
-data = pd.read_excel(file_path)
-
-# 获取样本书编号和对应的情感得分
-sample_ids = data['小说编号'].unique()
+# 逐本流式读取数据（只读取三列极性得分，不整体载入全表），获取样本书编号和对应的情感得分
+sample_ids = []
 positive_scores = []
 negative_scores = []
 neutral_scores = []
 
 # 计算每本书的三种情感极性得分平均值
-for sample_id in sample_ids:
-    sample_data = data[data['小说编号'] == sample_id]
-    positive_scores.append(sample_data['Positive_Polarity'].mean())
-    negative_scores.append(sample_data['Negative_Polarity'].mean())
-    neutral_scores.append(sample_data['Neutral_Polarity'].mean())
+for sample_id, columns in iter_books(file_path, ['Positive_Polarity', 'Negative_Polarity', 'Neutral_Polarity']):
+    sample_ids.append(sample_id)
+    positive_scores.append(np.nanmean(columns['Positive_Polarity'].astype(float)))
+    negative_scores.append(np.nanmean(columns['Negative_Polarity'].astype(float)))
+    neutral_scores.append(np.nanmean(columns['Neutral_Polarity'].astype(float)))
 
 # 构建情感光环图
 fig, ax = plt.subplots(figsize=(10, 10), subplot_kw={'projection': 'polar'})
@@ -3,6 +3,7 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import os
 import matplotlib
+from emotion_cube import load_cube, rollup
 
 # 设置中文字体（SimHei为黑体，适用于Windows系统）
 plt.rcParams['font.family'] = 'SimHei'
@@ -11,28 +12,16 @@ plt.rcParams['axes.unicode_minus'] = False  # 正常显示负号
 # 设置文件路径
 file_path = r'F:\ZHANGJINGYI-20250330\data\2.句子情感数据\B01-B18句子情感满意原始数据\2.归一化数据\data summary.xlsx'
 
-# 读取数据
-df = pd.read_excel(file_path)
-
-# 定义情感强度等级
-def classify_intensity(x):
-    if 1 <= x <= 3:
-        return '弱 (1-3)'
-    elif 4 <= x <= 6:
-        return '中 (4-6)'
-    elif 7 <= x <= 9:
-        return '强 (7-9)'
-    else:
-        return '未知'
-
-df['强度等级'] = df['情感强度'].apply(classify_intensity)
+# 读取数据：句子表一次聚合为立方体（小说 × 极性 × 强度等级 × ...，见 emotion_cube.py），以下统计均为立方体上的汇总
+# 情感强度等级：弱 (1-3)、中 (4-6)、强 (7-9)，其余为 未知（emotion_cube.INTENSITY_LEVELS）
+cube = load_cube({'full': file_path})
 
 # ==========================================
 # 一、整体情感强度堆积柱状图和环形图
 # ==========================================
 
 # 统计每本小说每个强度等级的数量
-grouped = df.groupby(['小说编号', '强度等级']).size().unstack(fill_value=0)
+grouped = rollup(cube, '小说编号', '强度等级')
 
 # 计算每本小说各等级占比
 proportion = grouped.div(grouped.sum(axis=1), axis=0)
@@ -56,7 +45,7 @@ plt.savefig(r'F:\ZHANGJINGYI-20250330\句子情感强度堆积柱状图.png')
 plt.show()
 
 # 可视化2：整体情感强度等级环形图
-total_counts = df['强度等级'].value_counts().reindex(['弱 (1-3)', '中 (4-6)', '强 (7-9)'])
+total_counts = rollup(cube, '强度等级').reindex(['弱 (1-3)', '中 (4-6)', '强 (7-9)'])
 
 plt.figure(figsize=(6, 6))
 colors = ['#c6dbef', '#9ecae1', '#6baed6']
@@ -77,7 +66,7 @@ plt.show()
 # ==========================================
 
 # 统计每种情感极性下不同强度等级的数量
-polar_group = df.groupby(['情感极性', '强度等级']).size().reset_index(name='数量')
+polar_group = rollup(cube, ['情感极性', '强度等级']).reset_index(name='数量')
 
 # 排序用：定义强度等级为有序类别
 polar_group['强度等级'] = pd.Categorical(
@@ -1,7 +1,7 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import os
+from emotion_cube import load_cube, rollup
 
 # 设置英文字体
 plt.rcParams['font.family'] = 'Arial'
@@ -11,9 +11,6 @@ plt.rcParams['axes.unicode_minus'] = False
 file_path = r'H:\ZHANGJINGYI-20250330\data\2.句子情感数据\B01-B18句子情感满意原始数据\2.归一化数据\data summary.xlsx'
 save_dir = r'H:\ZHANGJINGYI-20250330\data\2.句子情感数据\B01-B18句子情感满意原始数据\2.归一化数据'
 
-# 读取数据
-df = pd.read_excel(file_path)
-
 # 小说编号映射为类型
 type_map = {
     'B01': 'Animal/Nature', 'B02': 'Animal/Nature', 'B03': 'Animal/Nature',
@@ -23,13 +20,12 @@ type_map = {
     'B06': 'Growth/Family', 'B08': 'Growth/Family', 'B09': 'Growth/Family',
     'B11': 'Growth/Family', 'B12': 'Growth/Family', 'B14': 'Growth/Family',
 }
-df['Novel Type'] = df['小说编号'].map(type_map)
-df = df[df['Novel Type'].notnull()]
 
-# ✅ 取绝对值后聚合
-df['Abs_Intensity'] = df['Intensity_polarized'].abs()
-emotion_avg = df.groupby(['Novel Type', 'Emotional Types'])['Abs_Intensity'].mean().reset_index()
-pivot_df = emotion_avg.pivot(index='Novel Type', columns='Emotional Types', values='Abs_Intensity').fillna(0)
+# 读取数据：句子表一次聚合为立方体（小说 × 类型 × 情感类型 × ...，见 emotion_cube.py），以下均值均为立方体上的汇总
+cube = load_cube({'full': file_path}, type_map=type_map)
+
+# ✅ 取绝对值后聚合（Abs_Intensity = |Intensity_polarized|）
+pivot_df = rollup(cube, 'Novel Type', 'Emotional Types', value='Abs_Intensity').fillna(0)
 
 # 固定情感顺序
 emotion_order = ['Joy','Tru','Sat','Hop','Grat','Fear','Sad','Disg','Anx','Ang','Disap','Pri','Sha','Calm','Surp']
@@ -75,8 +71,7 @@ plt.close()
 # ======================
 
 # 获取每本小说在每种情感类型下的绝对值平均
-novel_emotion_df = df.groupby(['小说编号', 'Emotional Types'])['Abs_Intensity'].mean().reset_index()
-novel_emotion_pivot = novel_emotion_df.pivot(index='小说编号', columns='Emotional Types', values='Abs_Intensity').fillna(0)
+novel_emotion_pivot = rollup(cube, '小说编号', 'Emotional Types', value='Abs_Intensity').fillna(0)
 
 # 保证情感类型顺序一致
 novel_emotion_pivot = novel_emotion_pivot[emotion_order]
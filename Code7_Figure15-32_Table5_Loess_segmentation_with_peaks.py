@@ -2,14 +2,16 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from statsmodels.nonparametric.smoothers_lowess import lowess
-from scipy.signal import argrelextrema
 import os
+from loess_smoothing import smooth
+from inflection_nodes import detect_significant_inflections, detect_nodes, segmentation_table, NODE_POLICIES
+from bandwidth_sweep import stability_table, stability_summary
+from change_points import bic_penalty, detect_change_points, change_point_table
+from render_pool import figure_job, render_jobs
 
 # === 参数配置 ===
 input_folder = r"F:\ZHANGJINGYI-20250330\data\2.句子情感数据\B01-B18句子情感满意原始数据\2.归一化数据"
 output_folder = r"F:\ZHANGJINGYI-20250330\data\4.原始、移平、LOESS平滑曲线图\loess平滑曲线_自动节点_阈值合并"
-os.makedirs(output_folder, exist_ok=True)
 
 # 分段颜色（循环使用）
 segment_colors = ['#f0e68c', '#c2dfff', '#ffd8b1', '#d9ead3', '#f4cccc']
@@ -17,42 +19,30 @@ segment_colors = ['#f0e68c', '#c2dfff', '#ffd8b1', '#d9ead3', '#f4cccc']
 # 阈值设置：控制“保留多大情绪波动”的拐点（可根据需要调整）
 AMPLITUDE_THRESHOLD = 0.2  # ✔️ 设置的位置（默认值为0.2）
 
-# 基于幅度合并节点函数
-def detect_significant_inflections(smoothed, threshold=AMPLITUDE_THRESHOLD):
-    maxima = argrelextrema(smoothed, np.greater)[0]
-    minima = argrelextrema(smoothed, np.less)[0]
-    candidates = sorted(np.concatenate((maxima, minima)))
-
-    if len(candidates) < 2:
-        return []
-
-    # 计算情绪波动幅度（两点之间的值差）
-    amplitudes = [abs(smoothed[candidates[i]] - smoothed[candidates[i - 1]])
-                  for i in range(1, len(candidates))]
-
-    # 保留满足阈值条件的拐点（中间点）
-    valid_nodes = []
-    for i in range(1, len(candidates)):
-        if amplitudes[i - 1] >= threshold:
-            valid_nodes.append(candidates[i - 1])
-
-    # 也保留最后一个节点作为段尾参考（但不重复）
-    if len(candidates) > 1 and candidates[-1] not in valid_nodes:
-        if abs(smoothed[candidates[-1]] - smoothed[candidates[-2]]) >= threshold:
-            valid_nodes.append(candidates[-1])
-
-    return sorted(list(set(valid_nodes)))
-
-# 主绘图函数
-def plot_loess_sentiment_with_threshold(book_id, scores, x, save_path, loess_frac=0.3, manual_nodes=None):
-    smoothed = lowess(scores, x, frac=loess_frac)[:, 1]
-    auto_nodes = detect_significant_inflections(smoothed, threshold=AMPLITUDE_THRESHOLD)
-
+# 阈值敏感性：一次调用得到以下各阈值的分段结果（节点检测见 inflection_nodes.py）
+THRESHOLD_GRID = [0.1, 0.15, 0.2, 0.25, 0.3]
+
+# LOESS 带宽敏感性：以下各 frac 与 LOESS_FRAC 的节点、Climax、Valley 位置对比（见 bandwidth_sweep.py）
+LOESS_FRAC = 0.3
+FRAC_GRID = [0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.5]
+
+# 分段方法：'extrema' 为 LOESS 曲线极值 + 幅度阈值（原方法）；'pelt' / 'binseg' 为直接在 Intensity_polarized 上
+# 检测变点（见 change_points.py，不需要 B04/B08 的 valley 补充规则）
+SEGMENTATION_METHOD = 'extrema'
+CHANGE_POINT_COST = 'meanvar'      # 'mean' 均值变化 / 'meanvar' 均值 + 方差变化
+CHANGE_POINT_BETA = 4              # 惩罚 = beta × BIC 惩罚
+CHANGE_POINT_MIN_SIZE = 30         # 最短段长（句）
+PENALTY_GRID = [1, 2, 4, 8, 16, 32, 64]
+# 是否输出变点惩罚敏感性表（每本书按 PENALTY_GRID 逐个求解，需要时再打开）
+CHANGE_POINT_SWEEP = False
+
+# 主绘图函数（渲染任务：接收已平滑的曲线，由 render_pool 保存图片）
+def plot_loess_sentiment_with_threshold(book_id, smoothed, x, manual_nodes=None):
     # 使用手动节点（如指定）代替自动节点
     if manual_nodes is not None:
         nodes = manual_nodes
     else:
-        nodes = auto_nodes
+        nodes = detect_significant_inflections(smoothed, threshold=AMPLITUDE_THRESHOLD)
 
     max_peak_idx = np.argmax(smoothed)
     min_valley_idx = np.argmin(smoothed)
@@ -95,43 +85,66 @@ def plot_loess_sentiment_with_threshold(book_id, scores, x, save_path, loess_fra
     plt.grid(True, linestyle='--', alpha=0.5)
     plt.legend()
     plt.tight_layout()
-    plt.savefig(save_path, dpi=300)
-    plt.close()
-
-# 批量绘图主程序
-book_ids = [f"B{str(i).zfill(2)}" for i in range(1, 19)]
-
-manual_node_dict = {
-    "B04": "valley",
-    "B08": "valley"
-}
-
-for book_id in book_ids:
-    file_path = os.path.join(input_folder, f"{book_id}情感汇总_处理后.csv")
-    if not os.path.exists(file_path):
-        print(f"❌ File not found: {file_path}")
-        continue
-    try:
-        data = pd.read_csv(file_path)
-        scores = data['Intensity_polarized'].fillna(0).values
-        x = np.arange(len(scores))
-        smoothed = lowess(scores, x, frac=0.3)[:, 1]
-
-        # 自动节点先提取
-        auto_nodes = detect_significant_inflections(smoothed, threshold=AMPLITUDE_THRESHOLD)
-
-        # 检查是否需要插入valley
-        if book_id in ["B04", "B08"]:
-            valley_idx = int(np.argmin(smoothed))
-            # 如果valley节点不在原节点列表中，再添加进去
-            if valley_idx not in auto_nodes:
-                auto_nodes.append(valley_idx)
-                auto_nodes = sorted(auto_nodes)
-
-        save_path = os.path.join(output_folder, f"{book_id}_LOESS_Segmented_Thresholded_Peaks.png")
-        plot_loess_sentiment_with_threshold(book_id, scores, x, save_path, manual_nodes=auto_nodes)
-        print(f"✅ Completed: {book_id}")
-    except Exception as e:
-        print(f"⚠️ Error processing {book_id}: {e}")
+
+# 渲染进程池在 Windows 下以 spawn 方式启动子进程，主流程需放在 __main__ 保护块中
+if __name__ == "__main__":
+    os.makedirs(output_folder, exist_ok=True)
+
+    # 批量绘图主程序
+    book_ids = [f"B{str(i).zfill(2)}" for i in range(1, 19)]
+
+    curves = {}
+    raw_scores = {}
+    jobs = []
+
+    for book_id in book_ids:
+        file_path = os.path.join(input_folder, f"{book_id}情感汇总_处理后.csv")
+        if not os.path.exists(file_path):
+            print(f"❌ File not found: {file_path}")
+            continue
+        try:
+            data = pd.read_csv(file_path)
+            scores = data['Intensity_polarized'].fillna(0).values
+            x = np.arange(len(scores))
+            smoothed = smooth(scores, LOESS_FRAC, x=x, key=(book_id, 'Intensity_polarized'))
+            curves[book_id] = smoothed
+            raw_scores[book_id] = scores
+
+            # 自动节点提取，并按规则补充 valley 节点（B04、B08，规则统一定义在 inflection_nodes.NODE_POLICIES）；
+            # 或直接在原始序列上检测变点
+            if SEGMENTATION_METHOD == 'extrema':
+                auto_nodes = detect_nodes(smoothed, AMPLITUDE_THRESHOLD, policy=NODE_POLICIES.get(book_id))
+            else:
+                penalty = CHANGE_POINT_BETA * bic_penalty(scores, CHANGE_POINT_COST)
+                auto_nodes = detect_change_points(scores, SEGMENTATION_METHOD, penalty, CHANGE_POINT_COST,
+                                                  CHANGE_POINT_MIN_SIZE)
+
+            save_path = os.path.join(output_folder, f"{book_id}_LOESS_Segmented_Thresholded_Peaks.png")
+            jobs.append(figure_job(save_path, plot_loess_sentiment_with_threshold,
+                                   book_id, smoothed, x, manual_nodes=auto_nodes, dpi=300))
+        except Exception as e:
+            print(f"⚠️ Error processing {book_id}: {e}")
+
+    # 并行渲染全部分段图（曲线与节点未变的图跳过）
+    for save_path in render_jobs(jobs)['rendered']:
+        print(f"✅ Completed: {os.path.basename(save_path)}")
+
+    # 节点阈值敏感性表（每本书 × 每个阈值的节点与分段数）
+    sensitivity_df = segmentation_table(curves, THRESHOLD_GRID, policies=NODE_POLICIES)
+    sensitivity_df.to_csv(os.path.join(output_folder, "节点阈值敏感性表.csv"), index=False, encoding='utf-8-sig')
+
+    # LOESS 带宽稳定性表（每本书 × 每个 frac 的节点、Climax / Valley 及其相对 LOESS_FRAC 的偏移）与按 frac 的汇总
+    # 参考带宽的曲线已在上面平滑并记忆，不会重复计算
+    stability_df = stability_table(raw_scores, FRAC_GRID, reference=LOESS_FRAC, threshold=AMPLITUDE_THRESHOLD,
+                                   policies=NODE_POLICIES)
+    stability_df.to_csv(os.path.join(output_folder, "LOESS带宽稳定性表.csv"), index=False, encoding='utf-8-sig')
+    stability_summary(stability_df).to_csv(os.path.join(output_folder, "LOESS带宽稳定性汇总.csv"), encoding='utf-8-sig')
+
+    # 变点分段的惩罚敏感性表（每本书 × 每个 beta 的节点与分段数），与节点阈值敏感性表对照
+    if CHANGE_POINT_SWEEP:
+        penalty_df = change_point_table(raw_scores, PENALTY_GRID,
+                                        method='pelt' if SEGMENTATION_METHOD == 'extrema' else SEGMENTATION_METHOD,
+                                        cost=CHANGE_POINT_COST, min_size=CHANGE_POINT_MIN_SIZE)
+        penalty_df.to_csv(os.path.join(output_folder, "变点惩罚敏感性表.csv"), index=False, encoding='utf-8-sig')
 
 
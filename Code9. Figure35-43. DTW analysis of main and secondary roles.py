@@ -1,10 +1,14 @@
 
 import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from fastdtw import fastdtw
-from statsmodels.nonparametric.smoothers_lowess import lowess
+from pairwise_dtw import dtw_batch
+from compact_corpus import load_compact, iter_book_values
+from loess_smoothing import smooth, remember
+from bandwidth_sweep import stability_table
+from instrumentation import instrumented
 
 # 设置中文字体支持
 plt.rcParams['font.sans-serif'] = ['SimHei']
@@ -27,49 +31,78 @@ type_map = {
     'B11': 'Growth/Family', 'B12': 'Growth/Family', 'B14': 'Growth/Family',
 }
 
-full_df = pd.read_excel(full_book_path)
-full_data_grouped = full_df.groupby('小说编号')
+n_workers = None  # 并行进程数（None 为 CPU 核数，1 为串行）
 
-results = []
+# LOESS 带宽：分析所用的 frac，以及带宽稳定性表中与之对比的各 frac（见 bandwidth_sweep.py）
+loess_frac = 0.05
+frac_grid = [0.02, 0.03, 0.05, 0.08, 0.1, 0.15]
 
-for i in range(1, 19):
-    book_id = f'B{i:02d}'
-    if book_id not in type_map:
-        continue
+# 角色序列存储：{小说编号: {'main': 主角序列, 'minor': 次角序列, 'full': 全书序列}}
+# 在主进程中一次读入，经进程池 initializer 交给各进程只读使用，子进程不再重复读取文件
+_store = None
 
-    novel_type = type_map[book_id]
 
-    main_path = os.path.join(main_role_folder, f"{book_id}主要_归一化处理后.csv")
-    minor_path = os.path.join(minor_role_folder, f"{book_id}次要_归一化处理后.csv")
+def load_role_store():
+    # 全书表以紧凑结构读取，句子按书连续存放，按偏移切片即得每本书的序列
+    full_corpus = load_compact(full_book_path)
+    full_series = {book_id: values.astype(np.float64)
+                   for book_id, values in iter_book_values(full_corpus, 'Intensity_polarized')}
+
+    store = {}
+    for i in range(1, 19):
+        book_id = f'B{i:02d}'
+        if book_id not in type_map:
+            continue
+
+        main_path = os.path.join(main_role_folder, f"{book_id}主要_归一化处理后.csv")
+        minor_path = os.path.join(minor_role_folder, f"{book_id}次要_归一化处理后.csv")
+
+        if not os.path.exists(main_path) or not os.path.exists(minor_path) or book_id not in full_series:
+            print(f"缺失文件：{book_id}")
+            continue
+
+        main_df = pd.read_csv(main_path, encoding='utf-8', usecols=['Intensity_polarized'])
+        minor_df = pd.read_csv(minor_path, encoding='utf-8', usecols=['Intensity_polarized'])
+        store[book_id] = {
+            'main': main_df['Intensity_polarized'].to_numpy(dtype=np.float64),
+            'minor': minor_df['Intensity_polarized'].to_numpy(dtype=np.float64),
+            'full': full_series[book_id],
+        }
+    for series in store.values():
+        for values in series.values():
+            values.setflags(write=False)
+    return store
+
 
-    if not os.path.exists(main_path) or not os.path.exists(minor_path):
-        print(f"缺失文件：{book_id}")
-        continue
+def _init_worker(store):
+    global _store
+    _store = store
+    plt.switch_backend('Agg')
 
-    main_df = pd.read_csv(main_path, encoding='utf-8')
-    minor_df = pd.read_csv(minor_path, encoding='utf-8')
-    full_series = full_data_grouped.get_group(book_id)['Intensity_polarized'].reset_index(drop=True)
 
-    def smooth(series, frac=0.05):
-        smoothed = lowess(series, np.arange(len(series)), frac=frac, return_sorted=False)
-        return np.asarray(smoothed).flatten()
+# 单本书的分析与绘图（进程池任务）：返回结果行与三条平滑曲线（主进程写入记忆，带宽稳定性表不再重复平滑）
+@instrumented('role_analysis', lambda book_id: {'book': book_id})
+def analyze_book(book_id):
+    novel_type = type_map[book_id]
+    series = _store[book_id]
+
+    # LOESS 平滑（按 小说编号 + 角色 记忆，同一曲线只平滑一次）
+    main_smoothed = smooth(series['main'], frac=loess_frac, key=(book_id, 'main'))
+    minor_smoothed = smooth(series['minor'], frac=loess_frac, key=(book_id, 'minor'))
+    full_smoothed = smooth(series['full'], frac=loess_frac, key=(book_id, 'full'))
 
-    main_smoothed = smooth(main_df['Intensity_polarized'])
-    minor_smoothed = smooth(minor_df['Intensity_polarized'])
-    full_smoothed = smooth(full_series)
+    curves = {'main': main_smoothed, 'minor': minor_smoothed, 'full': full_smoothed}
 
     min_len = min(len(full_smoothed), len(main_smoothed), len(minor_smoothed))
     main_smoothed = main_smoothed[:min_len]
     minor_smoothed = minor_smoothed[:min_len]
     full_smoothed = full_smoothed[:min_len]
 
-    main_list = list(map(float, main_smoothed))
-    minor_list = list(map(float, minor_smoothed))
-    full_list = list(map(float, full_smoothed))
-
-    dist_main_full, _ = fastdtw(main_list, full_list, dist=lambda x, y: abs(x - y))
-    dist_minor_full, _ = fastdtw(minor_list, full_list, dist=lambda x, y: abs(x - y))
-    dist_main_minor, _ = fastdtw(main_list, minor_list, dist=lambda x, y: abs(x - y))
+    # 精确 DTW（绝对差代价），三组角色对一次批量计算：(主角,全书)、(次角,全书)、(主角,次角)
+    dist_main_full, dist_minor_full, dist_main_minor = dtw_batch(
+        np.vstack([main_smoothed, minor_smoothed, main_smoothed]),
+        np.vstack([full_smoothed, full_smoothed, minor_smoothed]),
+        dist='abs')
 
     if dist_main_full < dist_minor_full:
         driver = '主角'
@@ -90,17 +123,45 @@ for i in range(1, 19):
     plt.savefig(os.path.join(output_folder, f"{book_id}_情感曲线_DTW.png"))
     plt.close()
 
-    results.append({
+    return curves, {
         '小说编号': book_id,
         '小说类型': novel_type,
-        'DTW(全书,主角)': round(dist_main_full, 2),
-        'DTW(全书,次角)': round(dist_minor_full, 2),
-        'DTW(主角,次角)': round(dist_main_minor, 2),
+        'DTW(全书,主角)': round(float(dist_main_full), 2),
+        'DTW(全书,次角)': round(float(dist_minor_full), 2),
+        'DTW(主角,次角)': round(float(dist_main_minor), 2),
         '情感节奏主导角色': driver,
         '主-次同步性判断': sync
-    })
+    }
 
-results_df = pd.DataFrame(results)
-results_path = os.path.join(output_folder, "DTW分析结果汇总表.xlsx")
-results_df.to_excel(results_path, index=False)
-print("分析完成，结果保存于：", results_path)
+
+if __name__ == "__main__":
+    store = load_role_store()
+    book_ids = list(store)
+
+    # 各书相互独立：分发到进程池，按书号顺序汇总结果
+    if n_workers == 1:
+        _init_worker(store)
+        results = [analyze_book(book_id) for book_id in book_ids]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(store,)) as pool:
+            results = list(pool.map(analyze_book, book_ids))
+
+    # 子进程的平滑曲线写入主进程记忆：带宽稳定性表中参考带宽 loess_frac 的曲线直接命中
+    for book_id, (curves, _) in zip(book_ids, results):
+        for role, smoothed in curves.items():
+            remember(store[book_id][role], smoothed, frac=loess_frac, key=(book_id, role))
+
+    results_df = pd.DataFrame([row for _, row in results])
+    results_path = os.path.join(output_folder, "DTW分析结果汇总表.xlsx")
+    results_df.to_excel(results_path, index=False)
+    print("分析完成，结果保存于：", results_path)
+
+    # 各角色曲线的 LOESS 带宽稳定性：Climax / Valley 与节点位置随 frac 的偏移
+    stability_df = pd.concat([
+        stability_table({book_id: store[book_id][role] for book_id in book_ids}, frac_grid,
+                        reference=loess_frac, policies={}, series_name=role).assign(role=role)
+        for role in ('full', 'main', 'minor')
+    ], ignore_index=True)
+    stability_path = os.path.join(output_folder, "LOESS带宽稳定性表.xlsx")
+    stability_df.to_excel(stability_path, index=False)
+    print("带宽稳定性表保存于：", stability_path)
@@ -0,0 +1,94 @@
+# bandwidth_sweep.py
+# LOESS 带宽敏感性（Code7、Code9）：每本书一次得到一组 frac 下的平滑曲线（loess_smoothing.smooth_sweep），
+# 在每个 frac 下检测分段节点（inflection_nodes.detect_nodes）与 Climax / Valley，并与参考 frac（脚本所用的值）对比：
+#   ClimaxShift / ValleyShift  最高点 / 最低点相对参考位置的偏移（句）
+#   NodeShift   参考节点到本 frac 最近节点的平均距离（句）
+#   NodeRecall  参考节点中在容差内能找到对应节点的比例（容差为书长的比例）
+#   NodeAdded   本 frac 中离所有参考节点都超出容差的节点数
+
+import numpy as np
+import pandas as pd
+from loess_smoothing import smooth_sweep
+from inflection_nodes import NODE_POLICIES, detect_nodes
+
+DEFAULT_FRACS = [0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.5]
+COLUMNS = ['book_id', 'Frac', 'Nodes', 'NodeCount', 'Climax', 'Valley', 'ClimaxShift', 'ValleyShift',
+           'NodeShift', 'NodeRecall', 'NodeAdded']
+
+
+# 每个点到另一组节点中最近节点的距离
+def _nearest_distance(points, targets):
+    points = np.asarray(points, dtype=np.float64)
+    targets = np.sort(np.asarray(targets, dtype=np.float64))
+    if len(points) == 0 or len(targets) == 0:
+        return np.full(len(points), np.nan)
+    right = np.clip(np.searchsorted(targets, points), 0, len(targets) - 1)
+    left = np.clip(right - 1, 0, len(targets) - 1)
+    return np.minimum(np.abs(points - targets[left]), np.abs(points - targets[right]))
+
+
+# 最高点 / 最低点位置（忽略缺失值；全为缺失时为 -1）
+def _extremes(smoothed):
+    smoothed = np.asarray(smoothed, dtype=np.float64)
+    if np.isnan(smoothed).all():
+        return -1, -1
+    return int(np.nanargmax(smoothed)), int(np.nanargmin(smoothed))
+
+
+# 单本书的带宽稳定性
+#   scores:    原始序列（如 Intensity_polarized）
+#   fracs:     待比较的带宽；reference 为参考带宽（不在 fracs 中时自动加入）
+#   threshold: 节点幅度阈值（同 Code7 的 AMPLITUDE_THRESHOLD）
+#   tolerance: 节点对应的容差（书长的比例）
+def frac_stability(scores, fracs=DEFAULT_FRACS, reference=0.3, threshold=0.2, policy=None, method='exact',
+                   x=None, key=None, tolerance=0.02, book_id=None):
+    fracs = sorted({float(f) for f in fracs} | {float(reference)})
+    curves = smooth_sweep(scores, fracs, x=x, method=method, key=key)
+    n = len(np.asarray(scores))
+    limit = tolerance * max(n - 1, 1)
+
+    found = {}
+    for frac, smoothed in curves.items():
+        nodes = detect_nodes(smoothed, threshold, policy=policy) if n else []
+        found[frac] = (nodes, *_extremes(smoothed))
+    ref_nodes, ref_climax, ref_valley = found[float(reference)]
+
+    rows = []
+    for frac in fracs:
+        nodes, climax, valley = found[frac]
+        to_current = _nearest_distance(ref_nodes, nodes)
+        to_reference = _nearest_distance(nodes, ref_nodes)
+        rows.append({
+            'book_id': book_id,
+            'Frac': frac,
+            'Nodes': nodes,
+            'NodeCount': len(nodes),
+            'Climax': climax,
+            'Valley': valley,
+            'ClimaxShift': climax - ref_climax,
+            'ValleyShift': valley - ref_valley,
+            'NodeShift': float(np.mean(to_current)) if len(ref_nodes) and len(nodes) else np.nan,
+            'NodeRecall': float(np.mean(to_current <= limit)) if len(ref_nodes) else np.nan,
+            'NodeAdded': int(np.sum(~(to_reference <= limit))) if len(ref_nodes) else len(nodes),
+        })
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+# 多本书的带宽稳定性表
+#   series: {书号: 原始序列}；series_name 为记忆键的序列名（与 smooth 的 key=(书号, 序列名) 一致，便于共用记忆）
+def stability_table(series, fracs=DEFAULT_FRACS, reference=0.3, threshold=0.2, policies=NODE_POLICIES,
+                    method='exact', tolerance=0.02, series_name='Intensity_polarized'):
+    frames = [frac_stability(scores, fracs, reference, threshold, policies.get(book_id), method,
+                             key=(book_id, series_name) if series_name is not None else None,
+                             tolerance=tolerance, book_id=book_id)
+              for book_id, scores in series.items()]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+# 各 frac 的汇总：书数平均的节点数、偏移绝对值与节点召回率
+def stability_summary(table):
+    summary = table.assign(ClimaxShift=table['ClimaxShift'].abs(), ValleyShift=table['ValleyShift'].abs())
+    return summary.groupby('Frac')[['NodeCount', 'ClimaxShift', 'ValleyShift', 'NodeShift', 'NodeRecall',
+                                    'NodeAdded']].mean()
@@ -0,0 +1,287 @@
+# benchmark.py
+# 规模基准：用合成语料（synthetic_corpus.py）在不同书数 × 每书句子数下，对各分析阶段计时并测量内存峰值，
+# 结果写为 JSON 报告（含提交号与环境信息），不同提交的报告可用 --compare 对比
+#
+#   python benchmark.py --books 18 100 1000 --sentences 1000 10000
+#   python benchmark.py --compare results/benchmarks/旧.json results/benchmarks/新.json
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from synthetic_corpus import make_corpus, make_role_tables, book_ids, type_map
+from transition_engine import count_transitions
+from fluctuation_metrics import concat_series, batch_metrics
+from loess_smoothing import smooth, box_smooth
+from inflection_nodes import detect_nodes
+from pairwise_dtw import pairwise_dtw, dtw_batch
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_DIR = os.path.join(BASE_DIR, 'results', 'benchmarks')
+REPORT_VERSION = 1
+
+# 默认规模网格
+DEFAULT_BOOKS = [18, 100, 1000]
+DEFAULT_SENTENCES = [1000, 10000]
+
+# 单次基准允许的最大规模（超过则记为 skipped，避免单个阶段运行数小时）
+#   MAX_ROWS:           语料总句子数
+#   max_book_sentences: 单本书句子数（精确 LOESS 为 O(n² frac)，角色 DTW 不加带宽约束为 O(n²)）
+#   max_books:          书数（成对 DTW 为 O(N²)）
+MAX_ROWS = 20_000_000
+LIMITS = {
+    'loess_exact': {'max_book_sentences': 20000},
+    'pairwise_dtw': {'max_books': 500},
+    'role_dtw': {'max_book_sentences': 5000},
+}
+
+SEGMENT_THRESHOLDS = [0.1, 0.15, 0.2, 0.25, 0.3]
+N_POINTS = 100
+
+
+# ---------- 各阶段（输入在计时前准备好，返回处理的条目数） ----------
+def bench_read_csv(ctx):
+    df = pd.read_csv(ctx['csv_path'], encoding='utf-8-sig')
+    return {'sentences': len(df)}
+
+
+def bench_transitions(ctx):
+    counts = count_transitions(ctx['corpus'], type_map=ctx['type_map'])
+    return {'sentences': len(ctx['corpus']), 'transitions': int(counts.corpus.sum())}
+
+
+def bench_metrics(ctx):
+    values, offsets = concat_series(ctx['series'])
+    batch_metrics(values, offsets, ctx['books'])
+    return {'books': len(ctx['books']), 'sentences': len(values)}
+
+
+def _bench_loess(ctx, method):
+    for scores in ctx['series']:
+        smooth(scores, 0.3, method=method)
+    return {'books': len(ctx['series']), 'sentences': int(sum(len(s) for s in ctx['series']))}
+
+
+def bench_loess_exact(ctx):
+    return _bench_loess(ctx, 'exact')
+
+
+def bench_loess_fast(ctx):
+    return _bench_loess(ctx, 'fast')
+
+
+def bench_loess_box(ctx):
+    return _bench_loess(ctx, 'box')
+
+
+def bench_segment(ctx):
+    for smoothed in ctx['smoothed']:
+        detect_nodes(smoothed, SEGMENT_THRESHOLDS)
+    return {'books': len(ctx['smoothed'])}
+
+
+def bench_pairwise_dtw(ctx):
+    pairwise_dtw(ctx['curves'], n_jobs=ctx['n_jobs'])
+    n = len(ctx['curves'])
+    return {'books': n, 'pairs': n * (n - 1) // 2}
+
+
+def bench_role_dtw(ctx):
+    for main, minor, full in ctx['roles']:
+        dtw_batch(np.vstack([main, minor, main]), np.vstack([full, full, minor]), dist='abs')
+    return {'books': len(ctx['roles']), 'pairs': 3 * len(ctx['roles'])}
+
+
+STAGES = {
+    'read_csv': bench_read_csv,
+    'transitions': bench_transitions,
+    'metrics': bench_metrics,
+    'loess_exact': bench_loess_exact,
+    'loess_fast': bench_loess_fast,
+    'loess_box': bench_loess_box,
+    'segment': bench_segment,
+    'pairwise_dtw': bench_pairwise_dtw,
+    'role_dtw': bench_role_dtw,
+}
+
+
+# ---------- 输入准备 ----------
+def _prepare(stage, corpus, n_books, sentences, seed, n_jobs, tmp_dir):
+    books = book_ids(n_books)
+    ctx = {'corpus': corpus, 'books': books, 'type_map': type_map(books), 'n_jobs': n_jobs}
+    ctx['series'] = [g['Intensity_polarized'].to_numpy(dtype=np.float64)
+                     for _, g in corpus.groupby('小说编号', sort=True)]
+    if stage == 'read_csv':
+        ctx['csv_path'] = os.path.join(tmp_dir, f"corpus-{n_books}-{sentences}.csv")
+        if not os.path.exists(ctx['csv_path']):
+            corpus.to_csv(ctx['csv_path'], index=False, encoding='utf-8-sig')
+    if stage in ('segment', 'pairwise_dtw'):
+        ctx['smoothed'] = [box_smooth(s, np.arange(len(s)), 0.3) for s in ctx['series']]
+        ctx['curves'] = np.array([np.interp(np.linspace(0, 1, N_POINTS), np.linspace(0, 1, len(s)), s)
+                                  for s in ctx['smoothed']])
+    if stage == 'role_dtw':
+        main, minor = make_role_tables(n_books, sentences, seed)
+        main_series = {b: g['Intensity_polarized'].to_numpy() for b, g in main.groupby('小说编号')}
+        minor_series = {b: g['Intensity_polarized'].to_numpy() for b, g in minor.groupby('小说编号')}
+        roles = []
+        for book, full in zip(books, ctx['series']):
+            n = min(len(full), len(main_series[book]), len(minor_series[book]))
+            roles.append((main_series[book][:n], minor_series[book][:n], full[:n]))
+        ctx['roles'] = roles
+    return ctx
+
+
+def _skip_reason(stage, n_books, sentences):
+    if n_books * sentences > MAX_ROWS:
+        return f"总句子数超过 {MAX_ROWS}"
+    limit = LIMITS.get(stage, {})
+    if n_books > limit.get('max_books', np.inf):
+        return f"书数超过 {limit['max_books']}"
+    if sentences > limit.get('max_book_sentences', np.inf):
+        return f"单本句子数超过 {limit['max_book_sentences']}"
+    return None
+
+
+# 计时：wall（perf_counter）与 CPU（process_time），重复 repeat 次；内存峰值由 tracemalloc 单独一次测量
+def measure(func, ctx, repeat=3, memory=True):
+    wall, cpu = [], []
+    items = None
+    for _ in range(repeat):
+        w0, c0 = time.perf_counter(), time.process_time()
+        items = func(ctx)
+        wall.append(time.perf_counter() - w0)
+        cpu.append(time.process_time() - c0)
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func(ctx)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return {'wall_s': wall, 'best_wall_s': min(wall), 'median_wall_s': float(np.median(wall)),
+            'cpu_s': min(cpu), 'peak_mb': peak_mb, 'items': items}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import scipy
+    import statsmodels
+    return {
+        'commit': _git_commit(),
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scipy': scipy.__version__,
+        'statsmodels': statsmodels.__version__,
+    }
+
+
+# 运行基准，返回报告（dict）
+#   books / sentences: 书数与每书句子数的网格
+#   stages:            阶段名列表（None 为全部）
+def run_benchmarks(books=DEFAULT_BOOKS, sentences=DEFAULT_SENTENCES, stages=None, repeat=3, seed=0,
+                   n_jobs=1, memory=True, verbose=True):
+    stages = list(STAGES) if stages is None else list(stages)
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise ValueError(f"未知的阶段：{unknown}，可选 {list(STAGES)}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_books in books:
+            for n_sentences in sentences:
+                corpus = None
+                for stage in stages:
+                    record = {'stage': stage, 'n_books': n_books, 'sentences_per_book': n_sentences,
+                              'total_sentences': n_books * n_sentences}
+                    reason = _skip_reason(stage, n_books, n_sentences)
+                    if reason is not None:
+                        record.update(status='skipped', reason=reason)
+                    else:
+                        if corpus is None:
+                            corpus = make_corpus(n_books, n_sentences, seed)
+                        ctx = _prepare(stage, corpus, n_books, n_sentences, seed, n_jobs, tmp_dir)
+                        record.update(status='ok', **measure(STAGES[stage], ctx, repeat, memory))
+                    results.append(record)
+                    if verbose:
+                        detail = (f"{record['best_wall_s']:.3f}s" if record['status'] == 'ok'
+                                  else f"跳过（{record['reason']}）")
+                        print(f"{stage:>13} | {n_books:>6} 本 × {n_sentences:>7} 句 | {detail}")
+    return {'version': REPORT_VERSION, 'environment': environment(), 'seed': seed, 'repeat': repeat,
+            'n_jobs': n_jobs, 'results': results}
+
+
+def save_report(report, path=None):
+    if path is None:
+        commit = (report['environment'].get('commit') or 'nocommit')[:10]
+        stamp = report['environment']['time'].replace(':', '').replace('-', '')
+        path = os.path.join(REPORT_DIR, f"benchmark-{commit}-{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    return path
+
+
+def load_report(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# 对比两份报告：按 (阶段, 书数, 每书句子数) 对齐，ratio = 新 / 旧（< 1 为变快）
+def compare_reports(old, new):
+    keys = ['stage', 'n_books', 'sentences_per_book']
+
+    def frame(report):
+        rows = [r for r in report['results'] if r['status'] == 'ok']
+        return pd.DataFrame(rows, columns=keys + ['best_wall_s', 'peak_mb'])
+
+    merged = frame(old).merge(frame(new), on=keys, suffixes=('_old', '_new'))
+    merged['time_ratio'] = merged['best_wall_s_new'] / merged['best_wall_s_old']
+    merged['memory_ratio'] = merged['peak_mb_new'] / merged['peak_mb_old']
+    return merged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='分析各阶段规模基准')
+    parser.add_argument('--books', type=int, nargs='+', default=DEFAULT_BOOKS)
+    parser.add_argument('--sentences', type=int, nargs='+', default=DEFAULT_SENTENCES)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', type=int, default=1, help='成对 DTW 的进程数（默认 1，便于跨提交对比）')
+    parser.add_argument('--no-memory', action='store_true', help='不测量内存峰值')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        table = compare_reports(load_report(args.compare[0]), load_report(args.compare[1]))
+        print(table.to_string(index=False))
+        return
+
+    report = run_benchmarks(args.books, args.sentences, args.stages, args.repeat, args.seed,
+                            args.jobs, not args.no_memory)
+    print(f"报告已保存：{save_report(report, args.output)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
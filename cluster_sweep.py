@@ -0,0 +1,135 @@
+# cluster_sweep.py
+# Code8 聚类数选择：DTW 距离矩阵只计算一次，在其上对一组 k 并行运行 k-medoids / 层次聚类，
+# 汇总每个 k 的轮廓系数与簇内距离和（inertia）；DBA 重心只对最终选定的 k 计算
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import linkage, fcluster
+from scipy.spatial.distance import squareform
+from sklearn.metrics import silhouette_score
+from instrumentation import instrumented
+
+METHODS = ('kmedoids', 'hierarchical')
+
+
+def _as_square(D):
+    D = np.asarray(D, dtype=np.float64)
+    return squareform(D, checks=False) if D.ndim == 1 else D
+
+
+# 每个簇的 medoid（到簇内其他点距离和最小的点）与 inertia（各点到所属 medoid 的距离和）
+def _medoids(D, labels):
+    medoids = []
+    inertia = 0.0
+    for c in np.unique(labels):
+        members = np.flatnonzero(labels == c)
+        within = D[np.ix_(members, members)].sum(axis=1)
+        medoids.append(members[np.argmin(within)])
+        inertia += within.min()
+    return np.array(medoids), inertia
+
+
+# k-medoids（交替迭代，k-medoids++ 初始化，多次初始化取 inertia 最小者）
+def kmedoids(D, k, n_init=10, max_iter=100, random_state=0):
+    D = _as_square(D)
+    n = len(D)
+    rng = np.random.default_rng(random_state)
+    best = None
+    for _ in range(n_init):
+        medoids = [rng.integers(n)]
+        for _ in range(1, k):
+            nearest = D[:, medoids].min(axis=1)
+            prob = nearest ** 2
+            prob = prob / prob.sum() if prob.sum() > 0 else np.full(n, 1.0 / n)
+            medoids.append(rng.choice(n, p=prob))
+        medoids = np.array(medoids)
+
+        for _ in range(max_iter):
+            labels = np.argmin(D[:, medoids], axis=1)
+            new_medoids, _ = _medoids(D, labels)
+            if len(new_medoids) == len(medoids) and np.array_equal(np.sort(new_medoids), np.sort(medoids)):
+                break
+            medoids = new_medoids
+        labels = np.argmin(D[:, medoids], axis=1)
+        medoids, inertia = _medoids(D, labels)
+        labels = np.argmin(D[:, medoids], axis=1)
+        if best is None or inertia < best[2]:
+            best = (labels, medoids, inertia)
+    return best
+
+
+# 层次聚类（平均连接），切成 k 个簇
+def hierarchical(D, k, method='average'):
+    D = _as_square(D)
+    Z = linkage(squareform(D, checks=False), method=method)
+    labels = fcluster(Z, t=k, criterion='maxclust') - 1
+    medoids, inertia = _medoids(D, labels)
+    return labels, medoids, inertia
+
+
+_D = None
+
+
+def _init_worker(D):
+    global _D
+    _D = D
+
+
+def _fit(method, k, random_state):
+    if method == 'kmedoids':
+        labels, medoids, inertia = kmedoids(_D, k, random_state=random_state)
+    elif method == 'hierarchical':
+        labels, medoids, inertia = hierarchical(_D, k)
+    else:
+        raise ValueError(f"未知的聚类方法：{method}")
+    n_labels = len(np.unique(labels))
+    silhouette = silhouette_score(_D, labels, metric='precomputed') if 2 <= n_labels < len(_D) else np.nan
+    return method, k, labels, inertia, silhouette
+
+
+def _fit_task(args):
+    return _fit(*args)
+
+
+# 聚类数扫描
+#   D:       DTW 距离（压缩向量或方阵）
+#   k_range: 待比较的聚类数
+# 返回 (report, labels)：report 为 method, k, silhouette, inertia 表；labels[(method, k)] 为对应标签
+@instrumented('cluster_sweep', lambda D, k_range, *a, **kw: {'series': len(_as_square(D)), 'fits': len(k_range)})
+def sweep_k(D, k_range, methods=METHODS, n_jobs=None, random_state=0):
+    D = _as_square(D)
+    tasks = [(method, k, random_state) for method in methods for k in k_range if 1 < k < len(D)]
+
+    if n_jobs == 1:
+        _init_worker(D)
+        fitted = [_fit_task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(D,)) as pool:
+            fitted = list(pool.map(_fit_task, tasks))
+
+    report = pd.DataFrame([
+        {'method': method, 'k': k, 'silhouette': silhouette, 'inertia': inertia}
+        for method, k, _, inertia, silhouette in fitted
+    ], columns=['method', 'k', 'silhouette', 'inertia'])
+    labels = {(method, k): lab for method, k, lab, _, _ in fitted}
+    return report, labels
+
+
+# 轮廓系数最高的 k
+def choose_k(report, method='kmedoids'):
+    subset = report[report['method'] == method].dropna(subset=['silhouette'])
+    return int(subset.loc[subset['silhouette'].idxmax(), 'k'])
+
+
+# 只对选定划分计算各簇的 DBA 重心
+@instrumented('dba', lambda X, labels, **kw: {'series': len(X)})
+def dba_barycenters(X, labels, max_iter=30):
+    from tslearn.barycenters import dtw_barycenter_averaging
+    X = np.asarray(X, dtype=np.float64)
+    centers = []
+    for c in np.unique(labels):
+        members = X[labels == c]
+        centers.append(dtw_barycenter_averaging(members[..., None], max_iter=max_iter).ravel()
+                       if len(members) > 1 else members[0].copy())
+    return np.array(centers)
@@ -1,12 +1,13 @@
 import pandas as pd
 import matplotlib.pyplot as plt
+from corpus_cache import load_table
 
 # 本地路径设置
 input_file = r'H:\ZHANGJINGYI-20250330\data\2.句子情感数据\B01-B18句子情感满意原始数据\2.归一化数据\情感极性汇总.xlsx'
 output_file = r'H:\ZHANGJINGYI-20250330\data\2.句子情感数据\emotion_polarity_by_book_stacked_horizontal.png'
 
 # 读取数据
-df = pd.read_excel(input_file)
+df = load_table(input_file)
 
 # 设置每本小说的标签为：类型缩写+编号，如 "F1", "A1", "G1"
 type_map = {
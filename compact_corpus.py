@@ -0,0 +1,133 @@
+# compact_corpus.py
+# 句子表的紧凑内存结构（Data1 / Data2 / Data3 通用）：
+#   书级列（Neutral_Polarity、Positive_Polarity、Negative_Polarity）拆到每书一行的书表，不再逐句重复
+#   文本列（小说编号、情感极性、情感类型、Emotional Types、情感关键词）存为整数编码的 Categorical，
+#   多张表共用同一份词典（同一文本在各表中编码相同，新出现的取值追加在词典末尾，已有编码不变）
+#   分值列为 float32（Intensity 取值为 1/8 的整数倍，float32 可精确表示），句子编号为可空 Int32
+#   句子按书连续存放，offsets[i]:offsets[i+1] 为第 i 本书，可直接交给 fluctuation_metrics.batch_metrics 等批量引擎
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from corpus_cache import load_table, DATA1_PATH, DATA2_PATH, DATA3_PATH
+from transition_engine import EMOTION_ORDER
+
+BOOK_COL = '小说编号'
+BOOK_LEVEL_COLUMNS = ['Neutral_Polarity', 'Positive_Polarity', 'Negative_Polarity']
+CATEGORICAL_COLUMNS = ['小说编号', '情感极性', '情感类型', 'Emotional Types', '情感关键词']
+FLOAT_COLUMNS = ['情感强度', 'Intensity_norm', 'Intensity_polarized', 'Polarity_num']
+INT_COLUMNS = ['句子编号']
+
+# 紧凑语料：
+#   sentences  句子表（不含书级列），按书连续存放
+#   books      书表：小说编号、句子数、起始偏移与书级列，顺序与 offsets 一致
+#   offsets    长度 n_books+1 的偏移索引
+#   vocab      共享词典 {列名: 取值列表}
+CompactCorpus = namedtuple('CompactCorpus', ['sentences', 'books', 'offsets', 'vocab'])
+
+
+# 新建共享词典（Emotional Types 预置固定情感顺序，编码与 transition_engine 的标签顺序一致）
+def new_vocab():
+    return {'Emotional Types': list(EMOTION_ORDER)}
+
+
+# 以共享词典编码一列：词典中没有的取值按出现顺序追加
+def _encode(values, vocab, column):
+    categories = vocab.setdefault(column, [])
+    known = set(categories)
+    observed = pd.unique(pd.Series(values, copy=False).dropna())
+    categories.extend(v for v in observed if v not in known)
+    return pd.Categorical(values, categories=categories)
+
+
+# 宽表 → 紧凑语料
+#   vocab: 共享词典（原地扩充）；None 时新建
+def compact_table(df, vocab=None):
+    vocab = new_vocab() if vocab is None else vocab
+    df = df[df[BOOK_COL].notna()]
+    book_codes, book_ids = pd.factorize(df[BOOK_COL], sort=True)
+    order = np.argsort(book_codes, kind='stable')
+
+    data = {}
+    for col in df.columns:
+        if col in BOOK_LEVEL_COLUMNS:
+            continue
+        values = df[col].to_numpy()[order]
+        if col in CATEGORICAL_COLUMNS:
+            data[col] = _encode(values, vocab, col)
+        elif col in FLOAT_COLUMNS:
+            data[col] = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float32)
+        elif col in INT_COLUMNS:
+            data[col] = pd.array(pd.to_numeric(pd.Series(values), errors='coerce').round(), dtype='Int32')
+        else:
+            data[col] = values
+    sentences = pd.DataFrame(data, columns=[c for c in df.columns if c not in BOOK_LEVEL_COLUMNS])
+
+    counts = np.bincount(book_codes, minlength=len(book_ids))
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    books = pd.DataFrame({BOOK_COL: list(book_ids), 'n_sentences': counts, 'offset': offsets[:-1]})
+    # 书级列每本书取第一句的值（原表中同一本书的取值相同）
+    for col in BOOK_LEVEL_COLUMNS:
+        if col in df.columns:
+            books[col] = df[col].to_numpy()[order][offsets[:-1]] if len(df) else []
+    return CompactCorpus(sentences, books, offsets, vocab)
+
+
+# 读取为紧凑语料（原始表经 corpus_cache 缓存）
+def load_compact(path, vocab=None, **read_kwargs):
+    return compact_table(load_table(path, **read_kwargs), vocab)
+
+
+# 三份数据共用一份词典：{'full': Data1, 'main': Data2, 'minor': Data3}
+def load_compact_corpora(paths=None):
+    paths = paths or {'full': DATA1_PATH, 'main': DATA2_PATH, 'minor': DATA3_PATH}
+    vocab = new_vocab()
+    return {name: load_compact(path, vocab) for name, path in paths.items()}
+
+
+# 某一列的连续数组与偏移索引（供 batch_metrics 等批量引擎使用，无拷贝）
+def column_values(corpus, column):
+    return corpus.sentences[column].to_numpy(), corpus.offsets
+
+
+# 一本书的句子（按位置切片，不扫描整表）
+def book_slice(corpus, book_id):
+    i = book_index(corpus, book_id)
+    return corpus.sentences.iloc[corpus.offsets[i]:corpus.offsets[i + 1]]
+
+
+def book_index(corpus, book_id):
+    matches = np.flatnonzero(corpus.books[BOOK_COL].to_numpy() == book_id)
+    if len(matches) == 0:
+        raise KeyError(book_id)
+    return int(matches[0])
+
+
+# 逐本产出 (书号, 该书某列的数组视图)
+def iter_book_values(corpus, column):
+    values = corpus.sentences[column].to_numpy()
+    for i, book_id in enumerate(corpus.books[BOOK_COL]):
+        yield book_id, values[corpus.offsets[i]:corpus.offsets[i + 1]]
+
+
+# 还原为原始宽表结构（书级列按书展开，文本列还原为字符串）
+def expand(corpus):
+    df = corpus.sentences.copy()
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(object).where(df[col].notna(), np.nan)
+    repeats = corpus.books['n_sentences'].to_numpy()
+    # 书级列放回小说编号之前（与原表列顺序一致）
+    position = df.columns.get_loc(BOOK_COL) if BOOK_COL in df.columns else len(df.columns)
+    for col in BOOK_LEVEL_COLUMNS:
+        if col in corpus.books.columns:
+            df.insert(position, col, np.repeat(corpus.books[col].to_numpy(), repeats))
+            position += 1
+    return df
+
+
+# 常驻内存（MB，含字符串对象）
+def memory_mb(obj):
+    if isinstance(obj, CompactCorpus):
+        return memory_mb(obj.sentences) + memory_mb(obj.books)
+    return obj.memory_usage(deep=True).sum() / 2 ** 20
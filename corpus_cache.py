@@ -0,0 +1,147 @@
+# corpus_cache.py
+# 共享数据读取模块：首次读取 xlsx / csv 时将整张表按列转换为 .npy 缓存，
+# 之后直接从缓存加载（毫秒级）；源文件的大小、修改时间或内容哈希变化时缓存自动失效。
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented, add_items
+
+# 仓库自带的三份数据（脚本中的本地路径仍可直接传入 load_table）
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA1_PATH = os.path.join(BASE_DIR, "data1. Summary of Sentence-level Emotional Data of 18 Contemporary China Children's Best Selling Novels.xlsx")
+DATA2_PATH = os.path.join(BASE_DIR, "Data2. Summary of Sentence-level emotional data of the main characters in 18 contemporary China best-selling children's novels.csv")
+DATA3_PATH = os.path.join(BASE_DIR, "Data3. Summary of Sentence-level Secondary Character Emotional Data in 18 Contemporary China Children's Popular Novels.csv")
+
+# 缓存目录名（位于源文件同级目录下）
+CACHE_DIR_NAME = ".corpus_cache"
+CACHE_VERSION = 1
+
+
+# 计算源文件内容哈希（分块读取，避免大文件一次性载入内存）
+def file_hash(path, block_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+# 缓存位置：<源文件目录>/.corpus_cache/<文件名>-<读取参数摘要>/
+def _cache_dir(path, read_kwargs):
+    params = json.dumps(read_kwargs, sort_keys=True, default=str, ensure_ascii=False)
+    digest = hashlib.sha1(params.encode('utf-8')).hexdigest()[:10]
+    folder, name = os.path.split(path)
+    return os.path.join(folder, CACHE_DIR_NAME, f"{name}-{digest}")
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != CACHE_VERSION:
+        return None
+    return manifest
+
+
+def _write_manifest(manifest_path, manifest):
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+
+# 按源文件扩展名读取原始表
+@instrumented('read_source', lambda path, **kw: {'file': os.path.basename(path)})
+def _read_source(path, **read_kwargs):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xls'):
+        return pd.read_excel(path, **read_kwargs)
+    read_kwargs.setdefault('encoding', 'utf-8-sig')
+    return pd.read_csv(path, **read_kwargs)
+
+
+# 写入列缓存：数值列保存为普通 .npy（可内存映射），文本列保存为对象数组
+def _write_columns(cache_dir, df, manifest):
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+    os.makedirs(cache_dir)
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        values = df[col].to_numpy()
+        numeric = values.dtype.kind in 'biufcmM'
+        if not numeric:
+            values = df[col].to_numpy(dtype=object)
+        filename = f"col_{i:03d}.npy"
+        np.save(os.path.join(cache_dir, filename), values, allow_pickle=not numeric)
+        columns.append({'name': col, 'file': filename, 'numeric': numeric})
+
+    manifest['columns'] = columns
+    # manifest 最后写入：manifest 存在即代表缓存完整
+    _write_manifest(os.path.join(cache_dir, 'manifest.json'), manifest)
+
+
+def _load_columns(cache_dir, manifest, mmap):
+    data = {}
+    for col in manifest['columns']:
+        col_path = os.path.join(cache_dir, col['file'])
+        if col['numeric']:
+            data[col['name']] = np.load(col_path, mmap_mode='r' if mmap else None)
+        else:
+            data[col['name']] = np.load(col_path, allow_pickle=True)
+    df = pd.DataFrame(data, columns=[col['name'] for col in manifest['columns']])
+    add_items(rows=len(df), cache_hit=1)
+    return df
+
+
+# 读取表格（替代 pd.read_excel / pd.read_csv）
+# read_kwargs 原样传给 pandas，且参与缓存键；mmap=True 时数值列以只读内存映射方式加载
+@instrumented('load_table', lambda path, *a, **kw: {'file': os.path.basename(path)})
+def load_table(path, mmap=False, **read_kwargs):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    cache_dir = _cache_dir(path, read_kwargs)
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+
+    manifest = _read_manifest(manifest_path)
+    if manifest is not None and manifest['size'] == stat.st_size:
+        if manifest['mtime_ns'] == stat.st_mtime_ns:
+            return _load_columns(cache_dir, manifest, mmap)
+        # 修改时间变化但内容未变（如复制、touch）：沿用缓存并更新时间戳
+        if manifest['sha1'] == file_hash(path):
+            manifest['mtime_ns'] = stat.st_mtime_ns
+            _write_manifest(manifest_path, manifest)
+            return _load_columns(cache_dir, manifest, mmap)
+
+    df = _read_source(path, **read_kwargs)
+    manifest = {
+        'version': CACHE_VERSION,
+        'source': os.path.basename(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha1': file_hash(path),
+    }
+    try:
+        _write_columns(cache_dir, df, manifest)
+    except OSError as e:
+        # 缓存不可写时不影响分析本身
+        print(f"缓存写入失败（{cache_dir}）：{e}")
+    add_items(rows=len(df))
+    return df
+
+
+# 删除某个源文件的全部缓存
+def clear_cache(path):
+    folder, name = os.path.split(os.path.abspath(path))
+    root = os.path.join(folder, CACHE_DIR_NAME)
+    if not os.path.isdir(root):
+        return
+    for entry in os.listdir(root):
+        if entry.startswith(name + '-'):
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
@@ -0,0 +1,139 @@
+# curve_resampler.py
+# 定长曲线重采样（Code8 输入）：把每本书平滑后的 Intensity_polarized 曲线按叙事进度重采样为 N 点，全部书一次向量化完成
+#   linear  线性插值（与原 np.interp 逐本插值一致）
+#   spline  三次样条插值（长度相同的书合并为一次求解）
+#   area    面积守恒：第 k 点为曲线在进度区间 [k/N, (k+1)/N) 上的平均值（把每句视为宽 1/n 的阶梯），
+#           重采样后均值与原曲线相同，长曲线降采样时不丢失窄峰的面积
+# 结果写为 (n_books, N) float32 的 .npy（np.load(mmap_mode='r') 零拷贝读取）与同名 .index.json 书号索引，
+# 聚类与 DTW 直接加载矩阵，不再解析长表 CSV 并逐本筛选重建
+
+import os
+import json
+import numpy as np
+import pandas as pd
+from fluctuation_metrics import concat_series
+
+METHODS = ('linear', 'spline', 'area')
+
+
+# 各书目标点在拼接数组中的位置：书 i 的第 k 点对应 offsets[i] + k/(N-1) * (n_i-1)
+def _positions(offsets, n_points):
+    lengths = np.diff(offsets)
+    progress = np.linspace(0, 1, n_points)
+    return offsets[:-1, None] + progress[None, :] * np.maximum(lengths - 1, 0)[:, None], lengths
+
+
+def _linear(values, offsets, n_points):
+    pos, lengths = _positions(offsets, n_points)
+    left = np.floor(pos).astype(np.int64)
+    # 末点落在最后一句上，右邻取自身
+    right = np.minimum(left + 1, (offsets[1:] - 1)[:, None])
+    weight = pos - left
+    return values[left] * (1 - weight) + values[right] * weight
+
+
+def _spline(values, offsets, n_points):
+    from scipy.interpolate import CubicSpline
+    lengths = np.diff(offsets)
+    progress = np.linspace(0, 1, n_points)
+    out = np.empty((len(lengths), n_points))
+    # 长度相同的书共用节点，合并为一次多列样条求解
+    for length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == length)
+        Y = np.stack([values[offsets[i]:offsets[i + 1]] for i in rows])
+        if length < 3:
+            out[rows] = _linear(Y.ravel(), np.arange(len(rows) + 1) * length, n_points)
+            continue
+        out[rows] = CubicSpline(np.linspace(0, 1, length), Y, axis=1)(progress)
+    return out
+
+
+def _area(values, offsets, n_points):
+    lengths = np.diff(offsets)
+    # 拼接数组的前缀和；书 i 在进度 t 处的累积面积 F(t) = (S[o+j] - S[o] + frac * v[o+j]) / n_i，j = floor(t n_i)
+    prefix = np.concatenate(([0.0], np.cumsum(values)))
+    edges = np.linspace(0, 1, n_points + 1)
+    scaled = edges[None, :] * lengths[:, None]
+    j = np.minimum(np.floor(scaled).astype(np.int64), (lengths - 1)[:, None])
+    frac = scaled - j
+    start = offsets[:-1, None]
+    cum = (prefix[start + j] - prefix[start] + frac * values[start + j]) / lengths[:, None]
+    return np.diff(cum, axis=1) * n_points
+
+
+# 一次重采样全部曲线
+#   curves:   曲线列表（各书长度可不同）
+#   n_points: 重采样点数
+#   返回 (n_books, n_points) float64 矩阵；不足 2 点的曲线取常数（与 pipeline.interpolate_book 一致）
+def resample_curves(curves, n_points=100, method='linear'):
+    if method not in METHODS:
+        raise ValueError(f"未知的重采样方法：{method}，可选 {METHODS}")
+    values, offsets = concat_series(curves)
+    lengths = np.diff(offsets)
+    out = np.full((len(lengths), n_points), np.nan)
+    regular = lengths >= 2
+    if regular.any():
+        rows = np.flatnonzero(regular)
+        sub_values, sub_offsets = concat_series([values[offsets[i]:offsets[i + 1]] for i in rows])
+        resample = {'linear': _linear, 'spline': _spline, 'area': _area}[method]
+        out[rows] = resample(sub_values, sub_offsets, n_points)
+    single = lengths == 1
+    out[single] = values[offsets[:-1][single], None]
+    return out
+
+
+def _index_path(path):
+    return os.path.splitext(path)[0] + '.index.json'
+
+
+# 写出曲线矩阵：path 为 .npy（float32，按书号顺序），书号索引写入同名 .index.json
+def write_matrix(path, matrix, ids, **meta):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    matrix = np.asarray(matrix)
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=matrix.shape)
+    out[:] = matrix
+    out.flush()
+    del out
+    with open(_index_path(path), 'w', encoding='utf-8') as f:
+        json.dump({'ids': [str(i) for i in ids], 'shape': list(matrix.shape), **meta}, f, ensure_ascii=False)
+    return path
+
+
+# 重采样并写出：curves 为 {书号: 平滑曲线}，按书号排序
+def export_curves(curves, path, n_points=100, method='linear'):
+    ids = sorted(curves)
+    matrix = resample_curves([curves[b] for b in ids], n_points, method)
+    return write_matrix(path, matrix, ids, n_points=n_points, method=method)
+
+
+# 读取曲线矩阵：返回 (只读 memmap, 书号数组)
+def load_matrix(path, mmap=True):
+    X = np.load(path, mmap_mode='r' if mmap else None)
+    with open(_index_path(path), 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    ids = np.array(index['ids'], dtype=object)
+    if len(ids) != len(X):
+        raise ValueError(f"{path} 的书号索引与矩阵行数不一致")
+    return X, ids
+
+
+# 长表（novel, progress, emotion_score）→ (矩阵, 书号数组)，书号按首次出现顺序（兼容旧的插值曲线 CSV）
+def matrix_from_long(df, id_col='novel', value_col='emotion_score'):
+    codes, ids = pd.factorize(df[id_col])
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes, minlength=len(ids))
+    if len(counts) and (counts != counts[0]).any():
+        raise ValueError("各书的插值点数不一致")
+    n_points = counts[0] if len(counts) else 0
+    X = df[value_col].to_numpy(dtype=np.float64)[order].reshape(len(ids), n_points)
+    return X, np.asarray(ids, dtype=object)
+
+
+# 矩阵 → 长表（novel, progress, emotion_score），供按书绘图
+def matrix_to_long(X, ids):
+    n_books, n_points = np.shape(X)
+    return pd.DataFrame({
+        'novel': np.repeat(np.asarray(ids, dtype=object), n_points),
+        'progress': np.tile(np.linspace(0, 1, n_points), n_books),
+        'emotion_score': np.asarray(X, dtype=np.float64).ravel(),
+    })
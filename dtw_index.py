@@ -0,0 +1,186 @@
+# dtw_index.py
+# 情感曲线的 DTW 近邻索引：给定一条新稿件（或已有小说）的定长情感曲线，找出 DTW 距离最近的 k 本书，
+# 不必重算 Code8 的全部成对 DTW 矩阵
+#   索引中为每本书预先保存：曲线、Sakoe-Chiba 带宽下的上下包络线，以及曲线 / 包络线的分段均值（PAA）
+#   查询按下界逐级筛选：LB_Kim 与 PAA 下界（O(段数)）→ LB_Keogh（双向，O(L)）→ 精确 DTW（带累计代价上限提前终止），
+#   候选按下界从小到大分批精确计算，下界超过当前第 k 近距离的书直接跳过，结果与全部精确计算相同
+#   距离口径与 pairwise_dtw 一致（sqrt(平方差累计和)），带宽 radius=None 时与 Code8 的无约束 DTW 相同（下界较松）
+#   新增书只计算新增行的包络线与 PAA，索引可保存为 .npz 并再次加载
+
+from collections import namedtuple
+import numpy as np
+from pairwise_dtw import dtw_cost_batch, envelope, lb_kim, lb_keogh
+from curve_resampler import resample_curves, load_matrix
+from instrumentation import instrumented, add_items
+
+DEFAULT_RADIUS = 10
+DEFAULT_SEGMENTS = 10
+
+# 索引：
+#   ids            书号数组
+#   X              (n_books, L) 曲线
+#   upper / lower  带宽 radius 下的上下包络线
+#   paa            曲线的分段均值 (n_books, 段数)，paa_upper / paa_lower 为包络线的分段均值
+#   radius         Sakoe-Chiba 带宽半径（None 为不约束）
+#   bounds         PAA 分段边界（长度 段数+1）
+DTWIndex = namedtuple('DTWIndex', ['ids', 'X', 'upper', 'lower', 'paa', 'paa_upper', 'paa_lower', 'radius', 'bounds'])
+
+# 查询结果：近邻书号与距离（按距离升序），以及精确计算 DTW 的候选数 / 总候选数
+Neighbors = namedtuple('Neighbors', ['ids', 'distances', 'exact', 'candidates'])
+
+
+def _segment_bounds(length, segments):
+    return np.linspace(0, length, min(segments, length) + 1).round().astype(np.int64)
+
+
+# 分段均值：各段长度可不等
+def _paa(X, bounds):
+    sums = np.add.reduceat(X, bounds[:-1], axis=1)
+    return sums / np.diff(bounds)
+
+
+def _envelopes(X, radius):
+    if radius is None:
+        # 不约束带宽时包络线为整条曲线的最大 / 最小值
+        return (np.repeat(X.max(axis=1, keepdims=True), X.shape[1], axis=1),
+                np.repeat(X.min(axis=1, keepdims=True), X.shape[1], axis=1))
+    return envelope(X, radius)
+
+
+def _rows(X, bounds, radius):
+    upper, lower = _envelopes(X, radius)
+    return X, upper, lower, _paa(X, bounds), _paa(upper, bounds), _paa(lower, bounds)
+
+
+# 建立索引
+#   X:        (n_books, L) 定长曲线（如 curve_resampler 导出的矩阵）
+#   ids:      书号
+#   radius:   DTW 的 Sakoe-Chiba 带宽半径（None 为不约束）
+#   segments: PAA 段数
+def build_index(X, ids, radius=DEFAULT_RADIUS, segments=DEFAULT_SEGMENTS):
+    X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+    ids = np.asarray(ids, dtype=object)
+    if len(ids) != len(X) or len(set(ids)) != len(ids):
+        raise ValueError("书号须与曲线一一对应且不重复")
+    bounds = _segment_bounds(X.shape[1], segments)
+    return DTWIndex(ids, *_rows(X, bounds, radius), radius, bounds)
+
+
+# 由 curve_resampler 导出的曲线矩阵建立索引
+def index_from_matrix(path, radius=DEFAULT_RADIUS, segments=DEFAULT_SEGMENTS):
+    X, ids = load_matrix(path)
+    return build_index(X, ids, radius, segments)
+
+
+# 增量添加（已有书号则替换该书的曲线），只计算新增行的包络线与 PAA，返回新索引
+def add_books(index, X, ids):
+    X = _as_queries(index, X)
+    ids = np.asarray(ids, dtype=object)
+    if len(ids) != len(X) or len(set(ids)) != len(ids):
+        raise ValueError("书号须与曲线一一对应且不重复")
+    new_rows = _rows(X, index.bounds, index.radius)
+    keep = ~np.isin(index.ids, ids)
+    old_rows = (index.X, index.upper, index.lower, index.paa, index.paa_upper, index.paa_lower)
+    merged = [np.concatenate([old[keep], new]) for old, new in zip(old_rows, new_rows)]
+    return DTWIndex(np.concatenate([index.ids[keep], ids]), *merged, index.radius, index.bounds)
+
+
+def save_index(index, path):
+    np.savez(path, ids=index.ids.astype(str), X=index.X, upper=index.upper, lower=index.lower, paa=index.paa,
+             paa_upper=index.paa_upper, paa_lower=index.paa_lower, bounds=index.bounds,
+             radius=-1 if index.radius is None else index.radius)
+    return path
+
+
+def load_index(path):
+    with np.load(path) as data:
+        radius = int(data['radius'])
+        return DTWIndex(data['ids'].astype(object), data['X'], data['upper'], data['lower'], data['paa'],
+                        data['paa_upper'], data['paa_lower'], None if radius < 0 else radius, data['bounds'])
+
+
+# 查询曲线长度与索引不同时按进度线性重采样
+def _as_queries(index, X):
+    if isinstance(X, (list, tuple)) and len({len(x) for x in X}) > 1:
+        return resample_curves(X, index.X.shape[1])
+    X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+    if X.shape[1] != index.X.shape[1]:
+        return resample_curves(list(X), index.X.shape[1])
+    return X
+
+
+# PAA 下界：各段内超出包络线的部分，按段长加权（不超过 LB_Keogh）
+def _lb_paa(q_paa, paa_upper, paa_lower, widths):
+    above = np.maximum(q_paa - paa_upper, 0.0)
+    below = np.maximum(paa_lower - q_paa, 0.0)
+    return np.sqrt(((above ** 2 + below ** 2) * widths).sum(axis=1))
+
+
+def _describe(index, curve, k=5, **kwargs):
+    return {'books': len(index.ids), 'k': k}
+
+
+# top-k 近邻查询
+#   curve:    一条曲线（长度与索引不同时自动重采样）
+#   k:        返回的近邻数
+#   exclude:  不参与比较的书号（如查询已有小说时排除自身）
+#   prefilter: 是否先用 PAA 下界粗筛（关闭时只用 LB_Kim 排序）
+#   batch:    每批精确计算的候选数
+@instrumented('dtw_query', _describe)
+def query(index, curve, k=5, exclude=(), prefilter=True, batch=16):
+    q = _as_queries(index, curve)[0]
+    candidates = np.flatnonzero(~np.isin(index.ids, list(exclude)))
+    k = min(k, len(candidates))
+    if k == 0:
+        return Neighbors([], np.empty(0), 0, 0)
+
+    # 第一级：LB_Kim 与 PAA 下界（全部候选一次计算）
+    lower = lb_kim(np.broadcast_to(q, (len(candidates), len(q))), index.X[candidates])
+    if prefilter:
+        widths = np.diff(index.bounds)
+        lower = np.maximum(lower, _lb_paa(_paa(q[None, :], index.bounds), index.paa_upper[candidates],
+                                          index.paa_lower[candidates], widths))
+    order = np.argsort(lower, kind='stable')
+    candidates, lower = candidates[order], lower[order]
+
+    q_upper, q_lower = _envelopes(q[None, :], index.radius)
+    best_ids = np.empty(0, dtype=np.int64)
+    best = np.empty(0)
+    exact = 0
+    for start in range(0, len(candidates), batch):
+        kth = best[-1] if len(best) == k else np.inf
+        chunk = candidates[start:start + batch]
+        chunk_lower = lower[start:start + batch]
+        # 下界已排序，首个超过第 k 近距离的候选之后都可跳过
+        if chunk_lower[0] > kth:
+            break
+        chunk = chunk[chunk_lower <= kth]
+
+        # 第二级：双向 LB_Keogh
+        keogh = np.maximum(lb_keogh(q[None, :], index.upper[chunk], index.lower[chunk]),
+                           lb_keogh(index.X[chunk], q_upper, q_lower))
+        chunk = chunk[keogh <= kth]
+        if len(chunk) == 0:
+            continue
+
+        # 第三级：精确 DTW，累计代价超过第 k 近距离即提前终止
+        bound = None if np.isinf(kth) else kth ** 2
+        cost = dtw_cost_batch(np.broadcast_to(q, (len(chunk), len(q))), index.X[chunk], index.radius, bound)
+        exact += len(chunk)
+        distances = np.sqrt(cost)
+        merged_ids = np.concatenate([best_ids, chunk])
+        merged = np.concatenate([best, distances])
+        keep = np.argsort(merged, kind='stable')[:k]
+        keep = keep[np.isfinite(merged[keep])]
+        best_ids, best = merged_ids[keep], merged[keep]
+
+    add_items(exact=exact, candidates=len(candidates))
+    return Neighbors(list(index.ids[best_ids]), best, exact, len(candidates))
+
+
+# 以索引中的一本书为查询，排除其自身
+def query_book(index, book_id, k=5, **kwargs):
+    row = np.flatnonzero(index.ids == book_id)
+    if len(row) == 0:
+        raise KeyError(book_id)
+    return query(index, index.X[row[0]], k, exclude=(book_id,) + tuple(kwargs.pop('exclude', ())), **kwargs)
@@ -0,0 +1,174 @@
+# emotion_cube.py
+# 句子情感聚合立方体（Code3、Code4 共用）：
+#   维度：角色（full 全书 Data1 / main 主要角色 Data2 / minor 次要角色 Data3）× 小说编号 × 小说类型 × 情感极性 × 强度等级 × 情感类型
+#   每个非空格子保存句子数，以及各度量列的合计与非缺失数（均值 = 合计 / 非缺失数，与 pandas 的 mean 口径一致）
+#   各维度编码为整数后打包为一个键，np.unique + np.bincount 一次遍历全部句子完成聚合；
+#   图表与统计表都从立方体上按维度汇总（只涉及几千个格子），不再对整张句子表重新 groupby
+#   维度取原始值（不去空格），缺失值单独成格，汇总时按 pandas groupby 的默认口径丢弃缺失的分组键
+# 立方体按源文件内容哈希缓存在数据目录的 .corpus_cache/ 下，不同脚本共用同一份
+
+import os
+import json
+import pickle
+import hashlib
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from corpus_cache import load_table, file_hash, CACHE_DIR_NAME, DATA1_PATH, DATA2_PATH, DATA3_PATH
+from transition_engine import TYPE_MAP
+from instrumentation import instrumented
+
+CUBE_VERSION = 1
+
+ROLE_COL = 'role'
+BOOK_COL = '小说编号'
+TYPE_COL = 'Novel Type'
+POLARITY_COL = '情感极性'
+LEVEL_COL = '强度等级'
+EMOTION_COL = 'Emotional Types'
+DIMS = [ROLE_COL, BOOK_COL, TYPE_COL, POLARITY_COL, LEVEL_COL, EMOTION_COL]
+
+# 强度等级（与 Code3 的 classify_intensity 一致），不在 1-9 内的强度（含缺失）为 未知
+INTENSITY_LEVELS = [(1, 3, '弱 (1-3)'), (4, 6, '中 (4-6)'), (7, 9, '强 (7-9)')]
+UNKNOWN_LEVEL = '未知'
+
+# 度量列：Abs_Intensity 为 |Intensity_polarized|（Code4 的显著性）
+MEASURES = ['Intensity_polarized', 'Abs_Intensity', 'Intensity_norm', '情感强度']
+
+# 论文图表中的小说类型名称（Code4），立方体默认按此映射小说类型
+TYPE_NAMES = {'Animal': 'Animal/Nature', 'Fantasy_Adventure': 'Fantasy/Adventure', 'Growth_Family': 'Growth/Family'}
+FIGURE_TYPE_MAP = {book: TYPE_NAMES[t] for book, t in TYPE_MAP.items()}
+
+# 立方体：cells 为每个非空格子一行的表（维度列 + count + <度量>_sum + <度量>_n）
+Cube = namedtuple('Cube', ['cells', 'dims', 'measures'])
+
+
+# 向量化强度分级
+def intensity_level(values):
+    values = pd.to_numeric(pd.Series(values, copy=False), errors='coerce').to_numpy(dtype=np.float64)
+    conditions = [(values >= lo) & (values <= hi) for lo, hi, _ in INTENSITY_LEVELS]
+    return np.select(conditions, [name for _, _, name in INTENSITY_LEVELS], UNKNOWN_LEVEL).astype(object)
+
+
+def _measure_values(df, measure):
+    if measure == 'Abs_Intensity':
+        return np.abs(_measure_values(df, 'Intensity_polarized'))
+    if measure not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[measure], errors='coerce').to_numpy(dtype=np.float64)
+
+
+# 一张句子表的维度列（原始取值）
+def _dimension_columns(df, role, type_map):
+    n = len(df)
+    missing = pd.Series(np.full(n, np.nan, dtype=object))
+    books = df[BOOK_COL] if BOOK_COL in df.columns else missing
+    return {
+        ROLE_COL: np.full(n, role, dtype=object),
+        BOOK_COL: books.to_numpy(dtype=object),
+        TYPE_COL: books.map(type_map).to_numpy(dtype=object),
+        POLARITY_COL: (df[POLARITY_COL] if POLARITY_COL in df.columns else missing).to_numpy(dtype=object),
+        LEVEL_COL: intensity_level(df['情感强度'] if '情感强度' in df.columns else missing),
+        EMOTION_COL: (df[EMOTION_COL] if EMOTION_COL in df.columns else missing).to_numpy(dtype=object),
+    }
+
+
+# 由各角色的句子表构建立方体
+#   tables:   {角色: 句子表}，如 {'full': Data1, 'main': Data2, 'minor': Data3}
+#   type_map: 小说编号 → 小说类型
+@instrumented('cube', lambda tables, *a, **kw: {'sentences': sum(len(t) for t in tables.values())})
+def build_cube(tables, type_map=FIGURE_TYPE_MAP, measures=MEASURES):
+    frames = {dim: [] for dim in DIMS}
+    values = {m: [] for m in measures}
+    for role, df in tables.items():
+        for dim, column in _dimension_columns(df, role, type_map).items():
+            frames[dim].append(column)
+        for m in measures:
+            values[m].append(_measure_values(df, m))
+
+    # 各维度整数编码（缺失值单独编码），打包为混合进制键
+    packed = np.zeros(sum(len(df) for df in tables.values()), dtype=np.int64)
+    uniques = {}
+    for dim in DIMS:
+        codes, uniques[dim] = pd.factorize(np.concatenate(frames[dim]), use_na_sentinel=False)
+        packed = packed * len(uniques[dim]) + codes
+    keys, inverse = np.unique(packed, return_inverse=True)
+
+    data = {}
+    remainder = keys
+    for dim in reversed(DIMS):
+        size = len(uniques[dim])
+        data[dim] = np.asarray(uniques[dim], dtype=object)[remainder % size]
+        remainder = remainder // size
+    cells = pd.DataFrame({dim: data[dim] for dim in DIMS})
+    cells['count'] = np.bincount(inverse, minlength=len(keys))
+    for m in measures:
+        column = np.concatenate(values[m])
+        present = ~np.isnan(column)
+        cells[f'{m}_sum'] = np.bincount(inverse, weights=np.where(present, column, 0.0), minlength=len(keys))
+        cells[f'{m}_n'] = np.bincount(inverse, weights=present, minlength=len(keys)).astype(np.int64)
+    return Cube(cells, list(DIMS), list(measures))
+
+
+def _cube_path(paths, type_map, measures):
+    key = json.dumps({'version': CUBE_VERSION, 'files': {r: file_hash(p) for r, p in paths.items()},
+                      'type_map': type_map, 'measures': list(measures)}, sort_keys=True, ensure_ascii=False)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    folder = os.path.dirname(os.path.abspath(next(iter(paths.values()))))
+    return os.path.join(folder, CACHE_DIR_NAME, f"cube-{digest}.pkl")
+
+
+# 读取立方体（按源文件内容哈希缓存）
+#   paths: {角色: 源文件路径}，默认为仓库自带的 Data1 / Data2 / Data3
+def load_cube(paths=None, type_map=FIGURE_TYPE_MAP, measures=MEASURES, use_cache=True):
+    paths = paths or {'full': DATA1_PATH, 'main': DATA2_PATH, 'minor': DATA3_PATH}
+    cache_path = _cube_path(paths, type_map, measures) if use_cache else None
+    if cache_path is not None and os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    cube = build_cube({role: load_table(path) for role, path in paths.items()}, type_map, measures)
+    if cache_path is not None:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(cube, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    return cube
+
+
+# 按维度筛选格子：where={'role': 'full', '情感极性': ['正', '负']}
+def select(cube, where=None):
+    cells = cube.cells
+    for dim, wanted in (where or {}).items():
+        if isinstance(wanted, (list, tuple, set)):
+            cells = cells[cells[dim].isin(list(wanted))]
+        else:
+            cells = cells[cells[dim] == wanted]
+    return cells
+
+
+# 按维度汇总
+#   index / columns: 行、列维度（columns 为 None 时返回以 index 为索引的 Series）
+#   value:  'count' 为句子数，或度量列名
+#   stat:   度量的 'mean'（合计 / 非缺失数）或 'sum'
+#   where:  维度筛选，见 select
+def rollup(cube, index, columns=None, value='count', stat='mean', where=None):
+    cells = select(cube, where)
+    index = [index] if isinstance(index, str) else list(index)
+    cols = [] if columns is None else ([columns] if isinstance(columns, str) else list(columns))
+    keys = index + cols
+    if value == 'count':
+        result = cells.groupby(keys)['count'].sum()
+    elif stat == 'sum':
+        result = cells.groupby(keys)[f'{value}_sum'].sum()
+    elif stat == 'mean':
+        grouped = cells.groupby(keys)[[f'{value}_sum', f'{value}_n']].sum()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = grouped[f'{value}_sum'] / grouped[f'{value}_n'].where(grouped[f'{value}_n'] > 0)
+    else:
+        raise ValueError(f"未知的统计量：{stat}，可选 'mean' / 'sum'")
+    result = result.rename(value)
+    if not cols:
+        return result
+    return result.unstack(cols, fill_value=0) if value == 'count' else result.unstack(cols)
+
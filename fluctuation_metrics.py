@@ -0,0 +1,139 @@
+# fluctuation_metrics.py
+# 批量基础波动特征计算（Code6）：所有小说拼接为一个浮点数组 + 偏移索引，
+# 分段归约一次算出全部小说的 Amplitude、Frequency、CV、Peaks、Troughs、MeanReversion，无逐本循环
+
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented
+
+METRICS = ['Amplitude', 'Frequency', 'CV', 'Peaks', 'Troughs', 'MeanReversion']
+
+
+# 由若干序列构造拼接数组与偏移索引：offsets[i]:offsets[i+1] 为第 i 本书
+def concat_series(series_list):
+    arrays = [np.asarray(s, dtype=np.float64).ravel() for s in series_list]
+    lengths = np.array([len(a) for a in arrays], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    values = np.concatenate(arrays) if arrays else np.empty(0)
+    return values, offsets
+
+
+# 由按书排序的编号列构造偏移索引（同一本书的句子需连续）
+def offsets_from_ids(book_ids):
+    book_ids = pd.Series(book_ids, copy=False).to_numpy()
+    if len(book_ids) == 0:
+        return np.zeros(1, dtype=np.int64), []
+    starts = np.flatnonzero(np.concatenate(([True], book_ids[1:] != book_ids[:-1])))
+    offsets = np.append(starts, len(book_ids)).astype(np.int64)
+    return offsets, list(book_ids[starts])
+
+
+# 段内相邻差分的掩码：去掉跨越两本书边界的差分
+def _within_segment(offsets, n):
+    mask = np.ones(max(n - 1, 0), dtype=bool)
+    boundaries = offsets[1:-1] - 1
+    mask[boundaries[(boundaries >= 0) & (boundaries < n - 1)]] = False
+    return mask
+
+
+# 峰/谷计数：相邻差分符号去零（平台）后，段内由 +1 变 -1 为峰，-1 变 +1 为谷（与 find_peaks 的平台处理一致）
+def _count_turns(values, seg_id, within, n_books):
+    slope = np.sign(np.diff(values))
+    keep = within & (slope != 0) & ~np.isnan(slope)
+    slope, seg = slope[keep], seg_id[:-1][keep]
+    same = seg[1:] == seg[:-1]
+    peaks = same & (slope[:-1] > 0) & (slope[1:] < 0)
+    troughs = same & (slope[:-1] < 0) & (slope[1:] > 0)
+    return (np.bincount(seg[1:][peaks], minlength=n_books),
+            np.bincount(seg[1:][troughs], minlength=n_books))
+
+
+# 批量计算波动特征
+#   values:  所有小说拼接后的一维数组（Intensity_polarized）
+#   offsets: 长度 n_books+1 的偏移索引
+#   books:   小说编号（可选，作为结果索引）
+@instrumented('metrics', lambda values, offsets, books=None: {'books': len(offsets) - 1, 'sentences': len(values)})
+def batch_metrics(values, offsets, books=None):
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_books = len(offsets) - 1
+    n = len(values)
+    lengths = np.diff(offsets)
+    seg_id = np.repeat(np.arange(n_books), lengths)
+
+    # 均值 / 标准差（忽略缺失值，与 pandas 一致；标准差 ddof=1）
+    finite = ~np.isnan(values)
+    filled = np.where(finite, values, 0.0)
+    count = np.bincount(seg_id, weights=finite, minlength=n_books)
+    total = np.bincount(seg_id, weights=filled, minlength=n_books)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        centered = np.where(finite, values - mean[seg_id], 0.0)
+        std = np.sqrt(np.bincount(seg_id, weights=centered ** 2, minlength=n_books) / (count - 1))
+
+        # 波幅
+        amplitude = np.full(n_books, np.nan)
+        nonempty = lengths > 0
+        if nonempty.any():
+            starts = offsets[:-1][nonempty]
+            amplitude[nonempty] = np.fmax.reduceat(values, starts) - np.fmin.reduceat(values, starts)
+
+        # 波动频率（过零点）：相邻符号不同的次数
+        within = _within_segment(offsets, n)
+        sign = np.sign(values)
+        changed = (sign[1:] != sign[:-1]) & within
+        frequency = np.bincount(seg_id[:-1][changed], minlength=n_books)
+
+        # 变异系数
+        cv = np.where(mean != 0, std / np.abs(mean), np.nan)
+
+        # 波峰数 / 波谷数
+        peaks, troughs = _count_turns(values, seg_id, within, n_books)
+
+        # 均值回归速率：偏离均值幅度的相邻变化绝对值的均值
+        deviations = np.abs(values - mean[seg_id])
+        step = np.abs(np.diff(deviations))
+        reversion_sum = np.bincount(seg_id[:-1][within], weights=step[within], minlength=n_books)
+        # 少于两句的书没有相邻变化（空书不再得到 -0.0）
+        mean_reversion = np.where(lengths > 1, reversion_sum / np.maximum(lengths - 1, 1), np.nan)
+
+    result = pd.DataFrame({
+        'Amplitude': amplitude,
+        'Frequency': frequency,
+        'CV': cv,
+        'Peaks': peaks,
+        'Troughs': troughs,
+        'MeanReversion': mean_reversion,
+    }, columns=METRICS)
+    if books is not None:
+        result.index = pd.Index(list(books), name='Book')
+    return result
+
+
+# 单条序列的波动特征（返回 dict，接口与 Code6 原 calculate_metrics 一致）
+def calculate_metrics(series):
+    values, offsets = concat_series([series])
+    return batch_metrics(values, offsets).iloc[0].to_dict()
+
+
+# 流式计算：books 为逐本产出 (书号, 序列) 或 (书号, {列名: 数组}) 的迭代器（如 stream_reader.iter_books），
+# 每累积 batch_books 本书做一次批量归约，内存占用与批大小同阶
+def stream_metrics(books, column='Intensity_polarized', batch_books=256):
+    frames, batch_ids, batch_series = [], [], []
+
+    def flush():
+        values, offsets = concat_series(batch_series)
+        frames.append(batch_metrics(values, offsets, batch_ids))
+        batch_ids.clear()
+        batch_series.clear()
+
+    for book_id, values in books:
+        if isinstance(values, dict):
+            values = values[column]
+        batch_ids.append(book_id)
+        batch_series.append(pd.to_numeric(pd.Series(values, copy=False), errors='coerce').to_numpy(dtype=np.float64))
+        if len(batch_ids) >= batch_books:
+            flush()
+    if batch_ids or not frames:
+        flush()
+    return pd.concat(frames) if len(frames) > 1 else frames[0]
@@ -0,0 +1,93 @@
+# inflection_nodes.py
+# Code7 分段节点检测：局部极值与相邻幅度只计算一次，一次调用返回一组阈值下的全部分段结果
+# 每个极值点的“保留强度”= 与下一个极值点的幅度差（最后一个点取与前一个点的幅度差），
+# 阈值 t 下的节点即保留强度 >= t 的极值点，与原 detect_significant_inflections 逐点规则一致
+
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented
+
+# 节点补充规则（声明式）：书号 → 规则名
+#   'valley' 补充全书最低点（Valley）作为节点
+#   'climax' 补充全书最高点（Climax）作为节点
+NODE_POLICIES = {
+    "B04": "valley",
+    "B08": "valley",
+}
+
+
+# 局部极值（严格大于/小于左右相邻点，端点不计，与 argrelextrema 默认行为一致）及其保留强度
+def extrema_strength(smoothed):
+    smoothed = np.asarray(smoothed, dtype=np.float64)
+    if len(smoothed) < 3:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    mid = smoothed[1:-1]
+    is_max = (mid > smoothed[:-2]) & (mid > smoothed[2:])
+    is_min = (mid < smoothed[:-2]) & (mid < smoothed[2:])
+    candidates = np.flatnonzero(is_max | is_min) + 1
+    if len(candidates) < 2:
+        return candidates, np.zeros(len(candidates))
+
+    amplitudes = np.abs(np.diff(smoothed[candidates]))
+    strength = np.append(amplitudes, amplitudes[-1])
+    return candidates, strength
+
+
+# 按规则补充节点
+def apply_node_policy(nodes, smoothed, policy):
+    if policy is None:
+        return nodes
+    if policy == 'valley':
+        extra = int(np.argmin(smoothed))
+    elif policy == 'climax':
+        extra = int(np.argmax(smoothed))
+    else:
+        raise ValueError(f"未知的节点规则：{policy}")
+    if extra not in nodes:
+        nodes = sorted(nodes + [extra])
+    return nodes
+
+
+# 检测分段节点
+#   thresholds 为单个数值时返回节点列表；为列表/数组时返回 {阈值: 节点列表}
+@instrumented('segment', lambda smoothed, thresholds, policy=None: {'sentences': len(smoothed)})
+def detect_nodes(smoothed, thresholds, policy=None):
+    candidates, strength = extrema_strength(smoothed)
+    scalar = np.ndim(thresholds) == 0
+    levels = np.atleast_1d(np.asarray(thresholds, dtype=np.float64))
+
+    # 少于两个极值点时没有幅度可比较，不产生自动节点
+    if len(candidates) < 2:
+        keep = np.zeros((len(levels), len(candidates)), dtype=bool)
+    else:
+        keep = strength[None, :] >= levels[:, None]
+
+    result = {}
+    for level, mask in zip(levels, keep):
+        nodes = [int(c) for c in candidates[mask]]
+        result[float(level)] = apply_node_policy(nodes, smoothed, policy)
+    if scalar:
+        return result[float(levels[0])]
+    return result
+
+
+# 与原 Code7 接口一致的单阈值版本
+def detect_significant_inflections(smoothed, threshold=0.2):
+    return detect_nodes(smoothed, threshold)
+
+
+# 多本书 × 多阈值的分段汇总表：book_id, Threshold, Nodes, NodeCount, Segments
+#   curves: {书号: 平滑曲线}
+def segmentation_table(curves, thresholds, policies=NODE_POLICIES):
+    rows = []
+    for book_id, smoothed in curves.items():
+        by_level = detect_nodes(smoothed, thresholds, policy=policies.get(book_id))
+        for level, nodes in by_level.items():
+            rows.append({
+                'book_id': book_id,
+                'Threshold': level,
+                'Nodes': nodes,
+                'NodeCount': len(nodes),
+                'Segments': len(nodes) + 1,
+            })
+    return pd.DataFrame(rows, columns=['book_id', 'Threshold', 'Nodes', 'NodeCount', 'Segments'])
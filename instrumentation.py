@@ -0,0 +1,310 @@
+# instrumentation.py
+# 分阶段计时与内存记录：分析函数以 @instrumented(阶段名) 包装，或在脚本中以 with span(阶段名, book=...) 包围
+#   每条记录：阶段、书号、墙钟时间、CPU 时间、阶段开始 / 结束时的常驻内存（RSS）及其差值、进程峰值 RSS、
+#   条目数（books / sentences / pairs 等）
+#   进程峰值 RSS（ru_maxrss / peak_wset）是进程启动以来的最高水位，不是本阶段的峰值；阶段自身的内存变化看 rss_delta_mb
+#   输出为 JSON lines（每条记录一行），可转换为 Chrome trace（chrome://tracing、Perfetto 可直接打开）
+#   可选采样剖析：后台线程定期采样各线程调用栈，输出 folded stacks（可用 flamegraph 工具绘制火焰图）
+# 未启用时包装函数只多一次全局变量判断，开销可忽略
+#
+# 启用方式：instrumentation.enable('trace.jsonl')，或设置环境变量 ANALYSIS_TRACE=trace.jsonl
+# 子进程（进程池）通过环境变量自动启用，各自写入 trace.<pid>.jsonl，读取 / 转换时一并合并
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import functools
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+ENV_VAR = 'ANALYSIS_TRACE'
+ENV_OWNER = 'ANALYSIS_TRACE_OWNER'
+
+_enabled = False
+_path = None
+_owner = None
+_pid = None
+_file = None
+_lock = threading.Lock()
+_local = threading.local()
+_sampler = None
+
+
+# ---------- 内存 ----------
+# 当前常驻内存与进程启动以来的峰值（MB）；缺少相应接口的平台返回 None
+def rss_mb():
+    current = peak = None
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        current = info.rss / 2 ** 20
+        peak = getattr(info, 'peak_wset', None)
+        peak = peak / 2 ** 20 if peak is not None else None
+    elif os.path.exists('/proc/self/statm'):
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    if peak is None and resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为 KB，macOS 为字节
+        peak = maxrss / 2 ** 20 if sys.platform == 'darwin' else maxrss / 2 ** 10
+    return current, peak
+
+
+# ---------- 启用 / 关闭 ----------
+def _worker_path(path, pid):
+    root, ext = os.path.splitext(path)
+    return f"{root}.{pid}{ext or '.jsonl'}"
+
+
+# 当前进程的输出文件（fork 出的子进程首次写入时改写到自己的文件）
+def _output():
+    global _file, _pid
+    pid = os.getpid()
+    if _file is None or _pid != pid:
+        path = _path if pid == _owner else _worker_path(_path, pid)
+        _file = open(path, 'a', encoding='utf-8')
+        _pid = pid
+    return _file
+
+
+# 启用记录
+#   path:            JSON lines 输出路径（追加写入）
+#   sample_interval: 采样剖析间隔（秒），None 为不采样；采样结果写入 <path>.folded
+def enable(path, sample_interval=None):
+    global _enabled, _path, _owner
+    disable()
+    _path = os.path.abspath(path)
+    os.makedirs(os.path.dirname(_path), exist_ok=True)
+    _owner = os.getpid()
+    # 子进程（spawn）导入本模块时据此自动启用
+    os.environ[ENV_VAR] = _path
+    os.environ[ENV_OWNER] = str(_owner)
+    _enabled = True
+    if sample_interval is not None:
+        start_sampler(sample_interval)
+
+
+def disable():
+    global _enabled, _file
+    stop_sampler()
+    _enabled = False
+    if _file is not None and _pid == os.getpid():
+        _file.close()
+    _file = None
+    os.environ.pop(ENV_VAR, None)
+    os.environ.pop(ENV_OWNER, None)
+
+
+def is_enabled():
+    return _enabled
+
+
+def _write(record):
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _lock:
+        f = _output()
+        f.write(line + '\n')
+        f.flush()
+
+
+# ---------- 记录 ----------
+class _Span:
+    __slots__ = ('name', 'book', 'items', 'parent')
+
+    def __init__(self, name, book, items, parent):
+        self.name = name
+        self.book = book
+        self.items = items
+        self.parent = parent
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+# 记录一个阶段：with span('lowess', book='B01', sentences=1200): ...
+@contextmanager
+def span(name, book=None, **items):
+    if not _enabled:
+        yield None
+        return
+    stack = _stack()
+    current = _Span(name, book, dict(items), stack[-1].name if stack else None)
+    stack.append(current)
+    start = time.time()
+    rss0 = rss_mb()[0]
+    w0, c0 = time.perf_counter(), time.process_time()
+    try:
+        yield current
+    finally:
+        wall, cpu = time.perf_counter() - w0, time.process_time() - c0
+        stack.pop()
+        rss, peak = rss_mb()
+        _write({
+            'stage': current.name,
+            'book': current.book,
+            'parent': current.parent,
+            'depth': len(stack),
+            'start': start,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'rss_start_mb': rss0,
+            'rss_mb': rss,
+            'rss_delta_mb': rss - rss0 if rss is not None and rss0 is not None else None,
+            'process_peak_rss_mb': peak,
+            'items': current.items,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+        })
+
+
+# 向当前阶段累加条目数（如逐本处理时 add_items(sentences=len(series))）
+def add_items(**items):
+    if not _enabled:
+        return
+    stack = _stack()
+    if stack:
+        counts = stack[-1].items
+        for key, value in items.items():
+            counts[key] = counts.get(key, 0) + value
+
+
+# 函数包装：describe(*args, **kwargs) 返回 {'book': ..., 条目名: 数量}，只在启用时调用
+def instrumented(name, describe=None):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            fields = describe(*args, **kwargs) if describe is not None else {}
+            with span(name, **fields):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---------- 采样剖析 ----------
+class _Sampler(threading.Thread):
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if names:
+                    self.stacks[';'.join(reversed(names))] += 1
+
+
+def start_sampler(interval=0.005):
+    global _sampler
+    stop_sampler()
+    _sampler = _Sampler(interval)
+    _sampler.start()
+
+
+def stop_sampler():
+    global _sampler
+    if _sampler is None:
+        return
+    _sampler.stopped.set()
+    _sampler.join()
+    if _path is not None and _sampler.stacks:
+        path = (_path if os.getpid() == _owner else _worker_path(_path, os.getpid())) + '.folded'
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in _sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+    _sampler = None
+
+
+# ---------- 读取与转换 ----------
+# 读取主进程与各子进程的记录
+def load_records(path):
+    path = os.path.abspath(path)
+    folder, name = os.path.split(path)
+    root, ext = os.path.splitext(name)
+    files = [path] + sorted(
+        os.path.join(folder, f) for f in os.listdir(folder)
+        if f.startswith(root + '.') and f.endswith(ext or '.jsonl') and f != name
+        and f[len(root) + 1:len(f) - len(ext or '.jsonl')].isdigit()
+    )
+    records = []
+    for file in files:
+        if not os.path.exists(file):
+            continue
+        with open(file, 'r', encoding='utf-8') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return sorted(records, key=lambda r: r['start'])
+
+
+# 汇总表：按阶段（可选再按书）合计耗时与条目数；内存列取最大的单次 RSS 增量与记录到的进程峰值
+def summary(records, by_book=False):
+    import pandas as pd
+    rows = [{'stage': r['stage'], 'book': r['book'], 'wall_s': r['wall_s'], 'cpu_s': r['cpu_s'],
+             'rss_delta_mb': r.get('rss_delta_mb'), 'process_peak_rss_mb': r.get('process_peak_rss_mb'), **r['items']}
+            for r in records]
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame(rows)
+    keys = ['stage', 'book'] if by_book else ['stage']
+    numeric = df.select_dtypes('number').columns
+    memory = ['rss_delta_mb', 'process_peak_rss_mb']
+    agg = {c: 'sum' for c in numeric if c not in memory}
+    agg.update({c: 'max' for c in memory if c in df})
+    result = df.groupby(keys, dropna=False).agg(agg)
+    result.insert(0, 'calls', df.groupby(keys, dropna=False).size())
+    return result.sort_values('wall_s', ascending=False)
+
+
+# 转换为 Chrome trace（完整事件 'X'，时间单位微秒）
+def to_chrome_trace(path, output=None):
+    records = load_records(path)
+    origin = records[0]['start'] if records else 0.0
+    events = [{
+        'name': r['stage'] if r['book'] is None else f"{r['stage']} [{r['book']}]",
+        'cat': r['stage'],
+        'ph': 'X',
+        'ts': (r['start'] - origin) * 1e6,
+        'dur': r['wall_s'] * 1e6,
+        'pid': r['pid'],
+        'tid': r['tid'],
+        'args': {'book': r['book'], 'cpu_s': r['cpu_s'], 'rss_mb': r['rss_mb'], 'rss_delta_mb': r.get('rss_delta_mb'),
+                 'process_peak_rss_mb': r.get('process_peak_rss_mb'), **r['items']},
+    } for r in records]
+    output = output or os.path.splitext(os.path.abspath(path))[0] + '.trace.json'
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+    return output
+
+
+# 环境变量自动启用（子进程以 spawn 方式启动时同样生效）
+if os.environ.get(ENV_VAR):
+    _path = os.environ[ENV_VAR]
+    _owner = int(os.environ.setdefault(ENV_OWNER, str(os.getpid())))
+    _enabled = True
+
+atexit.register(stop_sampler)
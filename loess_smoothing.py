@@ -0,0 +1,230 @@
+# loess_smoothing.py
+# LOESS 平滑引擎（Code7、Code9 共用）：
+#   exact  statsmodels 精确 lowess（与原脚本结果一致）
+#   fast   lowess 的 delta 插值快速路径：只在间距 delta 的锚点上拟合，其余点线性插值，误差随 delta/带宽 平方减小
+#   box    O(n) 局部线性平滑：均匀权重窗口，前缀和一次求出所有窗口的回归系数（无稳健迭代）
+# 并按 (小说编号, 序列名, frac, method) 记忆结果，同一条曲线一次运行内只平滑一次；可选磁盘记忆目录供不同脚本复用
+
+import os
+import hashlib
+import numpy as np
+from statsmodels.nonparametric.smoothers_lowess import lowess
+from instrumentation import instrumented, add_items
+
+METHODS = ('exact', 'fast', 'box')
+
+# fast 路径的 delta 相对于平滑带宽（frac * x 范围）的比例
+FAST_DELTA_RATIO = 0.02
+
+_memo = {}
+_memo_dir = None
+
+
+# 设置磁盘记忆目录（None 表示只在内存中记忆）
+def set_memo_dir(path):
+    global _memo_dir
+    _memo_dir = path
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+
+
+def clear_memo():
+    _memo.clear()
+
+
+# 数据指纹：同一 key 下数据发生变化时不会误用旧结果
+def _fingerprint(scores, x):
+    h = hashlib.sha1(np.ascontiguousarray(scores).tobytes())
+    h.update(np.ascontiguousarray(x).tobytes())
+    return h.hexdigest()
+
+
+# fast 路径的 delta：带宽的固定比例
+def fast_delta(x, frac):
+    if len(x) == 0:
+        return 0.0
+    return FAST_DELTA_RATIO * frac * float(np.nanmax(x) - np.nanmin(x))
+
+
+# box 平滑的共享结构：x 排序一次，归一化后的前缀和供任意 frac 的窗口复用
+def _box_state(scores, x):
+    scores = np.asarray(scores, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    order = np.argsort(x, kind='stable')
+    xs, ys = x[order], scores[order]
+    w = np.isfinite(ys) & np.isfinite(xs)
+    # x 归一化到 [0, 1]，避免前缀和中的大数相减损失精度
+    span = xs[w].max() - xs[w].min() if w.any() else 0.0
+    xn = np.where(w, (xs - (xs[w].min() if w.any() else 0.0)) / (span if span > 0 else 1.0), 0.0)
+    yn = np.where(w, ys, 0.0)
+    wf = w.astype(np.float64)
+
+    def prefix(a):
+        return np.concatenate(([0.0], np.cumsum(a)))
+
+    sums = (prefix(wf), prefix(wf * xn), prefix(wf * yn), prefix(wf * xn * xn), prefix(wf * xn * yn))
+    return order, xn, sums
+
+
+# 在共享结构上一次拟合多个 frac：返回 (len(fracs), n)，按输入顺序排列
+def _box_fit(state, fracs):
+    order, xn, (S, Sx, Sy, Sxx, Sxy) = state
+    n = len(order)
+    m = np.array([min(n, max(2, int(np.ceil(f * n)))) for f in fracs], dtype=np.int64)[:, None]
+    lo = np.clip(np.arange(n)[None, :] - m // 2, 0, n - m)
+    hi = lo + m
+
+    s, sx, sy = S[hi] - S[lo], Sx[hi] - Sx[lo], Sy[hi] - Sy[lo]
+    sxx, sxy = Sxx[hi] - Sxx[lo], Sxy[hi] - Sxy[lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        denom = s * sxx - sx * sx
+        slope = np.where(np.abs(denom) > 1e-12 * np.maximum(s * sxx, 1e-300), (s * sxy - sx * sy) / denom, 0.0)
+        fitted = (sy - slope * sx) / s + slope * xn
+
+    result = np.empty((len(fracs), n))
+    result[:, order] = fitted
+    return result
+
+
+# O(n) 局部线性平滑：每个点取按位置居中的 ceil(frac*n) 个邻居，均匀权重最小二乘直线拟合
+def box_smooth(scores, x, frac):
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(scores) == 0:
+        return scores.copy()
+    return _box_fit(_box_state(scores, x), [frac])[0]
+
+
+def _compute(scores, x, frac, method, it):
+    if method == 'box':
+        return box_smooth(scores, x, frac)
+    delta = fast_delta(x, frac) if method == 'fast' else 0.0
+    smoothed = lowess(scores, x, frac=frac, it=it, delta=delta, return_sorted=False)
+    return np.asarray(smoothed, dtype=np.float64).flatten()
+
+
+def _describe(scores, frac=0.3, x=None, method='exact', key=None, it=3):
+    book = key[0] if isinstance(key, (tuple, list)) and key else key
+    return {'book': book, 'sentences': len(scores), 'method': method}
+
+
+# 平滑一条曲线（返回与输入等长、按输入顺序排列的数组）
+#   key: 记忆键，如 ('B01', 'main')；为 None 时不记忆
+@instrumented('smooth', _describe)
+def smooth(scores, frac=0.3, x=None, method='exact', key=None, it=3):
+    if method not in METHODS:
+        raise ValueError(f"未知的平滑方法：{method}，可选 {METHODS}")
+    scores = np.asarray(scores, dtype=np.float64)
+    x = np.arange(len(scores), dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    if key is None:
+        return _compute(scores, x, frac, method, it)
+
+    memo_key = _memo_key(key, frac, method, it, _fingerprint(scores, x))
+    smoothed = _memo_get(memo_key)
+    if smoothed is None:
+        smoothed = _memo_put(memo_key, _compute(scores, x, frac, method, it))
+    return smoothed
+
+
+# 写入记忆：其他进程已算好的平滑结果（如进程池任务返回的曲线）放入本进程的记忆，之后同参数的 smooth / smooth_sweep 直接命中
+def remember(scores, smoothed, frac=0.3, x=None, method='exact', key=None, it=3):
+    scores = np.asarray(scores, dtype=np.float64)
+    x = np.arange(len(scores), dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    smoothed = np.array(smoothed, dtype=np.float64)
+    if len(smoothed) != len(scores):
+        raise ValueError("平滑结果与原始序列的长度不一致")
+    return _memo_put(_memo_key(key, frac, method, it, _fingerprint(scores, x)), smoothed)
+
+
+def _memo_key(key, frac, method, it, fingerprint):
+    return (tuple(key) if isinstance(key, (tuple, list)) else key, float(frac), method, it, fingerprint)
+
+
+def _disk_path(memo_key):
+    if _memo_dir is None:
+        return None
+    name = hashlib.sha1(repr(memo_key).encode('utf-8')).hexdigest()
+    return os.path.join(_memo_dir, f"{name}.npy")
+
+
+# 读取记忆结果（内存或磁盘），未命中返回 None
+def _memo_get(memo_key):
+    if memo_key in _memo:
+        add_items(memo_hit=1)
+        return _memo[memo_key]
+    disk_path = _disk_path(memo_key)
+    if disk_path is not None and os.path.exists(disk_path):
+        smoothed = np.load(disk_path)
+        smoothed.setflags(write=False)
+        _memo[memo_key] = smoothed
+        return smoothed
+    return None
+
+
+def _memo_put(memo_key, smoothed):
+    smoothed.setflags(write=False)
+    _memo[memo_key] = smoothed
+    disk_path = _disk_path(memo_key)
+    if disk_path is not None:
+        np.save(disk_path, smoothed)
+    return smoothed
+
+
+def _describe_sweep(scores, fracs, x=None, method='exact', key=None, it=3):
+    return dict(_describe(scores, x=x, method=method, key=key, it=it), fracs=len(fracs))
+
+
+# 多带宽平滑：一条曲线在一组 frac 下的平滑结果 {frac: 曲线}（与逐个调用 smooth 的结果相同）
+#   x 只排序一次；box 方法的前缀和与窗口在全部 frac 间共用，一次向量化算出 (len(fracs), n)；
+#   exact / fast 方法在排好序的数组上逐个 frac 调用 lowess（跳过每次调用的排序）
+#   key 不为 None 时逐个 frac 读写与 smooth 相同的记忆，之后 smooth 调用同一 frac 直接命中
+@instrumented('smooth_sweep', _describe_sweep)
+def smooth_sweep(scores, fracs, x=None, method='exact', key=None, it=3):
+    if method not in METHODS:
+        raise ValueError(f"未知的平滑方法：{method}，可选 {METHODS}")
+    scores = np.asarray(scores, dtype=np.float64)
+    x = np.arange(len(scores), dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    fracs = [float(f) for f in dict.fromkeys(fracs)]
+
+    results, memo_keys = {}, {}
+    if key is not None:
+        fingerprint = _fingerprint(scores, x)
+        for frac in fracs:
+            memo_keys[frac] = _memo_key(key, frac, method, it, fingerprint)
+            cached = _memo_get(memo_keys[frac])
+            if cached is not None:
+                results[frac] = cached
+    missing = [f for f in fracs if f not in results]
+
+    if missing and len(scores) == 0:
+        computed = {f: scores.copy() for f in missing}
+    elif missing and method == 'box':
+        computed = dict(zip(missing, _box_fit(_box_state(scores, x), missing)))
+    elif missing:
+        order = np.argsort(x, kind='stable')
+        xs, ys = x[order], scores[order]
+        computed = {}
+        for frac in missing:
+            delta = fast_delta(xs, frac) if method == 'fast' else 0.0
+            fitted = lowess(ys, xs, frac=frac, it=it, delta=delta, is_sorted=True, return_sorted=False)
+            smoothed = np.empty(len(scores))
+            smoothed[order] = np.asarray(fitted, dtype=np.float64).flatten()
+            computed[frac] = smoothed
+    else:
+        computed = {}
+
+    for frac, smoothed in computed.items():
+        results[frac] = _memo_put(memo_keys[frac], smoothed) if key is not None else smoothed
+    return {frac: results[frac] for frac in fracs}
+
+
+# 流式平滑：books 为逐本产出 (书号, 序列) 或 (书号, {列名: 数组}) 的迭代器（如 stream_reader.iter_books），
+# 逐本产出 (书号, 平滑结果)；key 以 (书号, column) 记忆
+def smooth_stream(books, column='Intensity_polarized', frac=0.3, method='exact', fillna=None, it=3, memo=False):
+    for book_id, values in books:
+        if isinstance(values, dict):
+            values = values[column]
+        scores = np.asarray(values, dtype=np.float64)
+        if fillna is not None:
+            scores = np.where(np.isnan(scores), fillna, scores)
+        yield book_id, smooth(scores, frac, method=method, key=(book_id, column) if memo else None, it=it)
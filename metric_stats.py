@@ -0,0 +1,184 @@
+# metric_stats.py
+# 波动特征的类型差异检验（Code6）：各小说类型的指标均值及其置信区间，以及每对类型之间的差异检验
+#   书级 bootstrap：各类型内有放回重抽书，一批重抽为一个 (B, 书数) 下标矩阵，一次取值求均值
+#   标签置换检验：两类书合并后随机重分组，一批置换为一个随机键 argsort 得到的 (S, 书数) 下标矩阵，双侧经验 p 值 + BH 校正
+#   句子块 bootstrap：每本书内按定长句子块有放回重抽（移动块 bootstrap，保留块内的相邻相关），
+#   一批 R 次重抽拼接为 R × 书数 段，由 fluctuation_metrics.batch_metrics 一次算出全部指标，
+#   同时反映书内句子层面的抽样不确定性
+#   重抽按内存预算分块生成（每块只保留汇总后的类型均值），10 万次重抽时内存占用也与块大小同阶；
+#   随机数按顺序从同一个生成器取出，结果与分块大小无关
+
+from collections import namedtuple
+from itertools import combinations
+import numpy as np
+import pandas as pd
+
+from fluctuation_metrics import METRICS, batch_metrics
+from motif_mining import bh_adjust
+from transition_engine import TYPE_MAP
+from instrumentation import instrumented
+
+TYPE_COLUMNS = ['Metric', 'Novel_Type', 'Books', 'Mean', 'CI_low', 'CI_high']
+PAIR_COLUMNS = ['Metric', 'Type_A', 'Type_B', 'Diff', 'CI_low', 'CI_high', 'P', 'Q', 'Test']
+
+DEFAULT_MEMORY_MB = 256
+# 句子块 bootstrap 中每个重抽值在 batch_metrics 内的临时数组约占字节数（下标、取值与十余个同长中间数组）
+_BYTES_PER_VALUE = 160
+
+# 检验结果：types 为各类型均值与置信区间，pairs 为类型两两差异（Diff = A - B）
+Comparison = namedtuple('Comparison', ['types', 'pairs'])
+
+
+# 每块的重抽次数：单次重抽占 row_bytes 字节时，块内不超过内存预算
+def _chunk_size(row_bytes, memory_mb):
+    return max(1, int(memory_mb * 2 ** 20 // max(row_bytes, 1)))
+
+
+def _chunks(total, size):
+    for start in range(0, total, size):
+        yield min(size, total - start)
+
+
+# 各类型的书（按 metrics 的行顺序），未映射到类型的书不参与
+def _type_rows(books, type_map):
+    types = pd.Series(list(books), dtype=object).map(type_map)
+    return {t: np.flatnonzero((types == t).to_numpy()) for t in sorted(types.dropna().unique())}
+
+
+def _nanmean(values, axis):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        present = ~np.isnan(values)
+        return np.where(present, values, 0.0).sum(axis=axis) / present.sum(axis=axis)
+
+
+def _percentile_ci(samples, ci):
+    alpha = (1 - ci) / 2
+    with np.errstate(invalid='ignore'):
+        return np.nanquantile(samples, alpha, axis=0), np.nanquantile(samples, 1 - alpha, axis=0)
+
+
+# 由各类型的重抽均值 (R, 类型数, 指标数) 汇总两张表
+def _summarize(observed, samples, type_names, counts, metrics, ci, pair_p=None, test='bootstrap'):
+    types_rows = []
+    low, high = _percentile_ci(samples, ci)
+    for j, metric in enumerate(metrics):
+        for i, t in enumerate(type_names):
+            types_rows.append((metric, t, counts[i], observed[i, j], low[i, j], high[i, j]))
+
+    pair_rows = []
+    for j, metric in enumerate(metrics):
+        rows = []
+        for a, b in combinations(range(len(type_names)), 2):
+            diff = samples[:, a, j] - samples[:, b, j]
+            valid = diff[~np.isnan(diff)]
+            if pair_p is not None:
+                p = pair_p[(a, b)][j]
+            elif len(valid):
+                # bootstrap 双侧 p 值：差值分布跨过 0 的比例
+                p = min(1.0, 2 * (1 + min((valid <= 0).sum(), (valid >= 0).sum())) / (len(valid) + 1))
+            else:
+                p = np.nan
+            d_low, d_high = _percentile_ci(diff[:, None], ci)
+            rows.append([metric, type_names[a], type_names[b], observed[a, j] - observed[b, j],
+                         d_low[0], d_high[0], p])
+        # 同一指标的各类型对之间做 BH 校正
+        q_values = bh_adjust(np.nan_to_num([row[-1] for row in rows], nan=1.0))
+        pair_rows.extend(row + [q, test] for row, q in zip(rows, q_values))
+    return Comparison(pd.DataFrame(types_rows, columns=TYPE_COLUMNS),
+                      pd.DataFrame(pair_rows, columns=PAIR_COLUMNS))
+
+
+# 两类书的标签置换检验：返回各指标的双侧 p 值
+def _permutation_p(values_a, values_b, n_perm, rng, memory_mb):
+    pooled = np.concatenate([values_a, values_b])
+    n_a, n = len(values_a), len(pooled)
+    observed = np.abs(_nanmean(values_a, 0) - _nanmean(values_b, 0))
+    extreme = np.zeros(pooled.shape[1], dtype=np.int64)
+    for size in _chunks(n_perm, _chunk_size(n * pooled.shape[1] * 8 * 3, memory_mb)):
+        perm = np.argsort(rng.random((size, n)), axis=1)
+        permuted = pooled[perm]
+        null = np.abs(_nanmean(permuted[:, :n_a], 1) - _nanmean(permuted[:, n_a:], 1))
+        extreme += (null >= observed - 1e-12).sum(axis=0)
+    return (1 + extreme) / (n_perm + 1)
+
+
+# 书级 bootstrap 置信区间 + 标签置换检验
+#   metrics:  batch_metrics 的结果（索引为小说编号）
+#   type_map: 小说编号 → 小说类型
+#   n_boot / n_perm: 重抽 / 置换次数
+#   ci:       置信水平（百分位区间）
+#   memory_mb: 每块重抽的内存预算
+@instrumented('metric_tests', lambda metrics, *a, **kw: {'books': len(metrics), 'resamples': kw.get('n_boot', 10000)})
+def compare_types(metrics, type_map=TYPE_MAP, n_boot=10000, n_perm=10000, ci=0.95, seed=0,
+                  columns=METRICS, memory_mb=DEFAULT_MEMORY_MB):
+    rng = np.random.default_rng(seed)
+    values = metrics[list(columns)].to_numpy(dtype=np.float64)
+    rows = _type_rows(metrics.index, type_map)
+    type_names = list(rows)
+    M = values.shape[1]
+
+    observed = np.stack([_nanmean(values[r], 0) for r in rows.values()]) if rows else np.empty((0, M))
+    samples = np.empty((n_boot, len(type_names), M))
+    for i, r in enumerate(rows.values()):
+        done = 0
+        for size in _chunks(n_boot, _chunk_size(len(r) * M * 8 * 2, memory_mb)):
+            idx = r[rng.integers(0, len(r), size=(size, len(r)))]
+            samples[done:done + size, i] = _nanmean(values[idx], 1)
+            done += size
+
+    pair_p = {(a, b): _permutation_p(values[rows[type_names[a]]], values[rows[type_names[b]]], n_perm, rng, memory_mb)
+              for a, b in combinations(range(len(type_names)), 2)}
+    counts = [len(r) for r in rows.values()]
+    return _summarize(observed, samples, type_names, counts, list(columns), ci, pair_p, test='permutation')
+
+
+# 一批句子块重抽的下标：(size, 句子总数)，第 r 行为第 r 次重抽后全部书按原顺序拼接的句子位置
+def _block_indices(offsets, block, size, rng):
+    lengths = np.diff(offsets)
+    block_len = np.minimum(block, lengths)
+    n_blocks = -(-lengths // np.maximum(block_len, 1))
+    block_offsets = np.concatenate(([0], np.cumsum(n_blocks)))
+    seg = np.repeat(np.arange(len(lengths)), lengths)
+    local = np.arange(offsets[-1]) - offsets[:-1][seg]
+    width = np.maximum(block_len, 1)[seg]
+    block_id = block_offsets[:-1][seg] + local // width
+
+    # 每个块的起点在 [0, 长度 - 块长] 内均匀抽取
+    span = (lengths - block_len + 1)[np.repeat(np.arange(len(lengths)), n_blocks)]
+    starts = np.floor(rng.random((size, block_offsets[-1])) * span).astype(np.int64)
+    return offsets[:-1][seg] + starts[:, block_id] + local % width
+
+
+# 句子块 bootstrap
+#   values / offsets: 全部书拼接的 Intensity_polarized 与偏移索引（同 batch_metrics）
+#   books:    小说编号（与 offsets 对应）
+#   block:    块长（句数），短于块长的书整本为一块
+@instrumented('block_bootstrap', lambda values, offsets, *a, **kw: {'books': len(offsets) - 1, 'sentences': len(values),
+                                                                    'resamples': kw.get('n_boot', 1000)})
+def block_bootstrap(values, offsets, books, type_map=TYPE_MAP, n_boot=1000, block=50, ci=0.95, seed=0,
+                    columns=METRICS, memory_mb=DEFAULT_MEMORY_MB):
+    rng = np.random.default_rng(seed)
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_books, N = len(offsets) - 1, len(values)
+    columns = list(columns)
+    rows = _type_rows(books, type_map)
+    type_names = list(rows)
+
+    observed_metrics = batch_metrics(values, offsets)[columns].to_numpy()
+    observed = np.stack([_nanmean(observed_metrics[r], 0) for r in rows.values()]) if rows else np.empty((0, len(columns)))
+
+    samples = np.empty((n_boot, len(type_names), len(columns)))
+    done = 0
+    for size in _chunks(n_boot, _chunk_size(N * _BYTES_PER_VALUE, memory_mb)):
+        idx = _block_indices(offsets, block, size, rng)
+        # size 次重抽拼接为 size × n_books 段，一次批量计算
+        stacked = (offsets[:-1][None, :] + (np.arange(size) * N)[:, None]).ravel()
+        chunk = batch_metrics(values[idx].ravel(), np.append(stacked, size * N))[columns].to_numpy()
+        chunk = chunk.reshape(size, n_books, len(columns))
+        for i, r in enumerate(rows.values()):
+            samples[done:done + size, i] = _nanmean(chunk[:, r], 1)
+        done += size
+
+    counts = [len(r) for r in rows.values()]
+    return _summarize(observed, samples, type_names, counts, columns, ci, test='block_bootstrap')
@@ -0,0 +1,209 @@
+# motif_mining.py
+# 情感模体挖掘与置换显著性检验：统计各小说类型中长度 2..L 的全部情感类型 n-gram（如 Fear→Hop→Joy），
+# 并与随机打乱后的零模型比较，判断某个模体是否比偶然出现得更频繁
+#   n-gram 计数：情感类型编码为整数，n 个相邻编码打包为 K 进制整数，np.bincount 一次计数（不跨越两本书）
+#   零模型：'book' 在每本书内部打乱句子的情感类型（保持每本书的情感构成），'type' 在整个类型内打乱
+#   置换检验：一批 S 次打乱用随机键 argsort 同时生成 (S, N) 矩阵，打包后在观测到的模体中二分查找、加上行偏移一次 bincount
+#   得到 (S, 模体数) 计数，不逐次循环；各小说类型在进程池中并行
+#   输出观测频数、零模型均值 / 标准差、z 值、单侧经验 p 值（(1 + #{零模型 >= 观测}) / (S + 1)）与 BH 校正 q 值
+
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from transition_engine import TYPE_MAP, _is_missing, _sort_sentences, encode_emotions
+from instrumentation import instrumented
+
+NULL_MODELS = ('book', 'type')
+COLUMNS = ['Novel_Type', 'Length', 'Motif', 'Observed', 'NullMean', 'NullStd', 'Z', 'P_over', 'P_under', 'Q_over']
+
+
+# 各类型的编码序列：返回 {类型: (codes, book_codes)}，句子按小说编号、句子编号排序，去除无情感类型的句子
+# （指定 labels 时，不在 labels 中的情感类型也一并去除）
+def type_sequences(df, labels=None, type_map=TYPE_MAP, book_col='小说编号', sort_col='句子编号',
+                   emotion_col='Emotional Types'):
+    df = df[~_is_missing(df[emotion_col])]
+    df = _sort_sentences(df, book_col, sort_col)
+    codes, labels = encode_emotions(df[emotion_col], labels)
+    book_codes, books = pd.factorize(df[book_col], sort=True)
+    book_types = pd.Series(list(books), dtype=object).map(type_map).to_numpy()
+    sequences = {}
+    for novel_type in sorted(t for t in set(book_types) if isinstance(t, str)):
+        mask = book_types[book_codes] == novel_type
+        keep = mask & (codes >= 0)
+        # 重新编号为类型内连续的书号
+        sequences[novel_type] = (codes[keep], pd.factorize(book_codes[keep])[0])
+    return sequences, labels
+
+
+# n-gram 打包编码：codes 形状 (S, N)，返回 (S, 不跨书的窗口数)，每个元素为 n 个相邻编码的 K 进制整数
+def _packed_ngrams(codes, book_codes, K, n):
+    codes = np.atleast_2d(codes)
+    S, N = codes.shape
+    if N < n:
+        return np.zeros((S, 0), dtype=np.int64)
+    width = N - n + 1
+    valid = book_codes[:width] == book_codes[n - 1:]
+    packed = np.zeros((S, width), dtype=np.int64)
+    for h in range(n):
+        packed *= K
+        packed += codes[:, h:h + width]
+    return packed[:, valid]
+
+
+# n-gram 计数：codes 形状 (S, N)（每行一条序列）
+#   cells: 只统计这些格子（升序的打包编码），返回 (S, len(cells))；为 None 时返回全部 K^n 个格子 (S, K^n)
+def ngram_counts(codes, book_codes, K, n, cells=None):
+    packed = _packed_ngrams(codes, book_codes, K, n)
+    S = packed.shape[0]
+    if cells is None:
+        C = K ** n
+        slot, hit = packed, None
+    else:
+        C = len(cells)
+        if C == 0:
+            return np.zeros((S, 0), dtype=np.int64)
+        slot = np.searchsorted(cells, packed)
+        np.minimum(slot, C - 1, out=slot)
+        hit = cells[slot] == packed
+    slot += (np.arange(S, dtype=np.int64) * C)[:, None]
+    flat = slot.ravel() if hit is None else slot[hit]
+    return np.bincount(flat, minlength=S * C).reshape(S, C)
+
+
+# 一批打乱：随机键加上分组编号后 argsort，各组内部独立随机排列
+def _shuffled(codes, groups, S, rng):
+    keys = rng.random((S, len(codes))) + groups[None, :]
+    return codes[np.argsort(keys, axis=1)]
+
+
+# Benjamini-Hochberg 校正
+def bh_adjust(p):
+    p = np.asarray(p, dtype=np.float64)
+    n = len(p)
+    if n == 0:
+        return p
+    order = np.argsort(p)
+    ranked = p[order] * n / np.arange(1, n + 1)
+    q = np.minimum.accumulate(ranked[::-1])[::-1]
+    out = np.empty(n)
+    out[order] = np.minimum(q, 1.0)
+    return out
+
+
+def _motif_names(K, n, labels, cells):
+    digits = np.empty((len(cells), n), dtype=np.int64)
+    rest = cells.copy()
+    for h in range(n - 1, -1, -1):
+        digits[:, h] = rest % K
+        rest //= K
+    return ['→'.join(labels[d] for d in row) for row in digits]
+
+
+# 单个类型的模体检验（进程池任务，需为模块级函数）
+@instrumented('motif_test', lambda job: {'novel_type': job[0], 'sentences': len(job[1]), 'shuffles': job[6]})
+def _type_task(job):
+    novel_type, codes, book_codes, labels, max_length, null, n_shuffles, batch, seed, min_count = job
+    K = len(labels)
+    rng = np.random.default_rng(seed)
+    groups = book_codes if null == 'book' else np.zeros_like(book_codes)
+    lengths = range(2, max_length + 1)
+
+    # 零模型只需统计要报告的格子（观测频数 >= min_count）：min_count >= 1 时只有观测到的 n-gram，
+    # 每批的计数为 (S, 格子数)，不再是 (S, K^n)
+    cells, observed = {}, {}
+    for n in lengths:
+        candidates = (np.unique(_packed_ngrams(codes, book_codes, K, n)) if min_count >= 1
+                      else np.arange(K ** n, dtype=np.int64))
+        counts = ngram_counts(codes, book_codes, K, n, candidates)[0]
+        keep = counts >= min_count
+        cells[n], observed[n] = candidates[keep], counts[keep]
+    total = {n: np.zeros(len(cells[n])) for n in lengths}
+    total_sq = {n: np.zeros(len(cells[n])) for n in lengths}
+    over = {n: np.zeros(len(cells[n]), dtype=np.int64) for n in lengths}
+    under = {n: np.zeros(len(cells[n]), dtype=np.int64) for n in lengths}
+
+    # 分批打乱，每批所有长度共用同一组打乱序列
+    done = 0
+    while done < n_shuffles:
+        S = min(batch, n_shuffles - done)
+        shuffled = _shuffled(codes, groups, S, rng)
+        for n in lengths:
+            null_counts = ngram_counts(shuffled, book_codes, K, n, cells[n])
+            total[n] += null_counts.sum(axis=0)
+            total_sq[n] += (null_counts.astype(np.float64) ** 2).sum(axis=0)
+            over[n] += (null_counts >= observed[n]).sum(axis=0)
+            under[n] += (null_counts <= observed[n]).sum(axis=0)
+        done += S
+
+    frames = []
+    for n in lengths:
+        mean = total[n] / n_shuffles
+        std = np.sqrt(np.maximum(total_sq[n] / n_shuffles - mean ** 2, 0.0))
+        obs = observed[n]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z = np.where(std > 0, (obs - mean) / std, np.nan)
+        p_over = (1 + over[n]) / (n_shuffles + 1)
+        frames.append(pd.DataFrame({
+            'Novel_Type': novel_type,
+            'Length': n,
+            'Motif': _motif_names(K, n, labels, cells[n]),
+            'Observed': obs,
+            'NullMean': mean,
+            'NullStd': std,
+            'Z': z,
+            'P_over': p_over,
+            'P_under': (1 + under[n]) / (n_shuffles + 1),
+            'Q_over': bh_adjust(p_over),
+        }, columns=COLUMNS))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COLUMNS)
+
+
+# 模体挖掘与显著性检验
+#   max_length: 最长模体长度 L（统计 2..L）
+#   null:       零模型，'book'（书内打乱）或 'type'（类型内打乱）
+#   n_shuffles: 打乱次数；batch 为每批同时计算的打乱数（内存约 batch × 句子数 × 8 字节 × 4：打乱的随机键与排序下标、
+#               打包编码与格子下标；min_count 为 0 时还有 batch × K^L × 8 字节的全格子计数）
+#   min_count:  只报告观测频数不少于该值的模体
+#   n_jobs:     进程数（None 为 CPU 核数，1 为在当前进程计算）
+def mine_motifs(df, max_length=3, null='book', n_shuffles=1000, batch=200, min_count=1, seed=0,
+                type_map=TYPE_MAP, labels=None, n_jobs=None):
+    if null not in NULL_MODELS:
+        raise ValueError(f"未知的零模型：{null}，可选 {NULL_MODELS}")
+    if max_length < 2:
+        raise ValueError("max_length 至少为 2")
+    sequences, labels = type_sequences(df, labels, type_map)
+    # 各类型的随机种子由 seed 与类型名确定，结果与进程数无关
+    jobs = [(t, codes, books, labels, max_length, null, n_shuffles, batch,
+             [seed, zlib.crc32(t.encode('utf-8'))], min_count)
+            for t, (codes, books) in sequences.items()]
+
+    if n_jobs == 1 or len(jobs) <= 1:
+        frames = [_type_task(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            frames = list(pool.map(_type_task, jobs))
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    result = pd.concat(frames, ignore_index=True)
+    return result.sort_values(['Novel_Type', 'Length', 'P_over', 'Z'], ascending=[True, True, True, False],
+                              kind='stable', ignore_index=True)
+
+
+if __name__ == "__main__":
+    from corpus_cache import load_table, DATA1_PATH
+
+    # 参数配置
+    max_length = 3
+    n_shuffles = 1000
+    output_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "tables")
+    os.makedirs(output_folder, exist_ok=True)
+
+    df = load_table(DATA1_PATH)
+    motif_df = mine_motifs(df, max_length=max_length, n_shuffles=n_shuffles)
+
+    output_path = os.path.join(output_folder, "Emotion_Motif_Significance.csv")
+    motif_df.to_csv(output_path, index=False, encoding='utf-8-sig')
+    print("模体检验完成，结果保存于：", output_path)
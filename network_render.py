@@ -0,0 +1,165 @@
+# network_render.py
+# 情感转移网络绘图（Code5）：
+#   共享布局：在全部情感节点（各类型、各阈值网络的并集）与全语料转移权重上只计算一次 spring_layout，
+#   所有类型与阈值的网络图使用同一组节点坐标，图之间可直接对比；布局按 节点集合 + 边权 + 布局参数 的哈希缓存到磁盘
+#   批量绘制：边线（含自环）为一个 LineCollection，箭头为一个 PolyCollection，节点为一次 scatter，
+#   不再逐边创建 FancyArrowPatch；渲染多个网络变体时耗时主要在写文件上
+
+import os
+import json
+import hashlib
+import numpy as np
+import networkx as nx
+from instrumentation import span
+
+LAYOUT_VERSION = 1
+
+# 与 nx.draw_networkx_* 默认外观一致的参数
+NODE_SIZE = 2000
+TOP_NODE_SIZE = 3000
+ARROW_LENGTH = 10   # 箭头长度（磅）
+ARROW_WIDTH = 6     # 箭头底边宽度（磅）
+
+
+def _layout_key(nodes, edges, params):
+    payload = {'version': LAYOUT_VERSION, 'nodes': sorted(map(str, nodes)),
+               'edges': sorted([str(u), str(v), float(w)] for u, v, w in edges), 'params': params}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+# 共享布局：返回 {节点: (x, y)}
+#   nodes:     全部情感节点（如 count_transitions 的 labels）
+#   edges:     [(源, 目标, 权重), ...]，通常为全语料转移计数
+#   cache_dir: 布局缓存目录（None 为不缓存）
+def shared_layout(nodes, edges=(), k=2, seed=42, iterations=50, cache_dir=None):
+    params = {'k': k, 'seed': seed, 'iterations': iterations}
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, f"layout-{_layout_key(nodes, edges, params)}.json")
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return {node: tuple(xy) for node, xy in json.load(f).items()}
+
+    G = nx.DiGraph()
+    G.add_nodes_from(nodes)
+    G.add_weighted_edges_from((u, v, w) for u, v, w in edges if u != v)
+    with span('layout', nodes=G.number_of_nodes(), edges=G.number_of_edges()):
+        pos = nx.spring_layout(G, k=k, seed=seed, iterations=iterations)
+    pos = {node: (float(x), float(y)) for node, (x, y) in pos.items()}
+
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(pos, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    return pos
+
+
+# 单个类型的布局（原 Code5 口径，每个网络单独计算）
+def graph_layout(edges, k=2, seed=42):
+    G = nx.DiGraph()
+    G.add_weighted_edges_from(edges)
+    return {node: tuple(xy) for node, xy in nx.spring_layout(G, k=k, seed=seed).items()}
+
+
+# 边的几何（显示坐标下计算后转回数据坐标）：线段从源节点边缘到箭头底边，箭头尖端落在目标节点边缘
+def _edge_geometry(ax, src, dst, src_radius, dst_radius):
+    to_display = ax.transData
+    to_data = to_display.inverted()
+    scale = ax.figure.dpi / 72.0
+    p0, p1 = to_display.transform(src), to_display.transform(dst)
+    d = p1 - p0
+    length = np.hypot(d[:, 0], d[:, 1])[:, None]
+    u = d / np.where(length > 0, length, 1.0)
+    normal = np.column_stack([-u[:, 1], u[:, 0]])
+    start = p0 + u * (src_radius * scale)[:, None]
+    tip = p1 - u * (dst_radius * scale)[:, None]
+    base = tip - u * ARROW_LENGTH * scale
+    half = normal * ARROW_WIDTH * scale / 2
+    lines = np.stack([start, base], axis=1)
+    heads = np.stack([tip, base + half, base - half], axis=1)
+    mid = (start + tip) / 2
+
+    def back(points):
+        shape = points.shape
+        return to_data.transform(points.reshape(-1, 2)).reshape(shape)
+
+    return back(lines), back(heads), back(mid)
+
+
+# 自环：节点上方与节点边缘相切的圆
+def _loop_geometry(ax, centers, radius):
+    to_display = ax.transData
+    scale = ax.figure.dpi / 72.0
+    p = to_display.transform(centers)
+    r = (radius * scale * 0.6)[:, None]
+    theta = np.linspace(0, 2 * np.pi, 33)
+    cy = p[:, 1:2] + radius[:, None] * scale + r
+    xs = p[:, 0:1] + r * np.cos(theta)
+    ys = cy + r * np.sin(theta)
+    loops = np.stack([xs, ys], axis=2)
+    top = np.column_stack([p[:, 0], cy[:, 0] + r[:, 0]])
+    to_data = to_display.inverted()
+    return to_data.transform(loops.reshape(-1, 2)).reshape(loops.shape), to_data.transform(top)
+
+
+# 绘制一张网络图（render_pool 渲染任务的绘图函数，由渲染层统一保存）
+#   edges:     [(源, 目标, 权重), ...]（已按阈值过滤）
+#   pos:       {节点: (x, y)}，可为共享布局（包含图中没有的节点，只绘制出现在边中的节点）
+#   top_nodes: 高亮节点（中介中心性前 3）
+def draw_network(edges, pos, top_nodes=(), title=None, figsize=(16, 12), edge_labels=True):
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection, PolyCollection
+
+    fig, ax = plt.subplots(figsize=figsize)
+    nodes = list(dict.fromkeys(n for u, v, _ in edges for n in (u, v)))
+    if title is not None:
+        ax.set_title(title, fontsize=18)
+    ax.axis('off')
+    if not nodes:
+        return fig
+
+    xy = np.array([pos[n] for n in nodes], dtype=np.float64)
+    top = set(top_nodes)
+    sizes = np.array([TOP_NODE_SIZE if n in top else NODE_SIZE for n in nodes], dtype=np.float64)
+    radius = np.sqrt(sizes) / 2
+
+    # 坐标范围先固定，之后按显示坐标计算边的几何
+    span_xy = np.ptp(xy, axis=0)
+    pad = np.maximum(span_xy, 1e-6) * 0.12
+    ax.set_xlim(xy[:, 0].min() - pad[0], xy[:, 0].max() + pad[0])
+    ax.set_ylim(xy[:, 1].min() - pad[1], xy[:, 1].max() + pad[1] * 1.5)
+    ax.set_autoscale_on(False)
+    fig.tight_layout()
+
+    index = {n: i for i, n in enumerate(nodes)}
+    src = np.array([index[u] for u, _, _ in edges])
+    dst = np.array([index[v] for _, v, _ in edges])
+    weights = np.array([w for _, _, w in edges], dtype=np.float64)
+    widths = 1 + np.log(weights)
+    loop = src == dst
+
+    segments, label_xy = [], np.empty((len(edges), 2))
+    heads = np.empty((0, 3, 2))
+    if (~loop).any():
+        lines, heads, mid = _edge_geometry(ax, xy[src[~loop]], xy[dst[~loop]], radius[src[~loop]], radius[dst[~loop]])
+        segments.extend(lines)
+        label_xy[~loop] = mid
+    if loop.any():
+        circles, tops = _loop_geometry(ax, xy[src[loop]], radius[src[loop]])
+        segments.extend(circles)
+        label_xy[loop] = tops
+    line_widths = np.concatenate([widths[~loop], widths[loop]])
+
+    ax.add_collection(LineCollection(segments, linewidths=line_widths, colors='gray', alpha=0.6, zorder=1))
+    ax.add_collection(PolyCollection(heads, facecolors='gray', edgecolors='none', alpha=0.6, zorder=1))
+    ax.scatter(xy[:, 0], xy[:, 1], s=sizes, c=['orange' if n in top else 'skyblue' for n in nodes],
+               alpha=0.9, zorder=2, edgecolors='none')
+    for n, (x, y) in zip(nodes, xy):
+        ax.text(x, y, n, fontsize=14, fontweight='bold', ha='center', va='center', zorder=3)
+    if edge_labels:
+        box = dict(boxstyle='round', ec=(1.0, 1.0, 1.0), fc=(1.0, 1.0, 1.0))
+        for (x, y), (_, _, w) in zip(label_xy, edges):
+            ax.text(x, y, str(w), color='red', fontsize=12, ha='center', va='center', bbox=box, zorder=3)
+    return fig
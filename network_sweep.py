@@ -0,0 +1,106 @@
+# network_sweep.py
+# 情感转移网络阈值敏感性分析：对一组阈值同时构建网络并计算中心性
+# 各阈值的网络是同一加权网络按权重逐步删边得到的快照；出/入度增量更新，中介中心性在进程池中并行计算
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import networkx as nx
+
+from transition_engine import count_transitions
+from instrumentation import instrumented
+
+
+# 单个快照的中介中心性（进程池任务，需为模块级函数）
+@instrumented('betweenness', lambda edges: {'edges': len(edges)})
+def _betweenness_task(edges):
+    G = nx.DiGraph()
+    G.add_weighted_edges_from(edges)
+    return nx.betweenness_centrality(G, weight='weight')
+
+
+# 一个类型的全部阈值快照：按阈值升序逐步删除权重不足的边，增量维护出/入度
+# 返回 [(threshold, nodes, out_degree, in_degree, edges), ...]
+def threshold_snapshots(matrix, labels, thresholds):
+    matrix = np.asarray(matrix)
+    src, dst = np.nonzero(matrix > 0)
+    weights = matrix[src, dst]
+    order = np.argsort(weights, kind='stable')
+    src, dst, weights = src[order], dst[order], weights[order]
+
+    K = len(labels)
+    out_degree = np.bincount(src, weights=weights, minlength=K).astype(np.int64)
+    in_degree = np.bincount(dst, weights=weights, minlength=K).astype(np.int64)
+    out_edges = np.bincount(src, minlength=K)
+    in_edges = np.bincount(dst, minlength=K)
+
+    snapshots = []
+    removed = 0
+    for t in sorted(thresholds):
+        cut = int(np.searchsorted(weights, t, side='left'))
+        if cut > removed:
+            s, d, w = src[removed:cut], dst[removed:cut], weights[removed:cut]
+            np.subtract.at(out_degree, s, w)
+            np.subtract.at(in_degree, d, w)
+            np.subtract.at(out_edges, s, 1)
+            np.subtract.at(in_edges, d, 1)
+            removed = cut
+        # 与 Code5 一致：网络只包含仍有边相连的情感节点
+        alive = np.nonzero((out_edges + in_edges) > 0)[0]
+        edges = [(labels[a], labels[b], int(w)) for a, b, w in zip(src[removed:], dst[removed:], weights[removed:])]
+        snapshots.append((t, [labels[i] for i in alive], out_degree[alive].copy(), in_degree[alive].copy(), edges))
+    return snapshots
+
+
+# 阈值扫描：counts 为 count_transitions 的结果（一阶），thresholds 为阈值列表
+# 返回长表：Novel_Type, Threshold, Emotion, OutDegree, InDegree, Betweenness, Rank
+def sweep_thresholds(counts, thresholds, n_jobs=None):
+    if counts.order != 1:
+        raise ValueError("阈值扫描仅适用于一阶转移计数")
+
+    jobs = []
+    for t, novel_type in enumerate(counts.types):
+        for threshold, nodes, out_deg, in_deg, edges in threshold_snapshots(counts.type[t], counts.labels, thresholds):
+            jobs.append((novel_type, threshold, nodes, out_deg, in_deg, edges))
+
+    if n_jobs == 1:
+        betweenness = [_betweenness_task(job[-1]) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            betweenness = list(pool.map(_betweenness_task, [job[-1] for job in jobs]))
+
+    frames = []
+    for (novel_type, threshold, nodes, out_deg, in_deg, _), bc in zip(jobs, betweenness):
+        frame = pd.DataFrame({
+            'Novel_Type': novel_type,
+            'Threshold': threshold,
+            'Emotion': nodes,
+            'OutDegree': out_deg,
+            'InDegree': in_deg,
+            'Betweenness': [bc.get(n, 0) for n in nodes],
+        })
+        frame['Rank'] = frame['Betweenness'].rank(ascending=False, method='min').astype(int)
+        frames.append(frame.sort_values('Rank', kind='stable'))
+
+    columns = ['Novel_Type', 'Threshold', 'Emotion', 'OutDegree', 'InDegree', 'Betweenness', 'Rank']
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)[columns]
+
+
+if __name__ == "__main__":
+    from corpus_cache import load_table, DATA1_PATH
+
+    # 参数配置
+    thresholds = [1, 3, 5, 10, 20, 50]
+    output_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "tables")
+    os.makedirs(output_folder, exist_ok=True)
+
+    df = load_table(DATA1_PATH)
+    counts = count_transitions(df)
+    sweep_df = sweep_thresholds(counts, thresholds)
+
+    output_path = os.path.join(output_folder, "Emotion_Centrality_Threshold_Sweep.csv")
+    sweep_df.to_csv(output_path, index=False, encoding='utf-8-sig')
+    print("阈值扫描完成，结果保存于：", output_path)
@@ -0,0 +1,258 @@
+# online_arc.py
+# 逐书在线分析（标注过程中的实时看板）：标注员按批追加句子，每批只处理新增句子，
+# 不再对整本书重跑 Code6 指标、Code5 转移计数与 Code7 平滑
+#   均值 / 标准差 / CV：计数、合计、平方偏差和按批合并（Chan 并行方差公式）；均值 = 合计 / 计数，与 batch_metrics 相同，
+#   真实均值为 0 时（分值为 0.5 的倍数时常见）不会因累计误差得到极小的非零均值，CV 仍为 NaN
+#   过零次数、波峰 / 波谷数：只需保留上一句的值与上一段非零斜率的方向，跨批边界的判断与整本计算一致
+#   波幅：运行最小 / 最大值
+#   情感转移计数：保留上一个非缺失的情感类型，新增的转移一次 bincount 累加（与 count_transitions 一致，跳过缺失句）
+#   尾部平滑：环形缓冲区保存最近 tail 句，按需对尾部窗口平滑（loess_smoothing.smooth），与书长无关
+# 每批的更新代价为 O(批大小)；状态可快照为 JSON（指标、转移矩阵、尾部曲线与续算所需状态），看板直接读取
+# 句子须按句子编号顺序追加；MeanReversion 依赖全书最终均值，无法按批更新，不在在线指标中
+
+import os
+import json
+import numpy as np
+import pandas as pd
+from loess_smoothing import smooth
+from transition_engine import _default_labels, _is_missing, to_frame
+
+SNAPSHOT_VERSION = 2
+ONLINE_METRICS = ['Amplitude', 'Frequency', 'CV', 'Peaks', 'Troughs']
+
+
+def _num(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def _float(value):
+    return np.nan if value is None else float(value)
+
+
+class BookArc:
+    # book_id:     小说编号
+    # labels:      情感类型（None 为按出现动态追加，输出时按 EMOTION_ORDER 排列，与 count_transitions 一致）
+    # tail:        尾部平滑窗口（句）
+    # tail_frac / tail_method: 尾部平滑参数（见 loess_smoothing.smooth）
+    def __init__(self, book_id, labels=None, tail=500, tail_frac=0.3, tail_method='box'):
+        self.book_id = book_id
+        self.fixed_labels = labels is not None
+        self.labels = list(labels) if labels is not None else []
+        self.tail = int(tail)
+        self.tail_frac = tail_frac
+        self.tail_method = tail_method
+
+        self.sentences = 0
+        self.count = 0            # 非缺失的强度值个数
+        self.total = 0.0          # 非缺失强度值的合计
+        self.m2 = 0.0             # 平方偏差和
+        self.min = np.nan
+        self.max = np.nan
+        self.frequency = 0
+        self.peaks = 0
+        self.troughs = 0
+        self.last_value = None    # 上一句的强度（可为 nan）
+        self.last_slope = 0       # 上一段非零斜率的方向（0 为尚无）
+        self.last_code = -1       # 上一个非缺失情感类型的编码
+        self.transitions = np.zeros((len(self.labels), len(self.labels)), dtype=np.int64)
+        self.buffer = np.full(self.tail, np.nan)
+        self._tail_cache = None
+
+    # ---------- 追加 ----------
+    # intensity: 新增句子的 Intensity_polarized；emotions: 对应的 Emotional Types（可省略）
+    def append(self, intensity, emotions=None):
+        values = pd.to_numeric(pd.Series(intensity, copy=False), errors='coerce').to_numpy(dtype=np.float64)
+        if emotions is not None and len(emotions) != len(values):
+            raise ValueError("强度与情感类型的句数不一致")
+        if len(values):
+            self._update_moments(values)
+            self._update_turns(values)
+            self._update_tail(values)
+            self.last_value = float(values[-1])
+            self.sentences += len(values)
+            self._tail_cache = None
+        if emotions is not None:
+            self._update_transitions(emotions)
+        return self
+
+    def _update_moments(self, values):
+        finite = values[~np.isnan(values)]
+        c = len(finite)
+        if c == 0:
+            return
+        batch_mean = finite.mean()
+        batch_m2 = ((finite - batch_mean) ** 2).sum()
+        merged = self.count + c
+        delta = batch_mean - (self.total / self.count if self.count else 0.0)
+        self.m2 += batch_m2 + delta ** 2 * self.count * c / merged
+        self.total += finite.sum()
+        self.count = merged
+        self.min = np.fmin(self.min, finite.min())
+        self.max = np.fmax(self.max, finite.max())
+
+    def _update_turns(self, values):
+        seq = values if self.last_value is None else np.concatenate(([self.last_value], values))
+        # 过零：相邻符号不同（与 batch_metrics 相同，缺失值与任何值都视为不同）
+        sign = np.sign(seq)
+        self.frequency += int((sign[1:] != sign[:-1]).sum())
+
+        # 峰 / 谷：去掉平台与缺失后的斜率方向由 +1 变 -1 / 由 -1 变 +1
+        slope = np.sign(np.diff(seq))
+        slope = slope[(slope != 0) & ~np.isnan(slope)]
+        if len(slope) == 0:
+            return
+        if self.last_slope != 0:
+            slope = np.concatenate(([self.last_slope], slope))
+        self.peaks += int(((slope[:-1] > 0) & (slope[1:] < 0)).sum())
+        self.troughs += int(((slope[:-1] < 0) & (slope[1:] > 0)).sum())
+        self.last_slope = int(slope[-1])
+
+    def _update_tail(self, values):
+        if self.tail == 0:
+            return
+        # 批大小超过窗口时只保留最后 tail 句；句子下标对窗口取模即为缓冲区位置
+        start = self.sentences + max(0, len(values) - self.tail)
+        values = values[-self.tail:]
+        self.buffer[(start + np.arange(len(values))) % self.tail] = values
+
+    def _encode(self, emotions):
+        emotions = pd.Series(emotions, copy=False).astype(object)
+        missing = _is_missing(emotions)
+        observed = emotions[~missing]
+        if not self.fixed_labels:
+            new = [e for e in dict.fromkeys(observed) if e not in self.labels]
+            if new:
+                K = len(self.labels) + len(new)
+                grown = np.zeros((K, K), dtype=np.int64)
+                grown[:len(self.labels), :len(self.labels)] = self.transitions
+                self.transitions = grown
+                self.labels.extend(new)
+        index = {label: i for i, label in enumerate(self.labels)}
+        return np.array([index.get(e, -1) for e in observed], dtype=np.int64)
+
+    def _update_transitions(self, emotions):
+        codes = self._encode(emotions)
+        # 不在 labels 中的情感类型不计数，也不作为转移的起点
+        codes = codes[codes >= 0]
+        if len(codes) == 0:
+            return
+        if self.last_code >= 0:
+            codes = np.concatenate(([self.last_code], codes))
+        K = len(self.labels)
+        packed = codes[:-1] * K + codes[1:]
+        self.transitions += np.bincount(packed, minlength=K * K).reshape(K, K)
+        self.last_code = int(codes[-1])
+
+    # ---------- 查询 ----------
+    # 当前指标（口径同 fluctuation_metrics.batch_metrics）
+    def metrics(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+            mean = self.total / self.count if self.count else np.nan
+            return {
+                'Sentences': self.sentences,
+                'Mean': float(mean),
+                'Std': float(std),
+                'Amplitude': float(self.max - self.min),
+                'Frequency': self.frequency,
+                'CV': float(std / abs(mean)) if mean != 0 else np.nan,
+                'Peaks': self.peaks,
+                'Troughs': self.troughs,
+            }
+
+    # 转移矩阵（DataFrame，行：源情感，列：目标情感）
+    def transition_frame(self):
+        labels = self.labels if self.fixed_labels else _default_labels(self.labels)
+        order = [self.labels.index(label) for label in labels]
+        return to_frame(self.transitions[np.ix_(order, order)], labels)
+
+    # 尾部窗口的原始值与平滑曲线：返回 (句子下标, 原始值, 平滑值)
+    def tail_curve(self):
+        if self._tail_cache is None:
+            n = min(self.sentences, self.tail)
+            positions = np.arange(self.sentences - n, self.sentences)
+            values = self.buffer[positions % self.tail] if n else np.empty(0)
+            smoothed = smooth(values, self.tail_frac, x=positions.astype(np.float64),
+                              method=self.tail_method) if n else np.empty(0)
+            self._tail_cache = (positions, values, smoothed)
+        return self._tail_cache
+
+    # ---------- 快照 ----------
+    def snapshot(self):
+        positions, values, smoothed = self.tail_curve()
+        frame = self.transition_frame()
+        return {
+            'version': SNAPSHOT_VERSION,
+            'book_id': self.book_id,
+            'metrics': {k: _num(v) for k, v in self.metrics().items()},
+            'transitions': {'labels': list(frame.index), 'counts': frame.to_numpy().tolist()},
+            'tail': {'start': int(positions[0]) if len(positions) else self.sentences,
+                     'values': [_num(v) for v in values], 'smoothed': [_num(v) for v in smoothed]},
+            'params': {'tail': self.tail, 'tail_frac': self.tail_frac, 'tail_method': self.tail_method,
+                       'fixed_labels': self.fixed_labels},
+            'state': {
+                'sentences': self.sentences, 'count': self.count, 'total': self.total, 'm2': self.m2,
+                'min': _num(self.min), 'max': _num(self.max), 'frequency': self.frequency,
+                'peaks': self.peaks, 'troughs': self.troughs,
+                'last_value': None if self.last_value is None else _num(self.last_value),
+                'has_last_value': self.last_value is not None,
+                'last_slope': self.last_slope,
+                'labels': self.labels, 'transitions': self.transitions.tolist(),
+                'last_label': self.labels[self.last_code] if self.last_code >= 0 else None,
+            },
+        }
+
+    # 写出快照（先写临时文件再替换，看板读取时不会读到半个文件）
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
+
+
+# 由快照恢复（可继续追加）
+def load_arc(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        snap = json.load(f)
+    params, state = snap['params'], snap['state']
+    arc = BookArc(snap['book_id'], state['labels'] if params['fixed_labels'] else None,
+                  params['tail'], params['tail_frac'], params['tail_method'])
+    arc.labels = list(state['labels'])
+    arc.transitions = np.array(state['transitions'], dtype=np.int64).reshape(len(arc.labels), len(arc.labels))
+    arc.sentences = state['sentences']
+    arc.count = state['count']
+    # 版本 1 的快照只保存了均值
+    arc.total = state['total'] if 'total' in state else state['mean'] * state['count']
+    arc.m2 = state['m2']
+    arc.min, arc.max = _float(state['min']), _float(state['max'])
+    arc.frequency, arc.peaks, arc.troughs = state['frequency'], state['peaks'], state['troughs']
+    arc.last_value = _float(state['last_value']) if state['has_last_value'] else None
+    arc.last_slope = state['last_slope']
+    arc.last_code = arc.labels.index(state['last_label']) if state['last_label'] is not None else -1
+    tail = snap['tail']
+    values = np.array([_float(v) for v in tail['values']])
+    arc.buffer[(tail['start'] + np.arange(len(values))) % max(arc.tail, 1)] = values
+    return arc
+
+
+if __name__ == "__main__":
+    from corpus_cache import load_table, DATA1_PATH
+    from transition_engine import _sort_sentences
+
+    # 演示：按句子顺序把 Data1 每本书分批追加（模拟标注进度），每批后刷新快照
+    batch_size = 200
+    snapshot_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "snapshots")
+
+    df = _sort_sentences(load_table(DATA1_PATH), '小说编号', '句子编号')
+    for book_id, group in df.groupby('小说编号', sort=True):
+        arc = BookArc(book_id)
+        intensity = group['Intensity_polarized'].to_numpy()
+        emotions = group['Emotional Types'].to_numpy()
+        for start in range(0, len(group), batch_size):
+            arc.append(intensity[start:start + batch_size], emotions[start:start + batch_size])
+            arc.save(os.path.join(snapshot_folder, f"{book_id}.json"))
+        print(book_id, {k: round(v, 4) for k, v in arc.metrics().items()})
+    print("快照保存于：", snapshot_folder)
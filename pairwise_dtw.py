@@ -0,0 +1,295 @@
+# pairwise_dtw.py
+# 精确 DTW 核心与成对 DTW 距离矩阵（Code8、Code9）：
+#   DTW 按反对角线递推，直接在 float64 数组上向量化计算，一批成对序列同时计算（Code9 每本书的三组角色对一次算完）
+#   可选 Sakoe-Chiba 带宽约束（不等长时与 tslearn.metrics.sakoe_chiba_mask 相同，见 _band），内存 O(带宽)；可选回溯规整路径
+#   成对矩阵只计算上三角（对角线为 0，矩阵对称），返回 scipy 格式的压缩距离向量
+#   给定 max_dist 时先用 LB_Kim / LB_Keogh 下界剪枝，并在累计代价超限时提前终止；大批量任务分块交给进程池
+# 成对矩阵的距离定义与 tslearn.metrics.dtw 一致：sqrt(最优路径上逐点差的平方和)
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
+from scipy.spatial.distance import squareform
+from instrumentation import instrumented
+
+
+def _take(Dp, lo, q0, count):
+    # 从两端补 inf 的反对角线 Dp（首个有效行号为 lo）中取行号 q0 .. q0+count-1 的累计代价，越界位置为 inf
+    s = q0 - lo + 1
+    width = Dp.shape[1]
+    if s >= 0 and s + count <= width:
+        return Dp[:, s:s + count]
+    return Dp[:, np.clip(np.arange(s, s + count), 0, width - 1)]
+
+
+# 逐点代价：'sq' 为平方差（tslearn 口径，最终距离开方），'abs' 为绝对差（fastdtw 口径，最终距离为累计和）
+DISTANCES = ('sq', 'abs')
+
+
+def _point_cost(a, b, dist):
+    if dist == 'sq':
+        return (a - b) ** 2
+    if dist == 'abs':
+        return np.abs(a - b)
+    raise ValueError(f"未知的逐点代价：{dist}，可选 {DISTANCES}")
+
+
+# Sakoe-Chiba 带宽：允许的 i - j 范围 [d_lo, d_hi]
+# 与 tslearn 一致，不等长时带宽沿较长序列一侧加宽 |n - m|：n >= m 时 -radius <= i - j <= n - m + radius，
+# n < m 时 -(m - n) - radius <= i - j <= radius；等长时即 |i - j| <= radius
+def _band(n, m, radius):
+    if radius is None:
+        return -m, n
+    radius = int(radius)
+    if n >= m:
+        return -radius, n - m + radius
+    return -(m - n) - radius, radius
+
+
+# 提前终止与下界剪枝的相对余量：累计代价与距离在平方 / 开方间换算有舍入误差，剪枝只需保守，
+# 是否超过 max_dist 由调用方按距离最终判断
+_BOUND_SLACK = 1e-9
+
+
+# 反对角线递推核心：A 形状 (P, n)，B 形状 (P, m)，逐对计算 A[p] 与 B[p]
+# 只保留最近两条反对角线，内存 O(P × 带宽)；keep=True 时保留全部反对角线用于回溯路径，内存 O(P × (n+m) × 带宽)
+# bound 只用于提前终止（被放弃的序列对为 inf），未放弃的序列对返回完整累计代价
+def _dtw_diagonals(A, B, radius, bound, dist, keep=False):
+    P, n = A.shape
+    m = B.shape[1]
+    d_lo, d_hi = _band(n, m, radius)
+    if bound is not None:
+        bound = bound * (1 + _BOUND_SLACK)
+
+    # 反对角线两端各补一个 inf，越界的前驱自然取到 inf
+    empty = np.full((P, 2), np.inf)
+    B_rev = B[:, ::-1]
+    prev2, lo2 = empty, 0
+    prev, lo1 = empty, 0
+    alive = np.ones(P, dtype=bool)
+    history = []
+
+    for k in range(n + m - 1):
+        # 第 k 条反对角线（i + j = k）上位于带宽内的行号范围（i - j = 2i - k 在 [d_lo, d_hi] 内）；
+        # j = k - i 在 B 逆序后是连续切片
+        i_lo = max(0, k - (m - 1), -((-(k + d_lo)) // 2))
+        i_hi = min(n - 1, k, (k + d_hi) // 2)
+        count = i_hi - i_lo + 1
+        if count <= 0:
+            cur = empty
+        else:
+            j_rev = m - 1 - k + i_lo
+            cost = _point_cost(A[:, i_lo:i_hi + 1], B_rev[:, j_rev:j_rev + count], dist)
+            cur = np.full((P, count + 2), np.inf)
+            if k == 0:
+                cur[:, 1:-1] = cost
+            else:
+                best = np.minimum(_take(prev, lo1, i_lo - 1, count), _take(prev, lo1, i_lo, count))
+                cur[:, 1:-1] = cost + np.minimum(best, _take(prev2, lo2, i_lo - 1, count))
+
+        # 提前终止：任何路径必经过第 k-1 或第 k 条反对角线，两条线上的最小累计代价都超限即可放弃
+        if bound is not None:
+            lowest = np.minimum(prev.min(axis=1), cur.min(axis=1))
+            alive &= lowest <= bound
+            if not alive.any() and not keep:
+                return np.full(P, np.inf), history
+
+        if keep:
+            history.append((cur, i_lo))
+        prev2, lo2, prev, lo1 = prev, lo1, cur, i_lo
+
+    result = prev[:, -2].copy()
+    result[~alive] = np.inf
+    return result, history
+
+
+# 批量 DTW 累计代价
+#   radius: Sakoe-Chiba 带宽半径（None 为不约束），等长时 |i - j| <= radius，不等长时见 _band
+#   bound:  累计代价上限，超过（严格大于）即提前终止并返回 inf
+#   dist:   逐点代价，'sq' 或 'abs'
+def dtw_cost_batch(A, B, radius=None, bound=None, dist='sq'):
+    A = np.atleast_2d(np.asarray(A, dtype=np.float64))
+    B = np.atleast_2d(np.asarray(B, dtype=np.float64))
+    cost = _dtw_diagonals(A, B, radius, bound, dist)[0]
+    if bound is not None:
+        cost[cost > bound] = np.inf
+    return cost
+
+
+# 由累计代价回溯最优规整路径（并列时优先对角方向）
+def _backtrack(history, p, n, m):
+    def value(k, i):
+        if k < 0:
+            return np.inf
+        Dp, lo = history[k]
+        idx = i - lo + 1
+        return Dp[p, idx] if 1 <= idx < Dp.shape[1] - 1 else np.inf
+
+    i, j = n - 1, m - 1
+    path = [(i, j)]
+    while i > 0 or j > 0:
+        k = i + j
+        candidates = [
+            (value(k - 2, i - 1) if i > 0 and j > 0 else np.inf, i - 1, j - 1),
+            (value(k - 1, i - 1) if i > 0 else np.inf, i - 1, j),
+            (value(k - 1, i) if j > 0 else np.inf, i, j - 1),
+        ]
+        _, i, j = min(candidates, key=lambda c: c[0])
+        path.append((i, j))
+    return path[::-1]
+
+
+# 批量精确 DTW 距离：A、B 形状 (P, n)、(P, m)，一次返回 P 对序列的距离
+#   dist='sq' 返回 sqrt(平方差累计和)（与 tslearn 一致），dist='abs' 返回绝对差累计和（与 fastdtw 同一口径的精确值）
+#   return_path=True 时同时返回每对序列的规整路径 [(i, j), ...]
+@instrumented('dtw', lambda A, B, *a, **kw: {'pairs': len(np.atleast_2d(A)), 'length': np.shape(A)[-1]})
+def dtw_batch(A, B, radius=None, dist='abs', return_path=False):
+    A = np.atleast_2d(np.asarray(A, dtype=np.float64))
+    B = np.atleast_2d(np.asarray(B, dtype=np.float64))
+    cost, history = _dtw_diagonals(A, B, radius, None, dist, keep=return_path)
+    distance = np.sqrt(cost) if dist == 'sq' else cost
+    if not return_path:
+        return distance
+    paths = [_backtrack(history, p, A.shape[1], B.shape[1]) for p in range(len(A))]
+    return distance, paths
+
+
+# 单对 DTW 距离（默认平方差口径，与 tslearn.metrics.dtw 一致）；距离严格大于 max_dist 时返回 inf
+def dtw_distance(a, b, radius=None, max_dist=None, dist='sq'):
+    bound = None if max_dist is None else (max_dist ** 2 if dist == 'sq' else max_dist)
+    A = np.asarray(a, dtype=np.float64).ravel()[None, :]
+    B = np.asarray(b, dtype=np.float64).ravel()[None, :]
+    cost = _dtw_diagonals(A, B, radius, bound, dist)[0][0]
+    distance = float(np.sqrt(cost) if dist == 'sq' else cost)
+    return np.inf if max_dist is not None and distance > max_dist else distance
+
+
+# 单对 DTW 距离与规整路径
+def dtw_path(a, b, radius=None, dist='sq'):
+    distance, paths = dtw_batch(np.ravel(a)[None, :], np.ravel(b)[None, :], radius, dist, return_path=True)
+    return float(distance[0]), paths[0]
+
+
+# LB_Kim（首尾点）下界：任何规整路径都必须匹配首点对与尾点对
+def lb_kim(A, B):
+    A = np.atleast_2d(A)
+    B = np.atleast_2d(B)
+    first = (A[:, 0] - B[:, 0]) ** 2
+    last = (A[:, -1] - B[:, -1]) ** 2
+    if A.shape[1] == 1 and B.shape[1] == 1:
+        return np.sqrt(first)
+    if A.shape[1] == 1 or B.shape[1] == 1:
+        return np.sqrt(np.maximum(first, last))
+    return np.sqrt(first + last)
+
+
+# 上下包络线：窗口 [i - radius, i + radius] 内的最大/最小值
+def envelope(X, radius):
+    X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+    size = 2 * int(radius) + 1
+    return maximum_filter1d(X, size, axis=1, mode='nearest'), minimum_filter1d(X, size, axis=1, mode='nearest')
+
+
+# LB_Keogh 下界：A 中落在 B 包络线之外的部分（要求等长，且 DTW 使用同一带宽半径）
+def lb_keogh(A, upper, lower):
+    A = np.atleast_2d(A)
+    above = np.where(A > upper, A - upper, 0.0)
+    below = np.where(A < lower, lower - A, 0.0)
+    return np.sqrt(np.sum(above ** 2 + below ** 2, axis=1))
+
+
+# ---------- 成对计算 ----------
+_X = None
+
+
+def _init_worker(X):
+    global _X
+    _X = X
+
+
+# 累计代价（bound 只用于提前终止，是否超过 max_dist 由 pairwise_dtw 按距离判断）
+def _pairs_cost(X, I, J, radius, bound):
+    if isinstance(X, np.ndarray):
+        return _dtw_diagonals(X[I], X[J], radius, bound, 'sq')[0]
+    # 不等长序列逐对计算
+    return np.array([_dtw_diagonals(X[i][None, :], X[j][None, :], radius, bound, 'sq')[0][0] for i, j in zip(I, J)])
+
+
+def _chunk_task(args):
+    I, J, radius, bound = args
+    return _pairs_cost(_X, I, J, radius, bound)
+
+
+def _prepare(X):
+    equal_length = not isinstance(X, (list, tuple)) or len({len(x) for x in X}) <= 1
+    if equal_length:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[:, None]
+    else:
+        X = [np.asarray(x, dtype=np.float64).ravel() for x in X]
+    return X, equal_length
+
+
+# 计算序列对 (I[t], J[t])（t 属于 todo）的累计代价写入 result，多于一个分块时交给进程池
+def _run_pairs(X, I, J, todo, result, radius, bound, n_jobs, chunk_size):
+    chunks = [todo[s:s + chunk_size] for s in range(0, len(todo), chunk_size)]
+    if n_jobs == 1 or len(chunks) <= 1:
+        for c in chunks:
+            result[c] = _pairs_cost(X, I[c], J[c], radius, bound)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(X,)) as pool:
+            tasks = [(I[c], J[c], radius, bound) for c in chunks]
+            for c, cost in zip(chunks, pool.map(_chunk_task, tasks)):
+                result[c] = cost
+    return result
+
+
+# 成对 DTW 压缩距离向量（长度 N(N-1)/2，可直接用于 scipy 聚类或经 squareform 转为方阵供 t-SNE 使用）
+#   X:        (N, L) 等长序列数组，或不等长序列列表
+#   radius:   Sakoe-Chiba 带宽半径
+#   max_dist: 只关心距离不超过该值的序列对；严格大于的记为 inf（可经下界剪枝，不必计算完整 DTW）
+#   n_jobs:   进程数（None 为 CPU 核数；序列对少于一个分块时直接在当前进程计算）
+@instrumented('pairwise_dtw', lambda X, *a, **kw: {'series': len(X), 'pairs': len(X) * (len(X) - 1) // 2})
+def pairwise_dtw(X, radius=None, max_dist=None, n_jobs=None, chunk_size=1024):
+    X, equal_length = _prepare(X)
+    N = len(X)
+    # 上三角序列对 (i < j)，顺序与 scipy 压缩向量一致
+    I, J = np.triu_indices(N, k=1)
+    result = np.full(len(I), np.inf)
+    todo = np.arange(len(I))
+
+    bound = None
+    if max_dist is not None:
+        bound = max_dist ** 2
+        # 下界剪枝：下界已超过 max_dist 的序列对无需计算
+        if equal_length:
+            lower = lb_kim(X[I], X[J])
+            if radius is not None:
+                U, L = envelope(X, radius)
+                lower = np.maximum(lower, lb_keogh(X[I], U[J], L[J]))
+                lower = np.maximum(lower, lb_keogh(X[J], U[I], L[I]))
+            todo = todo[lower <= max_dist * (1 + _BOUND_SLACK)]
+
+    _run_pairs(X, I, J, todo, result, radius, bound, n_jobs, chunk_size)
+    distances = np.sqrt(result)
+    if max_dist is not None:
+        distances[distances > max_dist] = np.inf
+    return distances
+
+
+# 指定序列对的 DTW 距离（增量更新距离矩阵时只计算涉及新增或变化序列的那些对）
+#   I, J: 序列下标数组，返回 dist(X[I[t]], X[J[t]])
+@instrumented('dtw_pairs', lambda X, I, J, *a, **kw: {'pairs': len(I)})
+def dtw_pairs(X, I, J, radius=None, n_jobs=None, chunk_size=1024):
+    X, _ = _prepare(X)
+    I = np.asarray(I, dtype=np.int64)
+    J = np.asarray(J, dtype=np.int64)
+    result = np.full(len(I), np.inf)
+    _run_pairs(X, I, J, np.arange(len(I)), result, radius, None, n_jobs, chunk_size)
+    return np.sqrt(result)
+
+
+# 成对 DTW 方阵
+def pairwise_dtw_matrix(X, **kwargs):
+    return squareform(pairwise_dtw(X, **kwargs), checks=False)
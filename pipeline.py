@@ -0,0 +1,546 @@
+# pipeline.py
+# 分析流水线：以 DAG 声明各阶段的输入与输出
+#   读取 → 规范化 → 平滑 → 分段 / 指标 / 插值 → DTW → 聚类 → 导出表格 / 渲染图表
+#   另有 Code5 情感转移表与 Code9 主 / 次角色 DTW 两条分支（覆盖范围见 thesis_stages）
+# 每次运行只重跑输入发生变化的阶段，互不依赖的阶段并发执行；
+# 逐书阶段按书记录输入指纹，只重算内容变化的书，新增一本书的代价约为一本书的工作量
+# 插值阶段同时生成 Code8 所需的 All_Novels_Emotion_Curves_LOESS_Interpolated.csv
+
+import os
+import re
+import importlib
+import json
+import pickle
+import inspect
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+import pandas as pd
+from corpus_cache import load_table, file_hash, BASE_DIR, DATA1_PATH, DATA2_PATH, DATA3_PATH
+from loess_smoothing import smooth
+from inflection_nodes import detect_nodes, NODE_POLICIES
+from fluctuation_metrics import batch_metrics
+from pairwise_dtw import dtw_pairs, dtw_batch
+from curve_resampler import resample_curves, write_matrix
+from cluster_sweep import kmedoids
+from transition_engine import count_transitions, edge_list
+from emotion_cube import FIGURE_TYPE_MAP
+from render_pool import figure_job, render_jobs
+from instrumentation import span
+
+# 流水线阶段
+#   func:        阶段函数（需定义在模块顶层，逐书阶段会交给进程池）
+#   inputs:      输入产物名（上游阶段的输出，或 run 的 sources 中的源文件组）
+#   outputs:     输出产物名
+#   mode:        'global' 整体输入 → 整体输出；'book' 逐书调用 func(book_id, *各输入中该书的值)（只含各输入都有的书）；
+#                'split' 整体输入 → {书号: 值}，输出为逐书产物
+#   params:      传给 func 的关键字参数（参与变化判断）
+#   incremental: True 时以 previous= 传入上一次的输出，供阶段自行复用未变化的部分
+Stage = namedtuple('Stage', ['name', 'func', 'inputs', 'outputs', 'mode', 'params', 'incremental'])
+
+MODES = ('global', 'book', 'split')
+
+STATE_NAME = 'state.json'
+
+
+def stage(name, func, inputs, outputs, mode='global', incremental=False, **params):
+    if mode not in MODES:
+        raise ValueError(f"未知的阶段类型：{mode}，可选 {MODES}")
+    return Stage(name, func, tuple(inputs), tuple(outputs), mode, params, incremental)
+
+
+# ---------- 指纹 ----------
+def fingerprint(value):
+    h = hashlib.sha1()
+    if isinstance(value, pd.DataFrame):
+        h.update(pickle.dumps((list(value.columns), [str(t) for t in value.dtypes]), protocol=4))
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        h.update(str((value.dtype, value.shape)).encode('utf-8'))
+        h.update(np.ascontiguousarray(value).tobytes())
+    else:
+        h.update(pickle.dumps(value, protocol=4))
+    return h.hexdigest()
+
+
+# 逐书产物的整体指纹
+def _combine(books):
+    return hashlib.sha1(json.dumps(sorted(books.items())).encode('utf-8')).hexdigest()
+
+
+# 阶段键：阶段函数（名称 + 源码）、参数与输入指纹
+def _stage_key(st, input_fps, book=None):
+    h = hashlib.sha1()
+    h.update(f"{st.func.__module__}.{st.func.__qualname__}".encode('utf-8'))
+    try:
+        h.update(inspect.getsource(st.func).encode('utf-8'))
+    except (OSError, TypeError):
+        pass
+    h.update(repr(sorted(st.params.items())).encode('utf-8'))
+    h.update(json.dumps([st.mode, book, input_fps]).encode('utf-8'))
+    return h.hexdigest()
+
+
+# ---------- 产物存储：<work_dir>/<产物名>.pkl，逐书产物为 <work_dir>/<产物名>/<书号>.pkl ----------
+def _path(work_dir, artifact, book=None):
+    if book is None:
+        return os.path.join(work_dir, f"{artifact}.pkl")
+    return os.path.join(work_dir, artifact, f"{str(book).replace(os.sep, '_')}.pkl")
+
+
+def _save(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(value, f, protocol=4)
+    os.replace(tmp_path, path)
+    return fingerprint(value)
+
+
+def _load(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _load_state(work_dir):
+    try:
+        with open(os.path.join(work_dir, STATE_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'stages': {}, 'artifacts': {}, 'sources': {}}
+
+
+def _save_state(work_dir, state):
+    path = os.path.join(work_dir, STATE_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+# 源文件指纹：大小与修改时间未变时沿用上次的内容哈希
+def _source_fingerprint(paths, known):
+    fps = []
+    for path in paths:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        record = known.get(path)
+        if record is None or record['size'] != stat.st_size or record['mtime_ns'] != stat.st_mtime_ns:
+            record = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': file_hash(path)}
+            known[path] = record
+        fps.append([os.path.basename(path), record['sha1']])
+    return hashlib.sha1(json.dumps(fps).encode('utf-8')).hexdigest()
+
+
+# ---------- 阶段执行 ----------
+def _as_tuple(result, n):
+    return (result,) if n == 1 else tuple(result)
+
+
+# 逐书任务（进程池）：读取该书的输入，调用阶段函数，写出该书的输出并返回输出指纹
+def _book_task(args):
+    name, func, params, book, in_paths, out_paths = args
+    with span(f"pipeline.{name}", book=book):
+        values = [_load(p) for p in in_paths]
+        result = _as_tuple(func(book, *values, **params), len(out_paths))
+    return [_save(p, v) for p, v in zip(out_paths, result)]
+
+
+def _load_input(work_dir, artifact, record, sources):
+    if artifact in sources:
+        return list(sources[artifact])
+    if record.get('books') is None:
+        return _load(_path(work_dir, artifact))
+    return {book: _load(_path(work_dir, artifact, book)) for book in sorted(record['books'])}
+
+
+def _outputs_exist(work_dir, st, books=None):
+    if books is None:
+        return all(os.path.exists(_path(work_dir, a)) for a in st.outputs)
+    return all(os.path.exists(_path(work_dir, a, b)) for a in st.outputs for b in books)
+
+
+def _remove_stale(work_dir, artifact, keep):
+    folder = os.path.join(work_dir, artifact)
+    if not os.path.isdir(folder):
+        return
+    for name in os.listdir(folder):
+        if name.endswith('.pkl') and name[:-4] not in keep:
+            os.remove(os.path.join(folder, name))
+
+
+# 执行一个阶段，返回 (阶段记录, {产物名: 产物记录}, 本次计算的书数或 None)
+def _execute(st, work_dir, artifacts, sources, source_fps, previous, force, n_jobs):
+    input_fps = [source_fps[a] if a in sources else artifacts[a]['fp'] for a in st.inputs]
+
+    if st.mode == 'book':
+        # 只处理各输入都有的书；缺少某个输入的书（如新书尚未提取角色表）跳过并提示，不影响其他书
+        book_sets = [set(artifacts[a]['books']) for a in st.inputs]
+        books = sorted(set.intersection(*book_sets))
+        missing = sorted(set.union(*book_sets) - set(books))
+        if missing:
+            print(f"阶段 {st.name}：{', '.join(missing)} 缺少部分输入，已跳过")
+        old_books = previous.get('books') or {}
+        keys, todo = {}, []
+        for book in books:
+            keys[book] = _stage_key(st, [artifacts[a]['books'].get(book) for a in st.inputs], book)
+            if force or old_books.get(book) != keys[book] or not _outputs_exist(work_dir, st, [book]):
+                todo.append(book)
+
+        out_books = {a: {b: fp for b, fp in ((previous.get('outputs') or {}).get(a) or {}).items() if b in keys}
+                     for a in st.outputs}
+        tasks = [(st.name, st.func, st.params, book,
+                  [_path(work_dir, a, book) for a in st.inputs],
+                  [_path(work_dir, a, book) for a in st.outputs]) for book in todo]
+        if n_jobs == 1 or len(tasks) <= 1:
+            results = [_book_task(t) for t in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                results = list(pool.map(_book_task, tasks))
+        for book, fps in zip(todo, results):
+            for a, fp in zip(st.outputs, fps):
+                out_books[a][book] = fp
+        for a in st.outputs:
+            _remove_stale(work_dir, a, set(books))
+
+        record = {'books': keys, 'outputs': out_books, 'missing': missing}
+        return record, {a: {'fp': _combine(out_books[a]), 'books': out_books[a]} for a in st.outputs}, len(todo)
+
+    key = _stage_key(st, input_fps)
+    if not force and previous.get('key') == key and previous.get('outputs') is not None:
+        outputs = previous['outputs']
+        books = None if st.mode == 'global' else list((outputs.get(st.outputs[0]) or {}).get('books') or {})
+        if _outputs_exist(work_dir, st, books):
+            return previous, outputs, None
+
+    values = [_load_input(work_dir, a, artifacts.get(a, {}), sources) for a in st.inputs]
+    kwargs = dict(st.params)
+    if st.incremental:
+        old = previous.get('outputs')
+        kwargs['previous'] = None
+        if old is not None and _outputs_exist(work_dir, st):
+            loaded = tuple(_load(_path(work_dir, a)) for a in st.outputs)
+            kwargs['previous'] = loaded[0] if len(loaded) == 1 else loaded
+    with span(f"pipeline.{st.name}"):
+        result = st.func(*values, **kwargs)
+
+    outputs = {}
+    if st.mode == 'global':
+        for a, v in zip(st.outputs, _as_tuple(result, len(st.outputs))):
+            outputs[a] = {'fp': _save(_path(work_dir, a), v), 'books': None}
+    else:
+        # split：只重写指纹变化的书
+        old_outputs = previous.get('outputs') or {}
+        per_output = {a: {} for a in st.outputs}
+        for book, value in result.items():
+            book = str(book)
+            for a, v in zip(st.outputs, _as_tuple(value, len(st.outputs))):
+                fp = fingerprint(v)
+                old_fp = ((old_outputs.get(a) or {}).get('books') or {}).get(book)
+                if old_fp != fp or not os.path.exists(_path(work_dir, a, book)):
+                    _save(_path(work_dir, a, book), v)
+                per_output[a][book] = fp
+        for a in st.outputs:
+            _remove_stale(work_dir, a, set(per_output[a]))
+            outputs[a] = {'fp': _combine(per_output[a]), 'books': per_output[a]}
+    return {'key': key, 'outputs': outputs}, outputs, 1
+
+
+# 按依赖关系排序并检查：每个输入都由前序阶段产生或来自源文件组
+def _check(stages, sources):
+    producers = {}
+    for st in stages:
+        for a in st.outputs:
+            if a in producers or a in sources:
+                raise ValueError(f"产物 {a} 被重复定义")
+            producers[a] = st.name
+    for st in stages:
+        for a in st.inputs:
+            if a not in producers and a not in sources:
+                raise ValueError(f"阶段 {st.name} 的输入 {a} 没有来源")
+        if st.mode == 'book' and any(a in sources for a in st.inputs):
+            raise ValueError(f"逐书阶段 {st.name} 的输入必须是逐书产物")
+    deps = {st.name: {producers[a] for a in st.inputs if a in producers} for st in stages}
+    done, order = set(), []
+    while len(order) < len(stages):
+        ready = [st for st in stages if st.name not in done and deps[st.name] <= done]
+        if not ready:
+            raise ValueError("流水线存在循环依赖")
+        for st in ready:
+            done.add(st.name)
+            order.append(st)
+    return deps
+
+
+# 运行流水线
+#   sources:  {源产物名: [文件路径, ...]}
+#   work_dir: 中间产物与运行状态目录
+#   n_jobs:   并发阶段数，逐书阶段的进程数（None 为 CPU 核数；1 为完全串行）
+#   force:    忽略记录，全部重跑
+# 返回 {阶段名: 'skipped' 或本次计算的书数 / 'ran'}
+def run(stages, sources, work_dir, n_jobs=None, force=False):
+    deps = _check(stages, sources)
+    os.makedirs(work_dir, exist_ok=True)
+    state = _load_state(work_dir)
+    known = state.setdefault('sources', {})
+    source_fps = {name: _source_fingerprint(paths, known) for name, paths in sources.items()}
+    artifacts = {}
+    report = {}
+    by_name = {st.name: st for st in stages}
+
+    pending = set(by_name)
+    running = {}
+    with ThreadPoolExecutor(max_workers=1 if n_jobs == 1 else n_jobs) as pool:
+        while pending or running:
+            ready = [name for name in sorted(pending) if not (deps[name] & (pending | set(running.values())))]
+            for name in ready:
+                pending.discard(name)
+                st = by_name[name]
+                future = pool.submit(_execute, st, work_dir, dict(artifacts), sources, source_fps,
+                                     state['stages'].get(name, {}), force, n_jobs)
+                running[future] = name
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                record, outputs, count = future.result()
+                state['stages'][name] = record
+                artifacts.update(outputs)
+                state['artifacts'].update(outputs)
+                _save_state(work_dir, state)
+                report[name] = 'skipped' if not count else ('ran' if by_name[name].mode != 'book' else count)
+    return report
+
+
+# ---------- 论文分析各阶段 ----------
+BOOK_COL = '小说编号'
+SENTENCE_COL = '句子编号'
+SCORE_COL = 'Intensity_polarized'
+
+
+# 读取：合并源表后按书拆分，书内按句子编号（数值）稳定排序；缺少小说编号列的逐书表以文件名中的书号（如 B01）为准
+def load_books(paths):
+    frames = []
+    for path in paths:
+        df = load_table(path)
+        if BOOK_COL not in df.columns:
+            match = re.match(r'(B\d+)', os.path.basename(path))
+            if match is None:
+                raise ValueError(f"无法确定 {path} 的小说编号")
+            df[BOOK_COL] = match.group(1)
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True)
+    df = df[df[BOOK_COL].notna()]
+    order = pd.to_numeric(df[SENTENCE_COL], errors='coerce') if SENTENCE_COL in df.columns else None
+    if order is not None:
+        df = df.assign(_order=order).sort_values([BOOK_COL, '_order'], kind='stable').drop(columns='_order')
+    return {str(book): group.reset_index(drop=True) for book, group in df.groupby(BOOK_COL, sort=True)}
+
+
+# 规范化：情感强度序列（缺失记 0，与 Code7 一致）
+def normalize_book(book_id, frame):
+    return frame[SCORE_COL].fillna(0).to_numpy(dtype=np.float64)
+
+
+def smooth_book(book_id, scores, frac=0.3, method='exact'):
+    return np.asarray(smooth(scores, frac, x=np.arange(len(scores)), method=method), dtype=np.float64)
+
+
+def segment_book(book_id, smoothed, threshold=0.2, thresholds=(0.1, 0.15, 0.2, 0.25, 0.3), policies=None):
+    policy = (NODE_POLICIES if policies is None else policies).get(book_id)
+    return {
+        'nodes': detect_nodes(smoothed, threshold, policy=policy),
+        'grid': detect_nodes(smoothed, list(thresholds), policy=policy),
+        'climax': int(np.argmax(smoothed)) if len(smoothed) else None,
+        'valley': int(np.argmin(smoothed)) if len(smoothed) else None,
+    }
+
+
+def metrics_book(book_id, scores):
+    return batch_metrics(scores, [0, len(scores)], [book_id])
+
+
+# 插值：平滑曲线按进度 [0, 1] 重采样为 n_points 个点（Code8 的输入；linear / spline / area 见 curve_resampler.py）
+def interpolate_book(book_id, smoothed, n_points=100, method='linear'):
+    return resample_curves([smoothed], n_points, method)[0]
+
+
+# 成对 DTW（增量）：只计算涉及新增或曲线变化的书的序列对，其余沿用上次的距离
+def dtw_matrix(curves, previous=None, radius=None):
+    books = sorted(curves)
+    digests = [fingerprint(np.asarray(curves[b], dtype=np.float64)) for b in books]
+    X = np.array([curves[b] for b in books], dtype=np.float64)
+    n = len(books)
+    D = np.zeros((n, n))
+    fresh = np.ones(n, dtype=bool)
+
+    if previous is not None and previous.get('radius') == radius:
+        old_index = {(b, d): i for i, (b, d) in enumerate(zip(previous['books'], previous['digests']))}
+        pos = np.array([old_index.get((b, d), -1) for b, d in zip(books, digests)])
+        fresh = pos < 0
+        kept = np.flatnonzero(~fresh)
+        D[np.ix_(kept, kept)] = previous['matrix'][np.ix_(pos[kept], pos[kept])]
+
+    I, J = np.triu_indices(n, k=1)
+    todo = fresh[I] | fresh[J]
+    if todo.any():
+        d = dtw_pairs(X, I[todo], J[todo], radius=radius)
+        D[I[todo], J[todo]] = d
+        D[J[todo], I[todo]] = d
+    return {'books': books, 'digests': digests, 'radius': radius, 'matrix': D}
+
+
+def cluster_books(dtw, n_clusters=4, random_state=0):
+    books = dtw['books']
+    if len(books) <= n_clusters:
+        labels = np.arange(len(books))
+    else:
+        labels, _, _ = kmedoids(dtw['matrix'], n_clusters, random_state=random_state)
+    return pd.DataFrame({'novel': books, 'cluster': labels})
+
+
+# 导出结果表：基础波动指标、节点阈值敏感性、插值曲线（Code8 输入）、聚类标签
+def export_tables(metrics, segments, curves, clusters, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+
+    path = os.path.join(output_dir, '情感分析统计指标.csv')
+    pd.concat([metrics[b] for b in sorted(metrics)]).to_csv(path, encoding='utf-8-sig')
+    written.append(path)
+
+    rows = []
+    for book_id in sorted(segments):
+        for level, nodes in segments[book_id]['grid'].items():
+            rows.append({'book_id': book_id, 'Threshold': level, 'Nodes': nodes,
+                         'NodeCount': len(nodes), 'Segments': len(nodes) + 1})
+    path = os.path.join(output_dir, '节点阈值敏感性表.csv')
+    pd.DataFrame(rows, columns=['book_id', 'Threshold', 'Nodes', 'NodeCount', 'Segments']).to_csv(
+        path, index=False, encoding='utf-8-sig')
+    written.append(path)
+
+    path = os.path.join(output_dir, 'All_Novels_Emotion_Curves_LOESS_Interpolated.csv')
+    long_df = pd.concat([
+        pd.DataFrame({'novel': b, 'progress': np.linspace(0, 1, len(curves[b])), 'emotion_score': curves[b]})
+        for b in sorted(curves)
+    ], ignore_index=True) if curves else pd.DataFrame(columns=['novel', 'progress', 'emotion_score'])
+    long_df.to_csv(path, index=False)
+    written.append(path)
+    # 同一份曲线的 (n_books, N) float32 矩阵与书号索引，Code8 优先零拷贝加载
+    path = write_matrix(os.path.splitext(path)[0] + '.npy',
+                        np.array([curves[b] for b in sorted(curves)]).reshape(len(curves), -1), sorted(curves))
+    written.append(path)
+
+    path = os.path.join(output_dir, 'novel_cluster_labels.csv')
+    clusters.to_csv(path, index=False)
+    written.append(path)
+    return written
+
+
+# 渲染 Code7 分段图（逐图哈希由 render_pool 判断，只重绘变化的书）
+def render_segments(smoothed, segments, output_dir, dpi=300, n_jobs=None):
+    code7 = importlib.import_module('Code7_Figure15-32_Table5_Loess_segmentation_with_peaks')
+    jobs = [
+        figure_job(os.path.join(output_dir, f"{b}_LOESS_Segmented_Thresholded_Peaks.png"),
+                   code7.plot_loess_sentiment_with_threshold,
+                   b, smoothed[b], np.arange(len(smoothed[b])), manual_nodes=segments[b]['nodes'], dpi=dpi)
+        for b in sorted(smoothed)
+    ]
+    return render_jobs(jobs, n_jobs=n_jobs)['rendered']
+
+
+# Code5 情感转移表：各小说类型按阈值过滤后的边列表与转移概率矩阵（口径同 Code5，节点顺序为边的出现顺序）
+#   网络中心性与网络图仍由 Code5 输出
+def export_transitions(sentences, output_dir, threshold=5):
+    os.makedirs(output_dir, exist_ok=True)
+    counts = count_transitions(pd.concat([sentences[b] for b in sorted(sentences)], ignore_index=True))
+    written = []
+    for t, novel_type in enumerate(counts.types):
+        edges = edge_list(counts.type[t], counts.labels, threshold)
+        path = os.path.join(output_dir, f"{novel_type}_Emotion_Edge_List.csv")
+        pd.DataFrame(edges, columns=['Source', 'Target', 'Weight']).to_csv(path, index=False, encoding='utf-8-sig')
+        written.append(path)
+
+        nodes = list(dict.fromkeys(e for src, dst, _ in edges for e in (src, dst)))
+        idx = [counts.labels.index(e) for e in nodes]
+        filtered = np.where(counts.type[t] >= threshold, counts.type[t], 0)[np.ix_(idx, idx)]
+        matrix = pd.DataFrame(filtered, index=nodes, columns=nodes)
+        matrix = matrix.div(matrix.sum(axis=1), axis=0).fillna(0)
+        path = os.path.join(output_dir, f"{novel_type}_Transition_Probability_Matrix.csv")
+        matrix.to_csv(path, encoding='utf-8-sig')
+        written.append(path)
+    return written
+
+
+# Code9 角色曲线：全书、主要角色、次要角色的 Intensity_polarized 各自 LOESS 平滑（不填补缺失，与 Code9 一致）
+def smooth_roles(book_id, full, main, minor, frac=0.05, method='exact'):
+    return {role: np.asarray(smooth(frame[SCORE_COL].to_numpy(dtype=np.float64), frac, method=method), dtype=np.float64)
+            for role, frame in (('full', full), ('main', main), ('minor', minor))}
+
+
+# Code9 角色 DTW：三条曲线截到同一长度，绝对差 DTW 一次算出三组距离，主导角色与同步性判断规则同 Code9
+#   输出列与 Code9 的 DTW分析结果汇总表 相同（小说类型按 Code9 的类型名称，即 emotion_cube.FIGURE_TYPE_MAP）
+def role_dtw_book(book_id, curves, sync_ratio=0.8, type_map=FIGURE_TYPE_MAP):
+    n = min(len(curves['full']), len(curves['main']), len(curves['minor']))
+    full, main, minor = curves['full'][:n], curves['main'][:n], curves['minor'][:n]
+    main_full, minor_full, main_minor = dtw_batch(np.vstack([main, minor, main]), np.vstack([full, full, minor]),
+                                                  dist='abs')
+    return {
+        '小说编号': book_id,
+        '小说类型': type_map.get(book_id),
+        'DTW(全书,主角)': round(float(main_full), 2),
+        'DTW(全书,次角)': round(float(minor_full), 2),
+        'DTW(主角,次角)': round(float(main_minor), 2),
+        '情感节奏主导角色': '主角' if main_full < minor_full else '次角',
+        '主-次同步性判断': '同步' if main_minor < sync_ratio * max(main_full, minor_full) else '独立',
+    }
+
+
+def export_roles(role_dtw, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, 'DTW分析结果汇总表.csv')
+    pd.DataFrame([role_dtw[b] for b in sorted(role_dtw)]).to_csv(path, index=False, encoding='utf-8-sig')
+    return [path]
+
+
+# 论文分析流水线：Code5 转移表、Code6 指标、Code7 平滑与分段、Code8 插值曲线 / DTW / 聚类、Code9 角色 DTW
+#   不含 Code1–Code4：Code1 / code2 读取单独的书级极性汇总表（不在仓库数据中），Code3 / Code4 是聚合立方体
+#   （emotion_cube.py，已按源文件哈希缓存）上的一次汇总与绘图，没有下游阶段复用其结果，纳入 DAG 不会减少重算
+#   Code5 的网络中心性与网络图、Code9 的曲线图仍由各自脚本输出
+def thesis_stages(table_dir, chart_dir, frac=0.3, n_points=100, n_clusters=4, resample='linear', role_frac=0.05,
+                  transition_threshold=5):
+    return [
+        stage('load', load_books, ['corpus'], ['sentences'], mode='split'),
+        stage('load_main', load_books, ['main_roles'], ['main_sentences'], mode='split'),
+        stage('load_minor', load_books, ['minor_roles'], ['minor_sentences'], mode='split'),
+        stage('normalize', normalize_book, ['sentences'], ['scores'], mode='book'),
+        stage('smooth', smooth_book, ['scores'], ['smoothed'], mode='book', frac=frac),
+        stage('segment', segment_book, ['smoothed'], ['segments'], mode='book'),
+        stage('metrics', metrics_book, ['scores'], ['metrics'], mode='book'),
+        stage('interpolate', interpolate_book, ['smoothed'], ['curves'], mode='book', n_points=n_points,
+              method=resample),
+        stage('dtw', dtw_matrix, ['curves'], ['dtw'], incremental=True),
+        stage('cluster', cluster_books, ['dtw'], ['clusters'], n_clusters=n_clusters),
+        stage('transitions', export_transitions, ['sentences'], ['transition_tables'], output_dir=table_dir,
+              threshold=transition_threshold),
+        stage('smooth_roles', smooth_roles, ['sentences', 'main_sentences', 'minor_sentences'], ['role_curves'],
+              mode='book', frac=role_frac),
+        stage('role_dtw', role_dtw_book, ['role_curves'], ['role_dtw'], mode='book'),
+        stage('export_roles', export_roles, ['role_dtw'], ['role_tables'], output_dir=table_dir),
+        stage('export', export_tables, ['metrics', 'segments', 'curves', 'clusters'], ['tables'],
+              output_dir=table_dir),
+        stage('render', render_segments, ['smoothed', 'segments'], ['charts'], output_dir=chart_dir),
+    ]
+
+
+# ---------- 参数 ----------
+sources = {'corpus': [DATA1_PATH], 'main_roles': [DATA2_PATH], 'minor_roles': [DATA3_PATH]}
+work_dir = os.path.join(BASE_DIR, '.pipeline')
+table_dir = os.path.join(BASE_DIR, 'results', 'tables')
+chart_dir = os.path.join(BASE_DIR, 'results', 'charts', 'loess_segmentation')
+
+
+# 进程池在 Windows 下以 spawn 方式启动子进程，主流程需放在 __main__ 保护块中
+if __name__ == "__main__":
+    report = run(thesis_stages(table_dir, chart_dir), sources, work_dir)
+    for name, status in report.items():
+        print(f"{name}: {status}")
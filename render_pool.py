@@ -0,0 +1,127 @@
+# render_pool.py
+# 图表渲染层：每张图描述为一个声明式渲染任务（输出路径 + 绘图函数 + 数据与参数），
+# 在 Agg 后端的进程池中并行渲染；输入数据、绘图参数与绘图函数所在模块源码的哈希与已有输出记录一致时跳过该图
+
+import os
+import json
+import pickle
+import inspect
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from instrumentation import span
+
+# 渲染任务：func(*args, **kwargs) 在当前 pyplot 图上绘制（无需保存），由渲染层统一 savefig 到 output
+FigureJob = namedtuple('FigureJob', ['output', 'func', 'args', 'kwargs', 'dpi', 'savefig_kwargs'])
+
+# 每个输出目录下记录已渲染图表哈希的清单文件
+MANIFEST_NAME = '.render_manifest.json'
+
+# 渲染版本：提高后全部图表重新渲染
+RENDER_VERSION = 1
+
+
+def figure_job(output, func, *args, dpi=100, savefig_kwargs=None, **kwargs):
+    return FigureJob(output, func, args, kwargs, dpi, savefig_kwargs or {})
+
+
+def _file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+# 绘图函数所在模块的完整源码：同模块的辅助函数与模块级常量（如 segment_colors、AMPLITUDE_THRESHOLD）改动后
+# 也会使哈希变化；取不到模块源码时退回函数本身的源码
+def _func_source(func):
+    for target in (inspect.getmodule(func), func):
+        try:
+            return inspect.getsource(target)
+        except (OSError, TypeError):
+            continue
+    return ''
+
+
+# 任务哈希：绘图函数（名称 + 所在模块源码）、数据、参数、保存设置与 RENDER_VERSION
+#   其他模块中被调用的代码（如 loess_smoothing）不在哈希内，改动这类代码后需提高 RENDER_VERSION 或删除清单文件
+def job_hash(job):
+    h = hashlib.sha1()
+    h.update(f"{RENDER_VERSION}:{job.func.__module__}.{job.func.__qualname__}".encode('utf-8'))
+    h.update(_func_source(job.func).encode('utf-8'))
+    h.update(pickle.dumps((job.args, job.kwargs, job.dpi, job.savefig_kwargs), protocol=4))
+    return h.hexdigest()
+
+
+def _load_manifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(folder, manifest):
+    path = os.path.join(folder, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+
+
+# 渲染单张图（进程池任务）
+def render_job(job):
+    import matplotlib.pyplot as plt
+    plt.close('all')
+    name = os.path.basename(job.output)
+    try:
+        with span('draw', figure=name):
+            job.func(*job.args, **job.kwargs)
+        with span('savefig', figure=name):
+            plt.savefig(job.output, dpi=job.dpi, **job.savefig_kwargs)
+    finally:
+        plt.close('all')
+    return job.output
+
+
+# 渲染一组任务，返回 {'rendered': [...], 'skipped': [...]}
+#   force:  忽略哈希记录，全部重新渲染
+#   n_jobs: 进程数（None 为 CPU 核数；1 或只有一张待渲染图时在当前进程渲染）
+def render_jobs(jobs, n_jobs=None, force=False):
+    manifests = {}
+    stale, skipped, hashes = [], [], {}
+    for job in jobs:
+        folder, name = os.path.split(os.path.abspath(job.output))
+        manifest = manifests.setdefault(folder, _load_manifest(folder))
+        digest = job_hash(job)
+        hashes[job.output] = digest
+        record = manifest.get(name)
+        if (not force and record is not None and record.get('hash') == digest
+                and os.path.exists(job.output) and record.get('file') == _file_hash(job.output)):
+            skipped.append(job.output)
+        else:
+            stale.append(job)
+
+    for folder in {os.path.dirname(os.path.abspath(job.output)) for job in stale}:
+        os.makedirs(folder, exist_ok=True)
+
+    if n_jobs == 1 or len(stale) <= 1:
+        rendered = [render_job(job) for job in stale]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker) as pool:
+            rendered = list(pool.map(render_job, stale))
+
+    # 渲染完成后由主进程统一更新清单
+    for output in rendered:
+        folder, name = os.path.split(os.path.abspath(output))
+        manifests[folder][name] = {'hash': hashes[output], 'file': _file_hash(output)}
+    for folder in {os.path.dirname(os.path.abspath(output)) for output in rendered}:
+        _save_manifest(folder, manifests[folder])
+
+    return {'rendered': rendered, 'skipped': skipped}
@@ -0,0 +1,100 @@
+# stream_reader.py
+# 流式逐书读取（Data1 / Data2 / Data3 格式）：按块读取源文件（csv 用 pandas 分块读取，xlsx 用 openpyxl 只读模式逐行读取），
+# 按 小说编号 切分后逐本产出 (书号, {列名: 数组})；内存占用为一个读取块加一本书，与语料总规模无关
+# 要求同一本书的句子在文件中连续存放（仓库的三份数据均满足）；同一本书在文件中再次出现时报错
+# 也可传入逐书文件列表（如 B01情感汇总_处理后.csv），缺少小说编号列时以文件名中的书号为准
+
+import os
+import re
+import numpy as np
+import pandas as pd
+
+BOOK_COL = '小说编号'
+DEFAULT_CHUNKSIZE = 50_000
+
+
+# xlsx 分块读取：openpyxl 只读模式逐行迭代，不整体载入工作簿
+def _excel_chunks(path, columns, chunksize, sheet_name=0):
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        rows = ws.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else f"Unnamed: {i}" for i, h in enumerate(next(rows, ()))]
+        keep = [i for i, h in enumerate(header) if columns is None or h in columns]
+        names = [header[i] for i in keep]
+        block = []
+        for row in rows:
+            if row is None or all(v is None for v in row):
+                continue
+            block.append([row[i] if i < len(row) else None for i in keep])
+            if len(block) >= chunksize:
+                yield pd.DataFrame(block, columns=names)
+                block = []
+        if block:
+            yield pd.DataFrame(block, columns=names)
+    finally:
+        wb.close()
+
+
+# 分块读取一个源文件，产出 DataFrame 块
+#   columns: 只读取这些列（None 为全部）
+def read_chunks(path, columns=None, chunksize=DEFAULT_CHUNKSIZE, **read_kwargs):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        yield from _excel_chunks(path, None if columns is None else set(columns), chunksize, **read_kwargs)
+        return
+    read_kwargs.setdefault('encoding', 'utf-8-sig')
+    usecols = None if columns is None else (lambda c: c in set(columns))
+    for chunk in pd.read_csv(path, chunksize=chunksize, usecols=usecols, **read_kwargs):
+        yield chunk
+
+
+def _book_from_name(path):
+    match = re.match(r'(B\d+)', os.path.basename(path))
+    if match is None:
+        raise ValueError(f"无法确定 {path} 的小说编号")
+    return match.group(1)
+
+
+def _as_arrays(parts, names):
+    frame = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+    return {name: frame[name].to_numpy() for name in names}
+
+
+# 逐本产出 (书号, {列名: 数组})
+#   paths:   一个源文件路径，或路径列表（依次读取）
+#   columns: 需要的列（不含小说编号；None 为全部）
+def iter_books(paths, columns=None, chunksize=DEFAULT_CHUNKSIZE, book_col=BOOK_COL, **read_kwargs):
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    wanted = None if columns is None else list(columns) + [book_col]
+    seen = set()
+    current, parts, names = None, [], None
+
+    for path in paths:
+        for chunk in read_chunks(path, wanted, chunksize, **read_kwargs):
+            if book_col not in chunk.columns:
+                chunk[book_col] = _book_from_name(path)
+            chunk = chunk[chunk[book_col].notna()]
+            if names is None:
+                names = [c for c in (columns or chunk.columns) if c != book_col]
+            books = chunk[book_col].astype(str).str.strip().to_numpy()
+            if len(books) == 0:
+                continue
+            # 块内按书号变化位置切分
+            starts = np.flatnonzero(np.concatenate(([True], books[1:] != books[:-1])))
+            bounds = np.append(starts, len(books))
+            for s, e in zip(bounds[:-1], bounds[1:]):
+                book = books[s]
+                if book != current:
+                    if current is not None:
+                        yield current, _as_arrays(parts, names)
+                    if book in seen:
+                        raise ValueError(f"{book} 的句子在文件中不连续，请先按小说编号排序")
+                    seen.add(book)
+                    current, parts = book, []
+                parts.append(chunk.iloc[s:e])
+
+    if current is not None:
+        yield current, _as_arrays(parts, names)
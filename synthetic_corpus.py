@@ -0,0 +1,142 @@
+# synthetic_corpus.py
+# 合成语料生成器：按 Data1 / Data2 / Data3 的列结构生成任意规模的句子级情感表，供规模测试与基准使用
+#   情感走向 = 若干低频正弦叠加的整体弧线 + AR(1) 波动，正/负/中极性由走向决定
+#   情感类型按极性抽取并以一定概率延续上一句的类型（形成连续片段与转移结构），约 15% 的句子无类型（与原数据比例相近）
+#   逐书向量化生成，同一 (seed, 书号) 总是得到同一本书
+
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+COLUMNS = ['句子编号', '情感极性', '情感类型', '情感强度', '情感关键词', 'Intensity_norm', 'Intensity_polarized',
+           'Polarity_num', 'Emotional Types', 'Neutral_Polarity', 'Positive_Polarity', 'Negative_Polarity', '小说编号']
+
+# 各极性下的情感类型及抽取权重（权重取自 Data1 的类型分布），以及每个类型的中文代表词
+POLARITY_TYPES = {
+    '正': (['Sat', 'Tru', 'Surp', 'Hop', 'Joy', 'Pri', 'Grat', 'Calm'], [27, 17, 17, 15, 10, 3, 2, 1]),
+    '负': (['Sad', 'Ang', 'Fear', 'Disap', 'Anx', 'Disg', 'Sha'], [18, 12, 12, 10, 10, 2, 2]),
+    '中': (['Surp', 'Anx', 'Calm', 'Hop'], [27, 14, 7, 5]),
+}
+TYPE_TERMS = {
+    'Joy': '欢乐', 'Tru': '信任', 'Sat': '满足', 'Hop': '希望', 'Grat': '感激', 'Fear': '恐惧', 'Sad': '悲伤',
+    'Disg': '厌恶', 'Anx': '焦虑', 'Ang': '愤怒', 'Disap': '失望', 'Pri': '骄傲', 'Sha': '羞愧', 'Calm': '平静',
+    'Surp': '惊讶',
+}
+UNTYPED_TERMS = ['中性', '叙述', '惊喜', '坚定', '担忧']
+POLARITY_NUM = {'正': 1.0, '负': 2.0, '中': 0.0}
+KEYWORDS = ['森林', '妈妈', '学校', '朋友', '秘密', '冒险', '小狗', '夜晚', '礼物', '河边', '老师', '魔法']
+
+# 小说类型（与 transition_engine.TYPE_MAP 的取值一致），合成书号按顺序轮流分配
+NOVEL_TYPES = ['Animal', 'Fantasy_Adventure', 'Growth_Family']
+
+
+# 合成书号：B01 .. B18，书数更多时自动加宽（B0001 ..）
+def book_ids(n_books):
+    width = max(2, len(str(n_books)))
+    return [f"B{i:0{width}d}" for i in range(1, n_books + 1)]
+
+
+def type_map(books, types=NOVEL_TYPES):
+    return {book: types[i % len(types)] for i, book in enumerate(books)}
+
+
+# 各书的句子数：整数为固定长度，(lo, hi) 为均匀随机长度
+def book_lengths(n_books, sentences, seed=0):
+    if np.ndim(sentences) == 0:
+        return np.full(n_books, int(sentences), dtype=np.int64)
+    lo, hi = sentences
+    return np.random.default_rng(seed).integers(lo, hi + 1, size=n_books)
+
+
+def _book_rng(seed, book_id, role):
+    return np.random.default_rng([seed, zlib.crc32(f"{book_id}/{role}".encode('utf-8'))])
+
+
+# 生成一本书的句子表
+#   role:          'full' / 'main' / 'minor'，不同角色得到不同但可复现的序列
+#   untyped_rate:  无 Emotional Types 的句子比例
+#   persistence:   同极性下延续上一句情感类型的概率
+def make_book(book_id, n_sentences, seed=0, role='full', untyped_rate=0.15, persistence=0.5):
+    rng = _book_rng(seed, book_id, role)
+    n = int(n_sentences)
+    t = np.linspace(0, 1, n)
+
+    # 整体弧线 + AR(1) 波动
+    freqs = rng.uniform(0.5, 3.0, size=3)
+    phases = rng.uniform(0, 2 * np.pi, size=3)
+    weights = rng.uniform(0.1, 0.4, size=3)
+    arc = 0.15 + (weights[:, None] * np.sin(2 * np.pi * freqs[:, None] * t + phases[:, None])).sum(axis=0)
+    valence = arc + lfilter([1.0], [1.0, -0.6], rng.normal(0, 0.45, size=n))
+
+    polarity = np.where(valence > 0.12, '正', np.where(valence < -0.12, '负', '中')).astype(object)
+    strength = np.clip(np.rint(5.5 + 2.5 * np.abs(valence) + rng.normal(0, 0.8, size=n)), 1, 9)
+    norm = (strength - 1) / 8
+    sign = np.where(polarity == '正', 1.0, np.where(polarity == '负', -1.0, 0.0))
+
+    # 情感类型：按极性抽取候选，同极性连续片段内以 persistence 概率沿用上一句
+    types = np.empty(n, dtype=object)
+    for pol, (labels, w) in POLARITY_TYPES.items():
+        mask = polarity == pol
+        p = np.asarray(w, dtype=np.float64)
+        types[mask] = np.asarray(labels, dtype=object)[rng.choice(len(labels), size=mask.sum(), p=p / p.sum())]
+    fresh = rng.random(n) >= persistence
+    if n:
+        fresh[0] = True
+        fresh[1:] |= polarity[1:] != polarity[:-1]
+    types = types[np.maximum.accumulate(np.where(fresh, np.arange(n), 0))]
+
+    untyped = rng.random(n) < untyped_rate
+    terms = np.array([TYPE_TERMS[x] for x in types], dtype=object) if n else np.empty(0, dtype=object)
+    terms[untyped] = np.asarray(UNTYPED_TERMS, dtype=object)[rng.integers(len(UNTYPED_TERMS), size=untyped.sum())]
+    types[untyped] = np.nan
+
+    k1, k2 = rng.integers(len(KEYWORDS), size=(2, n))
+    keywords = np.char.add(np.char.add(np.asarray(KEYWORDS)[k1], '，'), np.asarray(KEYWORDS)[k2]).astype(object)
+
+    share = {pol: float(np.mean(polarity == pol)) if n else 0.0 for pol in ('中', '正', '负')}
+    return pd.DataFrame({
+        '句子编号': np.arange(1, n + 1),
+        '情感极性': polarity,
+        '情感类型': terms,
+        '情感强度': strength.astype(np.int64),
+        '情感关键词': keywords,
+        'Intensity_norm': norm,
+        'Intensity_polarized': norm * sign,
+        'Polarity_num': np.array([POLARITY_NUM[p] for p in polarity], dtype=np.float64) if n else np.empty(0),
+        'Emotional Types': types,
+        'Neutral_Polarity': share['中'],
+        'Positive_Polarity': share['正'],
+        'Negative_Polarity': share['负'],
+        '小说编号': book_id,
+    }, columns=COLUMNS)
+
+
+# 逐本生成（语料很大时不必整体放入内存）：依次产出 (书号, 句子表)
+def iter_books(n_books, sentences=(600, 1500), seed=0, role='full', **kwargs):
+    for book_id, n in zip(book_ids(n_books), book_lengths(n_books, sentences, seed)):
+        yield book_id, make_book(book_id, n, seed=seed, role=role, **kwargs)
+
+
+# 整个语料为一张长表（Data1 格式）
+def make_corpus(n_books=18, sentences=(600, 1500), seed=0, role='full', **kwargs):
+    frames = [df for _, df in iter_books(n_books, sentences, seed, role, **kwargs)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COLUMNS)
+
+
+# 主要 / 次要角色表（Data2 / Data3 格式）：句子数约为全书的 main_share / minor_share
+def make_role_tables(n_books=18, sentences=(600, 1500), seed=0, main_share=0.6, minor_share=0.3, **kwargs):
+    lengths = book_lengths(n_books, sentences, seed)
+    main = [make_book(b, max(2, int(n * main_share)), seed, 'main', **kwargs) for b, n in zip(book_ids(n_books), lengths)]
+    minor = [make_book(b, max(2, int(n * minor_share)), seed, 'minor', **kwargs) for b, n in zip(book_ids(n_books), lengths)]
+    return pd.concat(main, ignore_index=True), pd.concat(minor, ignore_index=True)
+
+
+# 逐本追加写出 CSV（utf-8-sig，与仓库数据一致），内存占用与单本书同阶
+def write_corpus(path, n_books, sentences=(600, 1500), seed=0, role='full', **kwargs):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        for i, (_, df) in enumerate(iter_books(n_books, sentences, seed, role, **kwargs)):
+            df.to_csv(f, index=False, header=(i == 0))
+    return path
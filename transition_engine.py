@@ -0,0 +1,202 @@
+# transition_engine.py
+# 情感转移计数引擎：将 Emotional Types 编码为整数，一次向量化计算全部小说的转移频数张量
+# 支持高阶转移（A→B→C）与跳步转移（i → i+step），同时返回单本、各类型和全语料的计数
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented
+
+# 固定情感顺序（与 Code4 雷达图一致），数据中出现的其他类型按字母序追加在后
+EMOTION_ORDER = ['Joy', 'Tru', 'Sat', 'Hop', 'Grat', 'Fear', 'Sad', 'Disg', 'Anx', 'Ang', 'Disap', 'Pri', 'Sha', 'Calm', 'Surp']
+
+# 小说类型映射（与 Code5 的输出子目录一致）
+TYPE_MAP = {
+    'B01': 'Animal', 'B02': 'Animal', 'B03': 'Animal',
+    'B04': 'Animal', 'B05': 'Animal', 'B17': 'Animal',
+    'B07': 'Fantasy_Adventure', 'B10': 'Fantasy_Adventure', 'B13': 'Fantasy_Adventure',
+    'B15': 'Fantasy_Adventure', 'B16': 'Fantasy_Adventure', 'B18': 'Fantasy_Adventure',
+    'B06': 'Growth_Family', 'B08': 'Growth_Family', 'B09': 'Growth_Family',
+    'B11': 'Growth_Family', 'B12': 'Growth_Family', 'B14': 'Growth_Family',
+}
+
+# 计数结果：
+#   labels  情感类型（编码顺序）
+#   books / types  小说编号与小说类型
+#   book    形状 (n_books, K, K, ...) 的单本计数张量（order 阶转移共 order+1 个 K 维）
+#   type    形状 (n_types, K, ...) 的各类型计数
+#   corpus  形状 (K, ...) 的全语料计数
+TransitionCounts = namedtuple('TransitionCounts', ['labels', 'books', 'types', 'book', 'type', 'corpus', 'order', 'step'])
+
+
+# 缺失值与 'NA' 视为无情感类型
+def _is_missing(values):
+    values = pd.Series(values, copy=False)
+    return values.isna().to_numpy() | (values.astype(str).str.strip() == 'NA').to_numpy()
+
+
+def _default_labels(observed):
+    labels = [e for e in EMOTION_ORDER if e in observed]
+    return labels + sorted(set(observed).difference(labels), key=str)
+
+
+# Categorical 列（compact_corpus）：只对词典做映射，不展开为逐句字符串
+def _encode_categorical(values, labels):
+    categories = values.cat.categories
+    cat_codes = values.cat.codes.to_numpy()
+    valid = ~_is_missing(pd.Series(categories.astype(object)))
+    if labels is None:
+        used = np.zeros(len(categories), dtype=bool)
+        used[cat_codes[cat_codes >= 0]] = True
+        labels = _default_labels(categories[valid & used])
+    index = {label: i for i, label in enumerate(labels)}
+    mapping = np.array([index.get(c, -1) if ok else -1 for c, ok in zip(categories, valid)] + [-1], dtype=np.int64)
+    return mapping[cat_codes], list(labels)
+
+
+# 情感类型整数编码：返回 (codes, labels)，缺失值编码为 -1
+def encode_emotions(values, labels=None):
+    values = pd.Series(values, copy=False)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return _encode_categorical(values, labels)
+    values = values.astype(object)
+    missing = _is_missing(values)
+    if labels is None:
+        labels = _default_labels(set(values[~missing].unique()))
+    codes = pd.Categorical(values.where(~missing), categories=labels).codes.astype(np.int64)
+    return codes, list(labels)
+
+
+# 按小说编号、句子编号排序（句子编号可能混有文本数字，按数值排序；无法解析的保持原有顺序）
+def _sort_sentences(df, book_col, sort_col):
+    order_key = pd.to_numeric(df[sort_col], errors='coerce') if sort_col in df.columns else None
+    if order_key is None:
+        return df
+    keyed = df.assign(_order=order_key.to_numpy())
+    return keyed.sort_values([book_col, '_order'], kind='stable').drop(columns='_order')
+
+
+# 一次性计算所有小说的转移计数
+#   order: 转移阶数，1 为 A→B，2 为 A→B→C
+#   step:  跳步距离，1 为相邻句子，k 为第 i 句到第 i+k 句
+@instrumented('transitions', lambda df, *a, **kw: {'sentences': len(df)})
+def count_transitions(df, order=1, step=1, labels=None, type_map=TYPE_MAP,
+                      book_col='小说编号', sort_col='句子编号', emotion_col='Emotional Types'):
+    if order < 1 or step < 1:
+        raise ValueError("order 与 step 必须为正整数")
+
+    # 去除 NA 句子后按句子顺序排列（与 Code5 先去除 NA 节点再统计的口径一致）
+    df = df[~_is_missing(df[emotion_col])]
+    df = _sort_sentences(df, book_col, sort_col)
+
+    codes, labels = encode_emotions(df[emotion_col], labels)
+    book_codes, books = pd.factorize(df[book_col], sort=True)
+    books = list(books)
+    K = len(labels)
+    n_books = len(books)
+
+    book_counts = _pack_counts(codes, book_codes, n_books, K, order, step)
+    return _assemble(labels, books, book_counts, type_map, order, step)
+
+
+# 打包索引：((book*K + c0)*K + c1)*K + ...，起止句属于同一本书才计数
+def _pack_counts(codes, book_codes, n_books, K, order, step):
+    span = order * step
+    n = len(codes)
+    if n > span:
+        start = np.arange(n - span)
+        valid = (book_codes[start] == book_codes[start + span]) & (book_codes[start] >= 0)
+        packed = book_codes[start].astype(np.int64)
+        for h in range(order + 1):
+            c = codes[start + h * step]
+            # 指定了 labels 时，不在 labels 中的情感（编码为 -1）不参与计数
+            valid &= c >= 0
+            packed = packed * K + c
+        flat = np.bincount(packed[valid], minlength=n_books * K ** (order + 1))
+    else:
+        flat = np.zeros(n_books * K ** (order + 1), dtype=np.int64)
+    return flat.reshape((n_books,) + (K,) * (order + 1))
+
+
+# 由单本计数张量汇总各类型与全语料计数
+def _assemble(labels, books, book_counts, type_map, order, step):
+    K = len(labels)
+    # 各类型计数：按类型编号累加单本张量
+    book_types = pd.Series(books, dtype=object).map(type_map)
+    type_codes, types = pd.factorize(book_types, sort=True)
+    types = list(types)
+    type_counts = np.zeros((len(types),) + (K,) * (order + 1), dtype=book_counts.dtype)
+    has_type = type_codes >= 0
+    np.add.at(type_counts, type_codes[has_type], book_counts[has_type])
+
+    corpus_counts = book_counts.sum(axis=0)
+    return TransitionCounts(labels, books, types, book_counts, type_counts, corpus_counts, order, step)
+
+
+# 流式计数：books 为逐本产出 (书号, {列名: 数组}) 的迭代器（如 stream_reader.iter_books，需含情感列与句子编号列），
+# 逐本编码计数，结果与 count_transitions 对整表计算相同（书按编号排序，未指定 labels 时标签顺序相同）
+def count_transitions_stream(books, order=1, step=1, labels=None, type_map=TYPE_MAP,
+                             sort_col='句子编号', emotion_col='Emotional Types'):
+    if order < 1 or step < 1:
+        raise ValueError("order 与 step 必须为正整数")
+    fixed = labels is not None
+    seen = list(labels) if fixed else []
+    index = {label: i for i, label in enumerate(seen)}
+    book_ids, per_book = [], []
+
+    for book_id, columns in books:
+        emotions = pd.Series(columns[emotion_col], copy=False).astype(object)
+        keep = ~_is_missing(emotions)
+        emotions = emotions[keep]
+        # 没有情感类型的书不计入（与整表计算一致）
+        if len(emotions) == 0:
+            continue
+        if sort_col in columns:
+            key = pd.to_numeric(pd.Series(columns[sort_col], copy=False)[keep], errors='coerce').to_numpy()
+            emotions = emotions.iloc[np.argsort(key, kind='stable')]
+        if not fixed:
+            for label in sorted(set(emotions.unique()).difference(index), key=str):
+                index[label] = len(seen)
+                seen.append(label)
+        codes = emotions.map(index).fillna(-1).to_numpy(dtype=np.int64)
+        book_ids.append(book_id)
+        per_book.append((codes, len(seen)))
+
+    # 按最终标签顺序放入统一形状的张量（书按编号排序，与 count_transitions 一致）
+    final = list(labels) if fixed else _default_labels(seen)
+    K = len(final)
+    perm = np.array([index[label] for label in final], dtype=np.int64)
+    order_books = sorted(range(len(book_ids)), key=lambda i: book_ids[i])
+    book_counts = np.zeros((len(book_ids),) + (K,) * (order + 1), dtype=np.int64)
+    for row, i in enumerate(order_books):
+        codes, width = per_book[i]
+        counts = _pack_counts(codes, np.zeros(len(codes), dtype=np.int64), 1, width, order, step)[0]
+        padded = np.zeros((K,) * (order + 1), dtype=np.int64)
+        padded[(slice(0, width),) * (order + 1)] = counts
+        book_counts[row] = padded[np.ix_(*[perm] * (order + 1))]
+    return _assemble(final, [book_ids[i] for i in order_books], book_counts, type_map, order, step)
+
+
+# 一阶转移矩阵转为 DataFrame（行：源情感，列：目标情感）
+def to_frame(matrix, labels):
+    return pd.DataFrame(matrix, index=labels, columns=labels)
+
+
+# 边列表：返回满足阈值的 (源, 目标, 权重)，高阶张量的源为前 order 个情感组成的元组
+def edge_list(counts, labels, threshold=1):
+    idx = np.argwhere(counts >= threshold)
+    edges = []
+    for row in idx:
+        names = [labels[i] for i in row]
+        src = names[0] if len(names) == 2 else tuple(names[:-1])
+        edges.append((src, names[-1], int(counts[tuple(row)])))
+    return edges
+
+
+# 行归一化为转移概率（全零行保持为 0）
+def to_probability(counts):
+    counts = np.asarray(counts, dtype=float)
+    totals = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        prob = np.where(totals > 0, counts / totals, 0.0)
+    return prob